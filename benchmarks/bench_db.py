@@ -0,0 +1,65 @@
+"""Compare per-call latency of a fresh SQLite connection against the pooled connection."""
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from centrix import db
+
+
+def _fresh_read(path: Path) -> None:
+    # Baseline behaviour before pooling: new connection per call, never closed explicitly.
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    with conn:
+        conn.execute(
+            "SELECT value FROM config_settings WHERE key = ? AND scope = ?",
+            ("risk.max_order_size", "global"),
+        ).fetchone()
+
+
+def _pooled_read() -> None:
+    with db.get_connection() as conn:
+        conn.execute(
+            "SELECT value FROM config_settings WHERE key = ? AND scope = ?",
+            ("risk.max_order_size", "global"),
+        ).fetchone()
+
+
+def _measure(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(iterations: int = 5000) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        os.environ["CENTRIX_DB_PATH"] = str(path)
+        db.init_schema()
+        with db.get_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO config_settings (key, value, value_type, scope, updated_at, updated_by)
+                VALUES ('risk.max_order_size', '100', 'float', 'global', 0, 'bench')
+                """
+            )
+
+        fresh_us = _measure(lambda: _fresh_read(path), iterations)
+        pooled_us = _measure(_pooled_read, iterations)
+        db.close_all_connections()
+
+    print(f"fresh connection : {fresh_us:8.1f} us/call")
+    print(f"pooled connection: {pooled_us:8.1f} us/call")
+    print(f"speedup          : {fresh_us / pooled_us:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,93 @@
+"""Compare time and memory for loading historical orders as dict-backed records, slotted records and an OrderBatch."""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from centrix import db
+from centrix.order_model import ORDER_COLUMNS, order_row_factory
+from centrix.order_service import load_order_batch
+
+
+@dataclass
+class _LegacyOrderRecord:
+    # the pre-slots representation, built from sqlite3.Row by key lookups
+    id: int
+    symbol: str
+    side: str
+    quantity: float
+    status: str
+    error_message: Optional[str]
+
+
+def _load_legacy():
+    rows = db.get_connection().execute("SELECT * FROM orders").fetchall()
+    return [
+        _LegacyOrderRecord(
+            id=row["id"],
+            symbol=row["symbol"],
+            side=row["side"],
+            quantity=row["quantity"],
+            status=row["status"],
+            error_message=row["error_message"],
+        )
+        for row in rows
+    ]
+
+
+def _load_slotted():
+    cursor = db.get_connection().cursor()
+    cursor.row_factory = order_row_factory
+    return cursor.execute(f"SELECT {ORDER_COLUMNS} FROM orders").fetchall()
+
+
+def _measure(fn):
+    # time without tracing overhead, then a second run for memory
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = fn()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, current, peak
+
+
+def main(count: int = 100_000) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["CENTRIX_DB_PATH"] = str(Path(tmp) / "bench.db")
+        db.init_schema()
+        symbols = [f"SYM{i}" for i in range(500)]
+        with db.get_connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO orders (symbol, side, quantity, status, created_at, updated_at, error_message)
+                VALUES (?, ?, ?, 'executed', ?, ?, NULL)
+                """,
+                ((symbols[i % 500], "buy" if i % 2 else "sell", 10.0, i, i) for i in range(count)),
+            )
+
+        for name, fn in (
+            ("dataclass from sqlite3.Row", _load_legacy),
+            ("slotted positional records", _load_slotted),
+            ("columnar OrderBatch", load_order_batch),
+        ):
+            elapsed, retained, peak = _measure(fn)
+            print(
+                f"{name:28s}: {elapsed * 1000:8.1f} ms, retained {retained / 1e6:6.1f} MB, "
+                f"peak {peak / 1e6:6.1f} MB"
+            )
+        db.close_all_connections()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,17 @@
+"""Run the Centrix benchmark suite (same as ``python src/centrix/main.py bench``).
+
+    python benchmarks/suite.py --quick
+    python benchmarks/suite.py --save-baseline          # store benchmarks/baseline.json
+    python benchmarks/suite.py --compare --output run.json
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from centrix.bench import run_cli
+
+if __name__ == "__main__":
+    sys.exit(run_cli(sys.argv[1:]))
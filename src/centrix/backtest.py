@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import csv
+import itertools
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix import clock
+from centrix.config_service import invalidate_config_cache, set_config
+from centrix.control import set_safe_mode
+from centrix.db import close_connection, init_schema
+from centrix.ib_client import IBClient, IBSession, set_ib_session
+from centrix.market_data import (
+    Bar,
+    BarAggregator,
+    MarketDataStore,
+    read_persisted_ticks,
+    set_market_data,
+)
+from centrix.order_service import create_order_proposals, execute_orders, get_orders, record_fills
+from centrix.order_state import EXECUTED
+from centrix.pacing import NORMAL
+from centrix.positions import reset_position_tracker
+from centrix.strategy import Strategy, create_strategy
+
+# Limits a backtest runs with unless the caller overrides them
+DEFAULT_RISK_CONFIG: Dict[str, Tuple[str, str]] = {
+    "risk.max_order_size": ("1000000", "float"),
+    "risk.max_daily_loss": ("1000000000", "float"),
+}
+
+
+class SimulatedGateway(IBSession):
+    """In-process stand-in for the IBKR session: always connected, fills at the latest mark."""
+
+    def __init__(self, store: MarketDataStore, slippage_bps: float = 1.0) -> None:
+        super().__init__(client=IBClient(host="simulated", port=0, client_id=0, connected=True))
+        self.store = store
+        self.slippage_bps = slippage_bps
+
+    def is_alive(self) -> bool:
+        return True
+
+    def ensure_connected(self, force: bool = False) -> bool:
+        return True
+
+    def mark_broken(self) -> None:
+        pass
+
+    def submit_market_order(
+        self, symbol: str, side: str, quantity: float, lane: int = NORMAL
+    ) -> Tuple[bool, str]:
+        if self.store.latest_price(symbol) is None:
+            return False, f"no market data for {symbol}"
+        return True, ""
+
+    def fill_price(self, symbol: str, side: str) -> float:
+        """Mark plus slippage against the order direction."""
+        mark = self.store.latest_price(symbol) or 0.0
+        slip = mark * self.slippage_bps / 10000.0
+        return mark + slip if side == "buy" else mark - slip
+
+    def close(self) -> None:
+        pass
+
+
+@dataclass
+class BacktestResult:
+    strategy: str
+    params: Dict[str, float]
+    bars: int = 0
+    orders: int = 0
+    fills: int = 0
+    rejected: int = 0
+    pnl: float = 0.0
+    max_drawdown: float = 0.0
+    positions: Dict[str, float] = field(default_factory=dict)
+    elapsed_sec: float = 0.0
+
+
+_run_counter = itertools.count()
+
+
+@contextlib.contextmanager
+def backtest_environment(
+    store: MarketDataStore,
+    gateway: IBSession,
+    start_ts: float = 0.0,
+    risk_config: Optional[Mapping[str, Tuple[str, str]]] = None,
+) -> Iterator[clock.VirtualClock]:
+    """Private in-memory DB, virtual clock, simulated gateway and market data for one run.
+
+    The database is a shared-cache ``file:`` URI, so every thread of the process sees the
+    same data and it disappears when the run's connection closes.
+    """
+    saved_db = os.environ.get("CENTRIX_DB_PATH")
+    name = f"centrix-backtest-{os.getpid()}-{next(_run_counter)}"
+    os.environ["CENTRIX_DB_PATH"] = f"file:{name}?mode=memory&cache=shared"
+    virtual = clock.VirtualClock(start=start_ts)
+    clock.set_clock(virtual)
+    set_ib_session(gateway)
+    set_market_data(store)
+    reset_position_tracker()
+    try:
+        init_schema()
+        for key, (value, value_type) in (risk_config or DEFAULT_RISK_CONFIG).items():
+            set_config(key, value, value_type=value_type)
+        set_safe_mode(False)
+        yield virtual
+    finally:
+        invalidate_config_cache()
+        reset_position_tracker()
+        set_market_data(None)
+        set_ib_session(None)
+        clock.set_clock(None)
+        close_connection()
+        if saved_db is None:
+            os.environ.pop("CENTRIX_DB_PATH", None)
+        else:
+            os.environ["CENTRIX_DB_PATH"] = saved_db
+
+
+def run_backtest(
+    strategy: Strategy,
+    bars: Iterable[Bar],
+    bar_interval_sec: int = 60,
+    slippage_bps: float = 1.0,
+    risk_config: Optional[Mapping[str, Tuple[str, str]]] = None,
+) -> BacktestResult:
+    """Stream bars through the strategy and the regular risk/order pipeline."""
+    store = MarketDataStore(ring_capacity=1024, bar_interval_sec=bar_interval_sec)
+    gateway = SimulatedGateway(store, slippage_bps=slippage_bps)
+    result = BacktestResult(strategy=strategy.name, params=dict(strategy.params))
+    cash = 0.0
+    positions: Dict[str, float] = {}
+    peak = 0.0
+    started = time.perf_counter()
+
+    with backtest_environment(store, gateway, risk_config=risk_config) as virtual:
+        for bar in bars:
+            close_ts = bar.start + bar_interval_sec
+            virtual.set(close_ts)
+            store.on_tick(bar.symbol, close_ts, bar.close, bar.close, bar.close, bar.volume)
+            result.bars += 1
+
+            intents = strategy.on_bar(bar)
+            if intents:
+                order_ids = create_order_proposals(intents)
+                result.orders += len(order_ids)
+                executed = execute_orders(order_ids)
+                orders = get_orders(order_ids)
+                fills = []
+                for order_id in order_ids:
+                    order = orders[order_id]
+                    if executed.get(order_id) and order.status == EXECUTED:
+                        price = gateway.fill_price(order.symbol, order.side)
+                        fills.append((order_id, price, order.quantity))
+                        signed = -order.quantity if order.side == "sell" else order.quantity
+                        positions[order.symbol] = positions.get(order.symbol, 0.0) + signed
+                        cash -= signed * price
+                        strategy.on_fill(order_id, order.symbol, order.side, order.quantity, price)
+                    else:
+                        result.rejected += 1
+                        strategy.on_reject(order_id, order.symbol, order.error_message or "")
+                record_fills(fills)
+                result.fills += len(fills)
+
+            equity = cash + sum(qty * store.marks[s] for s, qty in positions.items() if qty)
+            peak = max(peak, equity)
+            result.max_drawdown = max(result.max_drawdown, peak - equity)
+        result.pnl = equity if result.bars else 0.0
+
+    result.positions = {symbol: qty for symbol, qty in positions.items() if qty}
+    result.elapsed_sec = time.perf_counter() - started
+    return result
+
+
+def generate_minute_bars(
+    symbol: str = "SIM",
+    days: int = 252,
+    start_price: float = 100.0,
+    seed: int = 0,
+    start_ts: int = 1_704_186_000,  # 2024-01-02 09:00 UTC
+    bars_per_day: int = 390,
+    volatility: float = 0.0008,
+) -> Iterator[Bar]:
+    """Deterministic random-walk minute bars for ``days`` trading days."""
+    rng = random.Random(seed)
+    price = start_price
+    for day in range(days):
+        day_start = start_ts + day * 86400
+        for minute in range(bars_per_day):
+            open_ = price
+            price = max(0.01, price * math.exp(rng.gauss(0.0, volatility)))
+            spread = abs(price - open_) + price * volatility * 0.5
+            yield Bar(
+                symbol,
+                day_start + minute * 60,
+                open_,
+                max(open_, price) + spread * 0.5,
+                min(open_, price) - spread * 0.5,
+                price,
+                float(rng.randint(100, 5000)),
+                1,
+            )
+
+
+def load_bars_csv(path: Path) -> Iterator[Bar]:
+    """Read ``symbol,start,open,high,low,close,volume`` rows (header optional)."""
+    with open(path, newline="") as fh:
+        for row in csv.reader(fh):
+            if len(row) < 7 or row[0] == "symbol":
+                continue
+            yield Bar(
+                row[0],
+                int(float(row[1])),
+                float(row[2]),
+                float(row[3]),
+                float(row[4]),
+                float(row[5]),
+                float(row[6]),
+                1,
+            )
+
+
+def bars_from_ticks(directory: Path, symbol: str, interval_sec: int = 60) -> Iterator[Bar]:
+    """Aggregate persisted market-data ticks (see ``TickPersister``) into bars."""
+    ticks = read_persisted_ticks(directory, symbol)
+    aggregator = BarAggregator(symbol, interval_sec)
+    for ts, bid, ask, last, size in zip(
+        ticks["ts"], ticks["bid"], ticks["ask"], ticks["last"], ticks["size"]
+    ):
+        completed = aggregator.update(ts, last if last > 0 else (bid + ask) / 2, size)
+        if completed is not None:
+            yield completed
+    if aggregator.ticks:
+        yield aggregator.current()
+
+
+def bar_source(spec: Mapping[str, object]) -> Iterator[Bar]:
+    """Build bars from a picklable spec: synthetic (symbol/days/seed), csv (path) or ticks."""
+    kind = spec.get("kind", "synthetic")
+    if kind == "synthetic":
+        return generate_minute_bars(
+            symbol=str(spec.get("symbol", "SIM")),
+            days=int(spec.get("days", 252)),  # type: ignore[arg-type]
+            seed=int(spec.get("seed", 0)),  # type: ignore[arg-type]
+        )
+    if kind == "csv":
+        return load_bars_csv(Path(str(spec["path"])))
+    if kind == "ticks":
+        return bars_from_ticks(Path(str(spec["path"])), str(spec["symbol"]))
+    raise ValueError(f"Unknown bar source: {kind}")
+
+
+def _run_case(args: Tuple[str, Dict[str, float], Dict[str, object]]) -> BacktestResult:
+    strategy_name, params, spec = args
+    return run_backtest(create_strategy(strategy_name, params), bar_source(spec))
+
+
+def run_sweep(
+    strategy_name: str,
+    grid: Mapping[str, Sequence[float]],
+    spec: Mapping[str, object],
+    workers: Optional[int] = None,
+) -> List[BacktestResult]:
+    """Run every parameter combination of ``grid`` in a process pool, best P&L first."""
+    keys = list(grid)
+    cases = [
+        (strategy_name, dict(zip(keys, values)), dict(spec))
+        for values in itertools.product(*(grid[key] for key in keys))
+    ]
+    if workers == 1 or len(cases) == 1:
+        results = [_run_case(case) for case in cases]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_case, cases))
+    return sorted(results, key=lambda r: r.pnl, reverse=True)
+
+
+def _parse_grid(items: Sequence[str]) -> Dict[str, List[float]]:
+    grid: Dict[str, List[float]] = {}
+    for item in items:
+        key, _, values = item.partition("=")
+        if not values:
+            raise ValueError(f"expected name=v1,v2,... got {item}")
+        grid[key] = [float(v) for v in values.split(",")]
+    return grid
+
+
+def _format_result(result: BacktestResult) -> str:
+    params = " ".join(f"{k}={v:g}" for k, v in result.params.items())
+    return (
+        f"{params:<28} bars={result.bars} orders={result.orders} fills={result.fills} "
+        f"rejected={result.rejected} pnl={result.pnl:.2f} max_dd={result.max_drawdown:.2f} "
+        f"({result.elapsed_sec:.2f}s)"
+    )
+
+
+def run_cli(argv: Sequence[str]) -> int:
+    """Entry point for ``main.py backtest``."""
+    parser = argparse.ArgumentParser(prog="main.py backtest", description="Centrix backtest")
+    parser.add_argument("--strategy", default="ma_cross")
+    parser.add_argument("--param", action="append", default=[], help="name=value (single run)")
+    parser.add_argument("--sweep", nargs="*", default=[], help="name=v1,v2,... grid")
+    parser.add_argument("--bars", type=Path, help="CSV bars file (default: synthetic)")
+    parser.add_argument("--ticks", type=Path, help="directory of persisted ticks")
+    parser.add_argument("--symbol", default="SIM")
+    parser.add_argument("--days", type=int, default=252)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(list(argv))
+
+    spec: Dict[str, object]
+    if args.bars:
+        spec = {"kind": "csv", "path": str(args.bars)}
+    elif args.ticks:
+        spec = {"kind": "ticks", "path": str(args.ticks), "symbol": args.symbol}
+    else:
+        spec = {"kind": "synthetic", "symbol": args.symbol, "days": args.days, "seed": args.seed}
+
+    if args.sweep:
+        started = time.perf_counter()
+        results = run_sweep(args.strategy, _parse_grid(args.sweep), spec, workers=args.workers)
+        for result in results:
+            print(_format_result(result))
+        print(f"[backtest] {len(results)} runs in {time.perf_counter() - started:.2f}s")
+        return 0
+
+    params = {key: values[0] for key, values in _parse_grid(args.param).items()}
+    result = run_backtest(create_strategy(args.strategy, params), bar_source(spec))
+    print(_format_result(result))
+    print(f"[backtest] positions={result.positions}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_cli(sys.argv[1:]))
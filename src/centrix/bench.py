@@ -0,0 +1,435 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix.config_service import (
+    get_config_float,
+    get_config_snapshot,
+    invalidate_config_cache,
+    set_config,
+)
+from centrix.control import get_safe_mode, set_restart_needed, set_safe_mode
+from centrix.db import close_connection, init_schema
+from centrix.engine_loop import run_engine_async
+from centrix.fake_gateway import FakeGateway
+from centrix.heartbeat import get_heartbeat_sink, write_heartbeat, write_heartbeat_async
+from centrix.ib_client import IBSession, close_ib_session, reload_ibkr_settings
+from centrix.metrics import LatencyHistogram, get_registry
+from centrix.order_journal import close_order_journal, get_order_journal
+from centrix.order_model import NewOrder
+from centrix.order_router import OrderRouter, close_order_router, submit_orders_async
+from centrix.order_service import (
+    check_risk,
+    check_risk_batch,
+    create_order_proposal,
+    create_order_proposals,
+    execute_order,
+    get_orders,
+    prepare_orders_for_submit,
+    reset_client_id_cache,
+    submit_orders,
+)
+from centrix.pacing import GatewayPacer, reset_gateway_pacer
+from centrix.positions import reset_position_tracker
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_BASELINE = REPO_ROOT / "benchmarks" / "baseline.json"
+
+
+@dataclass
+class BenchResult:
+    name: str
+    ops: int
+    batch_size: int
+    total_sec: float
+    ops_per_sec: float
+    mean_us: float
+    p50_us: float
+    p99_us: float
+
+
+def _measure(
+    name: str, fn: Callable[[], object], iterations: int, batch_size: int = 1, warmup: int = 3
+) -> BenchResult:
+    """Time ``iterations`` calls of ``fn``; per-op figures divide each call by ``batch_size``."""
+    for _ in range(min(warmup, iterations)):
+        fn()
+    hist = LatencyHistogram()
+    for _ in range(iterations):
+        call_start = time.perf_counter_ns()
+        fn()
+        hist.record(time.perf_counter_ns() - call_start)
+    total = hist.total_ns / 1e9
+    ops = iterations * batch_size
+    return BenchResult(
+        name=name,
+        ops=ops,
+        batch_size=batch_size,
+        total_sec=total,
+        ops_per_sec=ops / total if total else 0.0,
+        mean_us=total / ops * 1e6,
+        p50_us=hist.percentile(0.5) / 1e3 / batch_size,
+        p99_us=hist.percentile(0.99) / 1e3 / batch_size,
+    )
+
+
+@contextlib.contextmanager
+def bench_environment() -> Iterator[FakeGateway]:
+    """Temp SQLite DB plus a local fake gateway, wired in through the usual env settings."""
+    saved = {key: os.environ.get(key) for key in ("CENTRIX_DB_PATH", "IBKR_HOST", "IBKR_PORT")}
+    with tempfile.TemporaryDirectory(prefix="centrix-bench-") as tmp, FakeGateway() as gateway:
+        os.environ["CENTRIX_DB_PATH"] = str(Path(tmp) / "bench.db")
+        os.environ["IBKR_HOST"] = gateway.host
+        os.environ["IBKR_PORT"] = str(gateway.port)
+        try:
+            reload_ibkr_settings()
+            close_ib_session()
+            invalidate_config_cache()
+            reset_position_tracker()
+            init_schema()
+            set_config("risk.max_order_size", "1000000", value_type="float")
+            set_config("risk.max_daily_loss", "1000000000", value_type="float")
+            # throughput cases measure the pipeline, not the gateway pacing limit
+            set_config("gateway.pacing.rate_per_sec", "0", value_type="float")
+            reset_gateway_pacer()
+            yield gateway
+        finally:
+            get_heartbeat_sink().flush()
+            close_order_router()
+            close_order_journal()
+            close_ib_session()
+            reset_position_tracker()
+            reset_client_id_cache()
+            close_connection()
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+            reload_ibkr_settings()
+            invalidate_config_cache()
+            reset_gateway_pacer()
+
+
+def _orders(count: int) -> List[NewOrder]:
+    symbols = ("AAPL", "MSFT", "NVDA", "AMZN")
+    return [NewOrder(symbols[i % 4], "buy" if i % 2 else "sell", 1.0) for i in range(count)]
+
+
+def _bench_engine_tick(seconds: float) -> BenchResult:
+    """Run the real engine with fast control/risk timers and read its engine.tick histogram."""
+    set_config("engine.control_poll_ms", "5", value_type="int")
+    set_config("risk.sync_interval_ms", "5", value_type="int")
+    set_config("engine.heartbeat_interval_sec", "1", value_type="int")
+    set_restart_needed(False)
+    registry = get_registry()
+    registry.reset()
+    asyncio.run(run_engine_async(max_runtime_sec=seconds))
+    hist = registry.histogram("engine.tick")
+    summary = hist.summary()
+    count = max(hist.count, 1)
+    return BenchResult(
+        name="engine_tick",
+        ops=hist.count,
+        batch_size=1,
+        total_sec=summary["sum"],
+        ops_per_sec=hist.count / seconds,
+        mean_us=summary["sum"] / count * 1e6,
+        p50_us=summary["p50"] * 1e6,
+        p99_us=summary["p99"] * 1e6,
+    )
+
+
+def _run_cli_command(name: str) -> None:
+    """One cold ``main.py <name>`` process against the bench database."""
+    subprocess.run(
+        [sys.executable, str(Path(__file__).with_name("main.py")), name],
+        check=True,
+        capture_output=True,
+    )
+
+
+def run_suite(quick: bool = False, only: Optional[Sequence[str]] = None) -> List[BenchResult]:
+    """Run all benchmark cases (or those named in ``only``) in a fresh temp environment."""
+    scale = 0.1 if quick else 1.0
+
+    def n(count: int) -> int:
+        return max(int(count * scale), 5)
+
+    def wanted(name: str) -> bool:
+        return not only or name in only
+
+    results: List[BenchResult] = []
+    # execute_order/submit print one line per order; keep the report readable
+    with bench_environment(), contextlib.redirect_stdout(io.StringIO()):
+        if wanted("config_read_sql"):
+            results.append(
+                _measure(
+                    "config_read_sql", lambda: get_config_float("risk.max_order_size"), n(20000)
+                )
+            )
+        if wanted("config_read_snapshot"):
+            results.append(
+                _measure(
+                    "config_read_snapshot",
+                    lambda: get_config_snapshot().get_float("risk.max_order_size"),
+                    n(100000),
+                )
+            )
+        if wanted("config_resolve_symbol"):
+            # symbol:<SYM> override resolved through the snapshot's precompiled table
+            set_config(
+                "risk.max_order_size", "1000000", scope="symbol:NVDA", value_type="float"
+            )
+            results.append(
+                _measure(
+                    "config_resolve_symbol",
+                    lambda: get_config_snapshot().resolve_float(
+                        "risk.max_order_size", symbol="NVDA"
+                    ),
+                    n(100000),
+                )
+            )
+        if wanted("flag_read"):
+            results.append(_measure("flag_read", get_safe_mode, n(100000)))
+        if wanted("heartbeat_write"):
+            results.append(
+                _measure("heartbeat_write", lambda: write_heartbeat("bench", "ok"), n(2000))
+            )
+        if wanted("heartbeat_write_async"):
+            sink = get_heartbeat_sink()
+
+            def _async_heartbeats() -> None:
+                for _ in range(100):
+                    write_heartbeat_async("bench", "ok")
+                sink.flush()
+
+            results.append(_measure("heartbeat_write_async", _async_heartbeats, n(200), 100))
+
+        if wanted("order_propose"):
+            results.append(
+                _measure("order_propose", lambda: create_order_proposal(_orders(1)[0]), n(2000))
+            )
+        if wanted("order_propose_batch"):
+            batch = _orders(500)
+            results.append(
+                _measure("order_propose_batch", lambda: create_order_proposals(batch), n(40), 500)
+            )
+        if wanted("order_propose_duplicate"):
+            # a retried proposal with a known client order id is answered by the LRU
+            retried = NewOrder("AAPL", "buy", 1.0, client_order_id="bench-retry")
+            create_order_proposal(retried)
+            results.append(
+                _measure(
+                    "order_propose_duplicate", lambda: create_order_proposal(retried), n(20000)
+                )
+            )
+        if wanted("order_journal"):
+            journal = get_order_journal()
+            results.append(
+                _measure("order_journal", lambda: journal.propose(_orders(1)), n(2000))
+            )
+        if wanted("order_journal_buffered"):
+            journal = get_order_journal()
+            results.append(
+                _measure(
+                    "order_journal_buffered",
+                    lambda: journal.propose(_orders(1), durable=False),
+                    n(20000),
+                )
+            )
+            journal.wait_materialized()
+        if wanted("order_journal_concurrent"):
+            # 16 threads proposing one order each share fsyncs through group commit
+            journal = get_order_journal()
+
+            def _concurrent_intake() -> None:
+                list(pool.map(lambda order: journal.propose([order]), _orders(64)))
+
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                results.append(
+                    _measure("order_journal_concurrent", _concurrent_intake, n(100), 64)
+                )
+        if wanted("order_risk"):
+            ids = iter(create_order_proposals(_orders(n(2000) + 3)))
+            results.append(_measure("order_risk", lambda: check_risk(next(ids)), n(2000)))
+        if wanted("order_risk_batch"):
+            records = list(get_orders(create_order_proposals(_orders(500))).values())
+            results.append(
+                _measure("order_risk_batch", lambda: check_risk_batch(records), n(100), 500)
+            )
+        if wanted("order_execute"):
+            set_safe_mode(False)
+            ids = iter(create_order_proposals(_orders(n(1000) + 3)))
+            results.append(_measure("order_execute", lambda: execute_order(next(ids)), n(1000)))
+        if wanted("order_execute_batch"):
+            set_safe_mode(False)
+            batch = _orders(200)
+            results.append(
+                _measure("order_execute_batch", lambda: submit_orders(batch), n(50), 200)
+            )
+        if wanted("order_execute_async"):
+            set_safe_mode(False)
+            batch = _orders(200)
+
+            def _pipelined() -> None:
+                handles = submit_orders_async(create_order_proposals(batch))
+                for handle in handles.values():
+                    handle.result(timeout=10)
+
+            results.append(_measure("order_execute_async", _pipelined, n(50), 200))
+        if wanted("order_execute_paced"):
+            # 200 orders on 4 symbols behind a 45 msg/s pacer: coalescing keeps the burst short
+            set_safe_mode(False)
+            batch = _orders(200)
+            router = OrderRouter(session=IBSession(pacer=GatewayPacer(rate_per_sec=45.0)))
+
+            def _paced() -> None:
+                orders = prepare_orders_for_submit(create_order_proposals(batch))
+                for handle in router.submit(orders):
+                    handle.result(timeout=30)
+
+            try:
+                results.append(_measure("order_execute_paced", _paced, n(20), 200))
+            finally:
+                router.stop()
+                router.session.close()
+        for name in ("show-safe-mode", "show-gateway-status"):
+            case = "cli_" + name.replace("-", "_")
+            if wanted(case):
+                results.append(_measure(case, lambda name=name: _run_cli_command(name), n(50)))
+        if wanted("engine_tick"):
+            results.append(_bench_engine_tick(0.5 if quick else 2.0))
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def environment_metadata() -> Dict[str, object]:
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "git_commit": _git_commit(),
+    }
+
+
+def build_report(results: Sequence[BenchResult], quick: bool = False) -> Dict[str, object]:
+    return {
+        "environment": environment_metadata(),
+        "quick": quick,
+        "results": {r.name: asdict(r) for r in results},
+    }
+
+
+def compare_reports(
+    current: Dict[str, object], baseline: Dict[str, object], threshold: float = 0.25
+) -> List[str]:
+    """Return the names of cases whose median per-op latency grew by more than ``threshold``.
+
+    The median is compared rather than the mean so a single GC pause or fsync does not flag.
+    """
+    regressions: List[str] = []
+    base_results = baseline.get("results", {})
+    assert isinstance(base_results, dict)
+    current_results = current.get("results", {})
+    assert isinstance(current_results, dict)
+    print(f"{'case':<24}{'base p50 us':>14}{'p50 us':>14}{'change':>10}")
+    for name, result in current_results.items():
+        base = base_results.get(name)
+        if base is None or not base.get("p50_us"):
+            print(f"{name:<24}{'-':>14}{result['p50_us']:>14.3f}{'new':>10}")
+            continue
+        change = result["p50_us"] / base["p50_us"] - 1.0
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{name:<24}{base['p50_us']:>14.3f}{result['p50_us']:>14.3f}{change:>+10.1%}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def format_results(results: Sequence[BenchResult]) -> str:
+    width = max([24] + [len(r.name) + 2 for r in results])
+    lines = [f"{'case':<{width}}{'ops/s':>14}{'mean us':>12}{'p50 us':>12}{'p99 us':>12}"]
+    for r in results:
+        lines.append(
+            f"{r.name:<{width}}{r.ops_per_sec:>14.0f}"
+            f"{r.mean_us:>12.3f}{r.p50_us:>12.3f}{r.p99_us:>12.3f}"
+        )
+    return "\n".join(lines)
+
+
+def run_cli(argv: Sequence[str]) -> int:
+    """Entry point for ``main.py bench``; returns a process exit code (1 on regressions)."""
+    parser = argparse.ArgumentParser(prog="main.py bench", description="Centrix benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="10%% of the iterations")
+    parser.add_argument("--only", help="comma-separated case names")
+    parser.add_argument("--output", type=Path, help="write the JSON report to this file")
+    parser.add_argument("--compare", action="store_true", help="compare against the baseline")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown (0.25=25%%)")
+    args = parser.parse_args(list(argv))
+
+    only = [name.strip() for name in args.only.split(",")] if args.only else None
+    results = run_suite(quick=args.quick, only=only)
+    report = build_report(results, quick=args.quick)
+    print(format_results(results))
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(payload + "\n")
+        print(f"[bench] report written to {args.output}")
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(payload + "\n")
+        print(f"[bench] baseline saved to {args.baseline}")
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"[bench] no baseline at {args.baseline}")
+            return 2
+        regressions = compare_reports(report, json.loads(args.baseline.read_text()), args.threshold)
+        if regressions:
+            print(f"[bench] regressions: {', '.join(regressions)}")
+            return 1
+        print("[bench] no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_cli(sys.argv[1:]))
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+class VirtualClock:
+    """Manually advanced wall clock for backtests and replays."""
+
+    def __init__(self, start: float = 0.0) -> None:
+        self.current = start
+
+    def time(self) -> float:
+        return self.current
+
+    def set(self, ts: float) -> None:
+        """Move to ``ts``; the clock never runs backwards."""
+        if ts > self.current:
+            self.current = ts
+
+    def advance(self, seconds: float) -> None:
+        self.current += seconds
+
+
+_clock: Optional[VirtualClock] = None
+
+
+def now() -> float:
+    """Current wall-clock time in seconds: the installed virtual clock, else ``time.time()``."""
+    clock = _clock
+    return time.time() if clock is None else clock.current
+
+
+def set_clock(clock: Optional[VirtualClock]) -> None:
+    """Install a virtual clock for the order/risk path (None restores real time)."""
+    global _clock
+    _clock = clock
+
+
+def get_clock() -> Optional[VirtualClock]:
+    return _clock
+
+
+if __name__ == "__main__":
+    virtual = VirtualClock(start=1_700_000_000.0)
+    set_clock(virtual)
+    virtual.advance(60)
+    print(now())
+    set_clock(None)
+    print(now())
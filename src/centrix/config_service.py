@@ -1,26 +1,43 @@
 from __future__ import annotations
 
 import sys
-import time
+import threading
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 if __name__ == "__main__" and __package__ is None:
     sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from centrix.db import get_connection, init_schema
+from centrix.control import get_control_mirror
+from centrix.db import get_db_key, get_storage, init_schema
+from centrix.shard import GLOBAL_SCOPE, shard_scope
+from centrix.wakeup import notify_engine
+
+# Scope levels below "global", least specific first; a scope is "<level>:<id>".
+SCOPE_LEVELS = ("shard", "account", "strategy", "symbol")
+
+
+def make_scope(level: str, ident: str) -> str:
+    """Return the scope string of a level, e.g. ``make_scope("symbol", "AAPL")``."""
+    if level not in SCOPE_LEVELS or not ident:
+        raise ValueError(f"Invalid config scope level/id: {level!r}, {ident!r}")
+    return f"{level}:{ident}"
+
+
+def validate_scope(scope: str) -> str:
+    """Raise ValueError unless ``scope`` is "global" or "<level>:<id>" of a known level."""
+    if scope != GLOBAL_SCOPE:
+        level, _, ident = scope.partition(":")
+        if level not in SCOPE_LEVELS or not ident:
+            raise ValueError(f"Invalid config scope: {scope!r}")
+    return scope
 
 
 def get_config(key: str, scope: str = "global", default: Optional[str] = None) -> Optional[str]:
     """Return a config value for the given key and scope or the provided default."""
-    with get_connection() as conn:
-        cursor = conn.execute(
-            "SELECT value FROM config_settings WHERE key = ? AND scope = ?", (key, scope)
-        )
-        row = cursor.fetchone()
-        if row is None:
-            return default
-        return row["value"]
+    value = get_storage().get_config(key, scope)
+    return default if value is None else value
 
 
 def get_config_float(
@@ -42,71 +59,229 @@ def set_config(
     scope: str = "global",
     value_type: str = "str",
     updated_by: str = "system",
-) -> None:
-    """Insert or replace a config value for the given key and scope."""
-    ts = int(time.time())
-    with get_connection() as conn:
-        conn.execute(
-            """
-            INSERT OR REPLACE INTO config_settings
-            (id, key, value, value_type, scope, updated_at, updated_by)
-            VALUES (
-                (
-                    SELECT id FROM config_settings WHERE key = ? AND scope = ?
-                ),
-                ?, ?, ?, ?, ?, ?
-            )
-            """,
-            (key, scope, key, value, value_type, scope, ts, updated_by),
-        )
+    bump_version: bool = False,
+) -> Optional[int]:
+    """Insert or replace a config value; optionally bump config_version in the same transaction.
+
+    Returns the new config version when ``bump_version`` is set, otherwise None.
+    """
+    validate_scope(scope)
+    new_version = get_storage().set_config(
+        key, value, scope, value_type, updated_by, bump_version=bump_version
+    )
+    invalidate_config_cache()
+    if new_version is not None:
+        get_control_mirror().apply_local("config_version", str(new_version))
+        notify_engine("config")
+    return new_version
 
 
 def get_config_version() -> int:
-    """Return the current config version stored in control_flags."""
-    with get_connection() as conn:
-        cursor = conn.execute(
-            "SELECT value FROM control_flags WHERE key = 'config_version'"
-        )
-        row = cursor.fetchone()
-        if row is None:
-            return 0
-        try:
-            return int(row["value"])
-        except (TypeError, ValueError):
-            return 0
+    """Return the current config version stored in control_flags (via the flag mirror)."""
+    mirror = get_control_mirror()
+    mirror.maybe_refresh()
+    try:
+        return int(mirror.values.get("config_version", "0"))
+    except (TypeError, ValueError):
+        return 0
 
 
 def bump_config_version(reason: str = "") -> int:
-    """Increase config_version and return the new value."""
-    current = get_config_version()
-    new_version = current + 1
-    ts = int(time.time())
-    with get_connection() as conn:
-        conn.execute(
-            """
-            INSERT OR REPLACE INTO control_flags (key, value, updated_at)
-            VALUES ('config_version', ?, ?)
-            """,
-            (str(new_version), ts),
-        )
+    """Increase config_version atomically and return the new value."""
+    new_version = get_storage().bump_config_version()
+    get_control_mirror().apply_local("config_version", str(new_version))
+    notify_engine("config")
     return new_version
 
 
 def _ensure_config_version_row() -> None:
     """Ensure config_version exists in control_flags; initialize to 0 if absent."""
-    with get_connection() as conn:
-        cursor = conn.execute(
-            "SELECT 1 FROM control_flags WHERE key = 'config_version' LIMIT 1"
+    if get_storage().add_flag("config_version", "0"):
+        get_control_mirror().apply_local("config_version", "0")
+
+
+def _parse_typed(value: str, value_type: str) -> object:
+    """Convert a stored config string according to its value_type; keep the string on failure."""
+    try:
+        if value_type == "int":
+            return int(value)
+        if value_type == "float":
+            return float(value)
+        if value_type == "bool":
+            return value.strip().lower() in ("1", "true", "yes", "on")
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+def _as_float(value: Any, default: Optional[float]) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+_UNRESOLVED = object()
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Immutable view of all config_settings rows for one config_version.
+
+    Lookups in a non-global scope (e.g. ``shard:acct1``) fall back to the global value.
+    ``resolve`` layers symbol → strategy → account → process scope → global and keeps
+    every answer in ``resolved``; a new config_version brings a new snapshot and table.
+    """
+
+    version: int
+    raw: Dict[Tuple[str, str], str] = field(default_factory=dict)
+    typed: Dict[Tuple[str, str], object] = field(default_factory=dict)
+    base_scope: str = GLOBAL_SCOPE
+    resolved: Dict[Tuple[str, str, str, str], Any] = field(default_factory=dict)
+
+    def _cascade(self, key: str, account: str, strategy: str, symbol: str) -> Any:
+        typed = self.typed
+        scopes = (
+            ("symbol:" + symbol) if symbol else None,
+            ("strategy:" + strategy) if strategy else None,
+            ("account:" + account) if account else None,
+            self.base_scope if self.base_scope != GLOBAL_SCOPE else None,
+            GLOBAL_SCOPE,
         )
-        if cursor.fetchone() is None:
-            ts = int(time.time())
-            conn.execute(
-                """
-                INSERT INTO control_flags (key, value, updated_at)
-                VALUES ('config_version', '0', ?)
-                """,
-                (ts,),
-            )
+        for scope in scopes:
+            if scope is not None:
+                value = typed.get((key, scope))
+                if value is not None:
+                    return value
+        return None
+
+    def resolve(
+        self,
+        key: str,
+        account: Optional[str] = None,
+        strategy: Optional[str] = None,
+        symbol: Optional[str] = None,
+        default: Any = None,
+    ) -> Any:
+        """Typed value from the most specific scope that sets ``key``; memoized per snapshot."""
+        entry = (key, account or "", strategy or "", symbol or "")
+        value = self.resolved.get(entry, _UNRESOLVED)
+        if value is _UNRESOLVED:
+            value = self.resolved[entry] = self._cascade(*entry)
+        return default if value is None else value
+
+    def resolve_float(
+        self,
+        key: str,
+        account: Optional[str] = None,
+        strategy: Optional[str] = None,
+        symbol: Optional[str] = None,
+        default: Optional[float] = None,
+    ) -> Optional[float]:
+        """``resolve`` converted to float; the default when missing/invalid."""
+        return _as_float(self.resolve(key, account, strategy, symbol), default)
+
+    def scope_ids(self, level: str, key_prefix: str = "") -> List[str]:
+        """Ids of the ``level`` scopes that set a key starting with ``key_prefix``."""
+        prefix = level + ":"
+        ids = {
+            scope[len(prefix) :]
+            for key, scope in self.raw
+            if scope.startswith(prefix) and key.startswith(key_prefix)
+        }
+        return sorted(ids)
+
+    def precompile(self) -> "ConfigSnapshot":
+        """Fill ``resolved`` for the process scope and every single-level override."""
+        for key, scope in self.typed:
+            self.resolve(key)
+            level, _, ident = scope.partition(":")
+            if level in ("account", "strategy", "symbol"):
+                self.resolve(key, **{level: ident})
+        return self
+
+    @staticmethod
+    def _lookup(values: Dict[Tuple[str, str], Any], key: str, scope: str) -> Any:
+        value = values.get((key, scope))
+        if value is None and scope != "global":
+            value = values.get((key, "global"))
+        return value
+
+    def get(self, key: str, scope: str = "global", default: Optional[str] = None) -> Optional[str]:
+        """Return the raw string value or the default."""
+        value = self._lookup(self.raw, key, scope)
+        return default if value is None else value
+
+    def get_float(
+        self, key: str, scope: str = "global", default: Optional[float] = None
+    ) -> Optional[float]:
+        """Return the value as float or the default when missing/invalid."""
+        return _as_float(self._lookup(self.typed, key, scope), default)
+
+    def get_int(
+        self, key: str, scope: str = "global", default: Optional[int] = None
+    ) -> Optional[int]:
+        """Return the value as int or the default when missing/invalid."""
+        value = self._lookup(self.typed, key, scope)
+        if value is None or isinstance(value, bool):
+            return default
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            try:
+                return int(float(value))
+            except (TypeError, ValueError):
+                return default
+
+    def get_bool(
+        self, key: str, scope: str = "global", default: Optional[bool] = None
+    ) -> Optional[bool]:
+        """Return the value as bool or the default when missing."""
+        value = self._lookup(self.typed, key, scope)
+        if value is None:
+            return default
+        if isinstance(value, bool):
+            return value
+        return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+_snapshots: Dict[str, ConfigSnapshot] = {}
+_snapshot_lock = threading.Lock()
+
+
+def load_config_snapshot() -> ConfigSnapshot:
+    """Read config_version and all config_settings rows as one consistent snapshot."""
+    version, rows = get_storage().load_config()
+    raw = {(key, scope): value for key, scope, value, _ in rows}
+    typed = {
+        (key, scope): _parse_typed(value, value_type) for key, scope, value, value_type in rows
+    }
+    return ConfigSnapshot(
+        version=version, raw=raw, typed=typed, base_scope=shard_scope()
+    ).precompile()
+
+
+def get_config_snapshot(check_version: bool = True) -> ConfigSnapshot:
+    """Return the cached config snapshot, reloading it when config_version has changed.
+
+    With ``check_version=False`` the cached snapshot is returned without touching the DB
+    (it is still loaded on first use).
+    """
+    db_key = get_db_key()
+    snapshot = _snapshots.get(db_key)
+    if snapshot is not None and (not check_version or get_config_version() == snapshot.version):
+        return snapshot
+    with _snapshot_lock:
+        snapshot = load_config_snapshot()
+        _snapshots[db_key] = snapshot
+    return snapshot
+
+
+def invalidate_config_cache() -> None:
+    """Drop the cached snapshot so the next reader reloads it."""
+    _snapshots.pop(get_db_key(), None)
 
 
 if __name__ == "__main__":
@@ -117,3 +292,10 @@ if __name__ == "__main__":
     print(get_config_version())
     print(bump_config_version())
     print(get_config_version())
+    print(get_config_snapshot().get_float("risk.max_daily_loss"))
+    set_config("risk.max_order_size", "100", value_type="float")
+    set_config("risk.max_order_size", "500", scope="account:DU1", value_type="float")
+    set_config("risk.max_order_size", "25", scope=make_scope("symbol", "TSLA"), value_type="float")
+    snapshot = get_config_snapshot()
+    for symbol in ("AAPL", "TSLA"):
+        print(symbol, snapshot.resolve_float("risk.max_order_size", account="DU1", symbol=symbol))
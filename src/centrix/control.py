@@ -1,74 +1,251 @@
 from __future__ import annotations
 
 import sys
+import threading
 import time
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
 
 if __name__ == "__main__" and __package__ is None:
     sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from centrix.db import get_connection, init_schema
+from centrix.db import get_db_key, get_storage, init_schema
+from centrix.shard import GLOBAL_SCOPE, shard_scope
+from centrix.wakeup import notify_engine
+
+
+FlagCallback = Callable[[str, Optional[str], Optional[str]], None]
+
+
+def scoped_flag_key(key: str, scope: str = GLOBAL_SCOPE) -> str:
+    """Flag key for a scope: global flags keep their plain name, others get a prefix."""
+    return key if scope == GLOBAL_SCOPE else f"{scope}:{key}"
+
+
+_control_scope: Optional[str] = None
+
+
+def get_control_scope() -> str:
+    """Scope this process reads and writes flags in (its shard scope, else global)."""
+    global _control_scope
+    if _control_scope is None:
+        _control_scope = shard_scope()
+    return _control_scope
+
+
+def set_control_scope(scope: Optional[str]) -> None:
+    """Override the flag scope (None: derive it from ``CENTRIX_SHARD`` again)."""
+    global _control_scope
+    _control_scope = scope
+
+
+def _is_true(values: Dict[str, str], key: str) -> bool:
+    return values.get(key, "false").lower() == "true"
+
+
+class ControlMirror:
+    """In-memory copy of control_flags, write-through for local writes.
+
+    Changes from other writers are detected with the storage's ``flags_version()``, checked at
+    most every ``refresh_interval_sec`` so hot-path reads stay attribute lookups. In a
+    shard scope, safe_mode and restart_needed are set when either the global or the
+    shard's flag is, and engine_state is the shard's own.
+
+    Local writes are numbered: a refresh keeps a key written locally after its read began,
+    so a slow refresh cannot put back the value the local write replaced.
+    """
+
+    def __init__(self, refresh_interval_sec: float = 0.05, scope: str = GLOBAL_SCOPE) -> None:
+        self.refresh_interval_sec = refresh_interval_sec
+        self.scope = scope
+        self.values: Dict[str, str] = {}
+        self.safe_mode = False
+        self.restart_needed = False
+        self.engine_state: Optional[str] = None
+        self.loaded = False
+        self.lock = threading.RLock()
+        self._next_check = 0.0
+        self._local = threading.local()
+        self._subscribers: List[FlagCallback] = []
+        self._write_seq = 0
+        self._local_writes: Dict[str, int] = {}
+
+    def maybe_refresh(self) -> None:
+        """Refresh only when the check interval has elapsed (cheap enough for every read)."""
+        if not self.loaded or time.monotonic() >= self._next_check:
+            self.refresh()
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload all flags if another connection committed since the last check."""
+        storage = get_storage()
+        # per thread: the SQLite token is the data_version of this thread's connection
+        seen = storage.flags_version()
+        self._next_check = time.monotonic() + self.refresh_interval_sec
+        if not force and self.loaded and getattr(self._local, "seen", None) == seen:
+            return False
+        self._local.seen = seen
+        with self.lock:
+            read_seq = self._write_seq
+        self._apply(storage.get_flags(), replace_all=True, read_seq=read_seq)
+        return True
+
+    def apply_local(self, key: str, value: str) -> None:
+        """Record a write made by this process (after it committed)."""
+        self._apply({key: value}, replace_all=False)
+
+    def _apply(
+        self, new_values: Dict[str, str], replace_all: bool, read_seq: Optional[int] = None
+    ) -> None:
+        with self.lock:
+            old_values = self.values
+            if replace_all:
+                values = dict(new_values)
+                since = self._write_seq if read_seq is None else read_seq
+                newer = {k: s for k, s in self._local_writes.items() if s > since}
+                for key in newer:
+                    # written locally after this refresh's read began; the table may be older
+                    if key in old_values:
+                        values[key] = old_values[key]
+                self._local_writes = newer
+            else:
+                values = {**old_values, **new_values}
+                self._write_seq += 1
+                for key in new_values:
+                    self._local_writes[key] = self._write_seq
+            self.values = values
+            scope = self.scope
+            self.safe_mode = _is_true(values, "safe_mode") or _is_true(
+                values, scoped_flag_key("safe_mode", scope)
+            )
+            self.restart_needed = _is_true(values, "restart_needed") or _is_true(
+                values, scoped_flag_key("restart_needed", scope)
+            )
+            self.engine_state = values.get(scoped_flag_key("engine_state", scope))
+            first_load = not self.loaded
+            self.loaded = True
+            subscribers = list(self._subscribers)
+        if first_load or not subscribers:
+            return
+        keys = set(values) | (set(old_values) if replace_all else set())
+        for key in keys:
+            old, new = old_values.get(key), values.get(key)
+            if old == new:
+                continue
+            for callback in subscribers:
+                try:
+                    callback(key, old, new)
+                except Exception as exc:
+                    print(f"[control] flag subscriber failed: {exc}")
+
+    def subscribe(self, callback: FlagCallback) -> Callable[[], None]:
+        """Call ``callback(key, old, new)`` on every change; returns an unsubscribe function."""
+        with self.lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            with self.lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+
+_mirrors: Dict[str, ControlMirror] = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_control_mirror() -> ControlMirror:
+    """Return the flag mirror for the current database and flag scope."""
+    scope = get_control_scope()
+    key = get_db_key() if scope == GLOBAL_SCOPE else f"{get_db_key()}|{scope}"
+    mirror = _mirrors.get(key)
+    if mirror is None:
+        with _mirrors_lock:
+            mirror = _mirrors.setdefault(key, ControlMirror(scope=scope))
+    return mirror
+
+
+async def watch_flags(
+    keys: Optional[Iterable[str]] = None,
+) -> AsyncIterator[Tuple[str, Optional[str]]]:
+    """Yield (key, new_value) for flag changes, polling data_version while idle."""
+    # imported here: asyncio alone costs more than the rest of a status command's imports
+    import asyncio
+
+    wanted = set(keys) if keys is not None else None
+    mirror = get_control_mirror()
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[Tuple[str, Optional[str]]] = asyncio.Queue()
+
+    def on_change(key: str, old: Optional[str], new: Optional[str]) -> None:
+        if wanted is None or key in wanted:
+            loop.call_soon_threadsafe(queue.put_nowait, (key, new))
+
+    unsubscribe = mirror.subscribe(on_change)
+    try:
+        mirror.maybe_refresh()
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), mirror.refresh_interval_sec)
+            except asyncio.TimeoutError:
+                mirror.refresh()
+    finally:
+        unsubscribe()
 
 
 def get_flag(key: str, default: Optional[str] = None) -> Optional[str]:
     """Return the control flag value for the given key or a default if missing."""
-    with get_connection() as conn:
-        cursor = conn.execute(
-            "SELECT value FROM control_flags WHERE key = ?", (key,)
-        )
-        row = cursor.fetchone()
-        if row is None:
-            return default
-        return row["value"]
+    mirror = get_control_mirror()
+    mirror.maybe_refresh()
+    return mirror.values.get(key, default)
 
 
 def set_flag(key: str, value: str) -> None:
-    """Insert or replace a control flag value."""
-    ts = int(time.time())
-    with get_connection() as conn:
-        conn.execute(
-            """
-            INSERT OR REPLACE INTO control_flags (key, value, updated_at)
-            VALUES (?, ?, ?)
-            """,
-            (key, value, ts),
-        )
+    """Insert or replace a control flag value and wake engines watching the flags."""
+    get_storage().set_flag(key, value)
+    get_control_mirror().apply_local(key, value)
+    notify_engine(f"flag:{key}")
 
 
 def get_safe_mode() -> bool:
     """Return True if safe_mode flag is set to 'true'."""
-    value = get_flag("safe_mode", default="false")
-    return value.lower() == "true" if value is not None else False
+    mirror = get_control_mirror()
+    mirror.maybe_refresh()
+    return mirror.safe_mode
 
 
-def set_safe_mode(enabled: bool) -> None:
-    """Set the safe_mode flag to 'true' or 'false'."""
-    set_flag("safe_mode", "true" if enabled else "false")
+def set_safe_mode(enabled: bool, scope: Optional[str] = None) -> None:
+    """Set the safe_mode flag to 'true' or 'false' (in this process's scope by default)."""
+    key = scoped_flag_key("safe_mode", get_control_scope() if scope is None else scope)
+    set_flag(key, "true" if enabled else "false")
 
 
 def get_restart_needed() -> bool:
     """Return True if restart_needed flag is set to 'true'."""
-    value = get_flag("restart_needed", default="false")
-    return value.lower() == "true" if value is not None else False
+    mirror = get_control_mirror()
+    mirror.maybe_refresh()
+    return mirror.restart_needed
 
 
-def set_restart_needed(enabled: bool) -> None:
-    """Set the restart_needed flag to 'true' or 'false'."""
-    set_flag("restart_needed", "true" if enabled else "false")
+def set_restart_needed(enabled: bool, scope: Optional[str] = None) -> None:
+    """Set the restart_needed flag to 'true' or 'false' (in this process's scope by default)."""
+    key = scoped_flag_key("restart_needed", get_control_scope() if scope is None else scope)
+    set_flag(key, "true" if enabled else "false")
 
 
 def get_engine_state(default: str = "stopped") -> str:
     """Return the current engine state or a default if missing."""
-    return get_flag("engine_state", default=default) or default
+    mirror = get_control_mirror()
+    mirror.maybe_refresh()
+    return mirror.engine_state or default
 
 
-def set_engine_state(state: str) -> None:
+def set_engine_state(state: str, scope: Optional[str] = None) -> None:
     """Set the current engine state, optionally validating known states."""
     allowed_states = {"stopped", "starting", "running", "stopping", "degraded"}
     if state not in allowed_states:
         raise ValueError(f"Invalid engine state: {state}")
-    set_flag("engine_state", state)
+    set_flag(scoped_flag_key("engine_state", get_control_scope() if scope is None else scope), state)
 
 
 if __name__ == "__main__":
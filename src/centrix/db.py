@@ -1,77 +1,1224 @@
 from __future__ import annotations
 
+import atexit
+import hashlib
+import os
 import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable, List
+from typing import Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix.order_model import (
+    ORDER_COLUMNS,
+    TRADE_COLUMNS,
+    NewOrder,
+    OrderBatch,
+    OrderRecord,
+    TradeRecord,
+    order_row_factory,
+    trade_row_factory,
+)
+from centrix.order_state import (
+    OPEN_STATUSES,
+    PROPOSED,
+    apply_transitions,
+    claim_proposed,
+    record_created,
+)
+
+# Connection tuning: WAL lets readers run alongside the single writer,
+# synchronous=NORMAL is durable enough in WAL mode and avoids an fsync per commit.
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+_STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_registry_lock = threading.Lock()
+# (pid, owning thread, connection) of every pooled connection; close_all_connections bumps
+# the generation so other threads drop their closed handles on the next get_connection
+_open_connections: List[Tuple[int, threading.Thread, sqlite3.Connection]] = []
+_generation = 0
+_close_hooks: List[Callable[[], None]] = []
 
 
 def get_db_path() -> Path:
-    """Return the filesystem path of the SQLite database file."""
+    """Return the filesystem path of the SQLite database file (CENTRIX_DB_PATH overrides)."""
+    env_path = os.getenv("CENTRIX_DB_PATH")
+    if env_path:
+        return Path(env_path)
     project_root = Path(__file__).resolve().parents[2]
     return project_root / "centrix.db"
 
 
-def get_connection() -> sqlite3.Connection:
-    """Create a new SQLite connection with row access by column name."""
-    conn = sqlite3.connect(get_db_path())
+_db_key_cache: Tuple[Optional[str], str] = ("", "")
+
+
+def get_db_key() -> str:
+    """Return ``str(get_db_path())``, cached until CENTRIX_DB_PATH changes (hot-path helper)."""
+    global _db_key_cache
+    env_path = os.environ.get("CENTRIX_DB_PATH")
+    cached_env, cached_key = _db_key_cache
+    if cached_key and cached_env == env_path:
+        return cached_key
+    key = str(get_db_path())
+    _db_key_cache = (env_path, key)
+    return key
+
+
+def is_memory_db(path: Path | str) -> bool:
+    """True for ``:memory:`` and ``file:...?mode=memory`` URIs (no file, no WAL, no sockets)."""
+    text = str(path)
+    return text == ":memory:" or (text.startswith("file:") and "mode=memory" in text)
+
+
+def open_connection(path: Path | str | None = None) -> sqlite3.Connection:
+    """Open a new, tuned SQLite connection with row access by column name.
+
+    ``file:`` URIs are passed through, e.g. ``file:bt?mode=memory&cache=shared`` for an
+    in-memory database shared by all threads of the process.
+    """
+    target = path if path is not None else get_db_path()
+    conn = sqlite3.connect(
+        str(target),
+        cached_statements=_STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+        uri=str(target).startswith("file:"),
+    )
     conn.row_factory = sqlite3.Row
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
-def init_schema() -> None:
-    """Create required tables if they do not yet exist."""
-    schema = """
-    CREATE TABLE IF NOT EXISTS config_settings (
-        id INTEGER PRIMARY KEY,
-        key TEXT NOT NULL,
-        value TEXT NOT NULL,
-        value_type TEXT NOT NULL,
-        scope TEXT NOT NULL,
-        updated_at INTEGER NOT NULL,
-        updated_by TEXT,
-        UNIQUE(key, scope)
-    );
-
-    CREATE TABLE IF NOT EXISTS control_flags (
-        key TEXT PRIMARY KEY,
-        value TEXT NOT NULL,
-        updated_at INTEGER NOT NULL
-    );
-
-    CREATE TABLE IF NOT EXISTS heartbeats (
-        id INTEGER PRIMARY KEY,
-        source TEXT NOT NULL,
-        status TEXT NOT NULL,
-        ts INTEGER NOT NULL
-    );
-
-    CREATE TABLE IF NOT EXISTS orders (
-        id INTEGER PRIMARY KEY,
-        symbol TEXT NOT NULL,
-        side TEXT NOT NULL,
-        quantity REAL NOT NULL,
-        status TEXT NOT NULL,
-        created_at INTEGER NOT NULL,
-        updated_at INTEGER NOT NULL,
-        error_message TEXT
-    );
-
-    CREATE TABLE IF NOT EXISTS trades (
-        id INTEGER PRIMARY KEY,
-        order_id INTEGER NOT NULL,
-        fill_price REAL,
-        fill_qty REAL,
-        ts INTEGER NOT NULL,
-        FOREIGN KEY(order_id) REFERENCES orders(id)
-    );
+def _thread_connections() -> Dict[str, sqlite3.Connection]:
+    """Return the per-thread connection map.
+
+    Connections inherited via fork or closed by ``close_all_connections`` are discarded.
     """
+    pid = os.getpid()
+    if getattr(_local, "pid", None) != pid or getattr(_local, "generation", None) != _generation:
+        _local.pid = pid
+        _local.generation = _generation
+        _local.connections = {}
+    return _local.connections
+
+
+def _prune_registry() -> List[sqlite3.Connection]:
+    """Drop registry entries of exited threads and other processes; return those to close.
+
+    Caller holds ``_registry_lock``. Connections inherited via fork are dropped unclosed.
+    """
+    pid = os.getpid()
+    stale: List[sqlite3.Connection] = []
+    kept = []
+    for entry in _open_connections:
+        owner_pid, thread, conn = entry
+        if owner_pid != pid:
+            continue
+        if thread.is_alive():
+            kept.append(entry)
+        else:
+            stale.append(conn)
+    _open_connections[:] = kept
+    return stale
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return the long-lived connection for the current thread and database path.
+
+    The connection is reused across calls; ``with get_connection() as conn:``
+    commits or rolls back the transaction but keeps the connection open.
+    """
+    key = get_db_key()
+    connections = _thread_connections()
+    conn = connections.get(key)
+    if conn is None:
+        conn = open_connection(key)
+        connections[key] = conn
+        with _registry_lock:
+            stale = _prune_registry()
+            _open_connections.append((os.getpid(), threading.current_thread(), conn))
+        for old in stale:
+            try:
+                old.close()
+            except sqlite3.Error:
+                pass
+    return conn
+
+
+def register_close_hook(hook: Callable[[], None]) -> None:
+    """Register a callback that runs before pooled connections are closed."""
+    with _registry_lock:
+        if hook not in _close_hooks:
+            _close_hooks.append(hook)
+
+
+def close_connection() -> None:
+    """Close the current thread's pooled connections."""
+    connections = _thread_connections()
+    closing = set(map(id, connections.values()))
+    with _registry_lock:
+        _open_connections[:] = [e for e in _open_connections if id(e[2]) not in closing]
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+
+def close_all_connections() -> None:
+    """Run close hooks, then close every pooled connection of this process.
+
+    Other threads notice the closed handles through the pool generation and reopen.
+    """
+    global _generation
+    with _registry_lock:
+        hooks = list(_close_hooks)
+    for hook in hooks:
+        try:
+            hook()
+        except Exception as exc:  # a failing hook must not keep connections open
+            print(f"[db] close hook failed: {exc}")
+
+    pid = os.getpid()
+    with _registry_lock:
+        connections = [conn for owner_pid, _, conn in _open_connections if owner_pid == pid]
+        _open_connections.clear()
+        _generation += 1
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _local.connections = {}
+
+
+atexit.register(close_all_connections)
+
+
+# Migrations: ordered by version, never edited once released (the checksum is verified on
+# every migrate). Statements must be idempotent; a migration is recorded in
+# schema_migrations and PRAGMA user_version only after its statements and backfill finished.
+
+
+@dataclass(frozen=True)
+class Backfill:
+    """Data migration run in short write transactions over rowid chunks of ``table``.
+
+    ``sql`` gets the (first, last) rowid of the chunk and must be idempotent: an interrupted
+    backfill resumes after the last committed chunk. Rows written after the backfill started
+    are the live code's job, so it stops at the rowid it saw first.
+    """
+
+    table: str
+    sql: str
+    chunk_rows: int = 5000
+
+
+@dataclass(frozen=True)
+class AddColumn:
+    """``ALTER TABLE ... ADD COLUMN``, which SQLite cannot make idempotent; skipped when the
+    column already exists."""
+
+    table: str
+    column: str
+    definition: str
+
+    @property
+    def sql(self) -> str:
+        return f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.definition}"
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    statements: Tuple[str, ...]
+    backfill: Optional[Backfill] = None
+    columns: Tuple[AddColumn, ...] = ()
+
+    @property
+    def checksum(self) -> str:
+        """sha256 over the normalized columns, statements and backfill (chunk size excluded)."""
+        parts = [column.sql for column in self.columns] + list(self.statements)
+        if self.backfill is not None:
+            parts += [self.backfill.table, self.backfill.sql]
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(" ".join(part.split()).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+
+MIGRATIONS: Tuple[Migration, ...] = (
+    Migration(
+        1,
+        "baseline",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS config_settings (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                value_type TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                updated_at INTEGER NOT NULL,
+                updated_by TEXT,
+                UNIQUE(key, scope)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS control_flags (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at INTEGER NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS heartbeats (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                status TEXT NOT NULL,
+                ts INTEGER NOT NULL
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_heartbeats_source_ts
+                ON heartbeats (source, ts, status)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS heartbeat_latest (
+                source TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                ts INTEGER NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS heartbeat_minutes (
+                source TEXT NOT NULL,
+                minute_ts INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                first_ts INTEGER NOT NULL,
+                last_ts INTEGER NOT NULL,
+                PRIMARY KEY (source, minute_ts, status)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY,
+                symbol TEXT NOT NULL,
+                side TEXT NOT NULL,
+                quantity REAL NOT NULL,
+                status TEXT NOT NULL,
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL,
+                error_message TEXT
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_orders_status_updated
+                ON orders (status, updated_at)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS order_events (
+                id INTEGER PRIMARY KEY,
+                order_id INTEGER NOT NULL,
+                from_status TEXT,
+                to_status TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                error_message TEXT,
+                FOREIGN KEY(order_id) REFERENCES orders(id)
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_order_events_order
+                ON order_events (order_id, id)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS trades (
+                id INTEGER PRIMARY KEY,
+                order_id INTEGER NOT NULL,
+                fill_price REAL,
+                fill_qty REAL,
+                ts INTEGER NOT NULL,
+                FOREIGN KEY(order_id) REFERENCES orders(id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS risk_snapshots (
+                id INTEGER PRIMARY KEY,
+                last_trade_id INTEGER NOT NULL,
+                session_start INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                state TEXT NOT NULL
+            )
+            """,
+        ),
+    ),
+    Migration(
+        2,
+        "order_status_and_heartbeat_ts_indexes",
+        (
+            # list_orders_by_status: WHERE status = ? ORDER BY id without a temp b-tree sort
+            "CREATE INDEX IF NOT EXISTS idx_orders_status_id ON orders (status, id)",
+            # compact_heartbeats: DELETE ... WHERE ts < ? as a range search instead of a scan
+            "CREATE INDEX IF NOT EXISTS idx_heartbeats_ts ON heartbeats (ts)",
+        ),
+    ),
+    Migration(
+        3,
+        "backfill_heartbeat_latest",
+        (),
+        # databases from before heartbeat_latest existed hit the fallback scan on every lookup
+        Backfill(
+            table="heartbeats",
+            sql="""
+            INSERT INTO heartbeat_latest (source, status, ts)
+            SELECT source, status, ts FROM heartbeats
+            WHERE id BETWEEN ? AND ?
+            ORDER BY id
+            ON CONFLICT(source) DO UPDATE SET status = excluded.status, ts = excluded.ts
+            WHERE excluded.ts >= heartbeat_latest.ts
+            """,
+        ),
+    ),
+    Migration(
+        4,
+        "order_client_order_id",
+        (
+            # idempotent intake: at most one order per client-supplied key
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_client_order_id
+                ON orders (client_order_id) WHERE client_order_id IS NOT NULL
+            """,
+        ),
+        columns=(AddColumn("orders", "client_order_id", "TEXT"),),
+    ),
+    Migration(
+        5,
+        "trades_order_index",
+        # fill prices of given orders (strategy fills) without scanning trades
+        ("CREATE INDEX IF NOT EXISTS idx_trades_order ON trades (order_id)",),
+    ),
+)
+
+# Latest migration version; stored in PRAGMA user_version once applied.
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        applied_at INTEGER NOT NULL,
+        duration_ms INTEGER NOT NULL
+    )
+"""
+
+
+def _backfill_flag(version: int) -> str:
+    return f"migration.{version}.backfill"
+
+
+def _has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def applied_migrations(conn: Optional[sqlite3.Connection] = None) -> Dict[int, str]:
+    """Return ``{version: checksum}`` of the migrations recorded in the database."""
+    conn = conn if conn is not None else get_connection()
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_migrations'"
+    ).fetchone()
+    if exists is None:
+        return {}
+    rows = conn.execute("SELECT version, checksum FROM schema_migrations").fetchall()
+    return {int(row[0]): row[1] for row in rows}
+
+
+def verify_migrations(applied: Dict[int, str]) -> None:
+    """Raise ValueError when a recorded migration is unknown or was edited after release."""
+    known = {migration.version: migration for migration in MIGRATIONS}
+    for version, checksum in sorted(applied.items()):
+        migration = known.get(version)
+        if migration is None:
+            raise ValueError(
+                f"Database has migration {version}, newer than this build ({SCHEMA_VERSION})"
+            )
+        if migration.checksum != checksum:
+            raise ValueError(
+                f"Migration {version} ({migration.name}) changed after it was applied: "
+                f"checksum {checksum[:12]} in database, {migration.checksum[:12]} in code"
+            )
+
+
+def _run_backfill(conn: sqlite3.Connection, migration: Migration, pause_sec: float) -> int:
+    """Run the migration's backfill chunk by chunk; return the number of chunks committed."""
+    backfill = migration.backfill
+    if backfill is None:
+        return 0
+    flag = _backfill_flag(migration.version)
+    row = conn.execute("SELECT value FROM control_flags WHERE key = ?", (flag,)).fetchone()
+    done = int(row[0]) if row is not None else 0
+    high = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {backfill.table}").fetchone()[0]
+    conn.commit()
+    chunks = 0
+    while done < high:
+        # chunk by row count rather than rowid span: compaction leaves long id gaps
+        upper = conn.execute(
+            f"""
+            SELECT MAX(rowid) FROM (
+                SELECT rowid FROM {backfill.table} WHERE rowid > ? AND rowid <= ?
+                ORDER BY rowid LIMIT ?
+            )
+            """,
+            (done, high, max(1, backfill.chunk_rows)),
+        ).fetchone()[0]
+        if upper is None:
+            break
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(backfill.sql, (done + 1, upper))
+            conn.execute(
+                """
+                INSERT INTO control_flags (key, value, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value,
+                    updated_at = excluded.updated_at
+                """,
+                (flag, str(upper), int(time.time())),
+            )
+        done = upper
+        chunks += 1
+        if pause_sec > 0:
+            # let other writers take the lock between chunks
+            time.sleep(pause_sec)
+    return chunks
+
+
+@dataclass
+class MigrationReport:
+    applied: List[Tuple[int, str, float]] = field(default_factory=list)
+    backfill_chunks: int = 0
+    plans_before: Dict[str, List[str]] = field(default_factory=dict)
+    plans_after: Dict[str, List[str]] = field(default_factory=dict)
+
+
+def migrate(
+    target: Optional[int] = None, pause_sec: float = 0.0, capture_plans: bool = False
+) -> MigrationReport:
+    """Apply pending migrations up to ``target`` (default: all) and return what was done.
+
+    Each migration's statements run in one BEGIN IMMEDIATE transaction, its backfill in
+    chunks of short transactions (``pause_sec`` between them), then it is recorded.
+    Several processes may migrate at once: statements and backfills are idempotent and
+    recording re-checks schema_migrations under the write lock.
+    """
+    target = SCHEMA_VERSION if target is None else target
+    conn = get_connection()
+    report = MigrationReport()
+    if capture_plans:
+        report.plans_before = explain_hot_queries(conn)
+    with conn:
+        conn.execute(_MIGRATIONS_TABLE)
+    applied = applied_migrations(conn)
+    verify_migrations(applied)
+
+    for migration in MIGRATIONS:
+        if migration.version > target or migration.version in applied:
+            continue
+        started = time.perf_counter()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for column in migration.columns:
+                if not _has_column(conn, column.table, column.column):
+                    conn.execute(column.sql)
+            for statement in migration.statements:
+                conn.execute(statement)
+        report.backfill_chunks += _run_backfill(conn, migration, pause_sec)
+        elapsed = time.perf_counter() - started
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO schema_migrations
+                    (version, name, checksum, applied_at, duration_ms)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (
+                    migration.version,
+                    migration.name,
+                    migration.checksum,
+                    int(time.time()),
+                    int(elapsed * 1000),
+                ),
+            )
+            conn.execute(
+                "DELETE FROM control_flags WHERE key = ?", (_backfill_flag(migration.version),)
+            )
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            conn.execute(f"PRAGMA user_version = {max(current, migration.version)}")
+        report.applied.append((migration.version, migration.name, elapsed))
+        print(f"[db] migration {migration.version} {migration.name} applied in {elapsed:.3f}s")
+
+    if report.applied:
+        # refresh planner statistics for the new indexes
+        conn.execute("PRAGMA optimize")
+    if capture_plans:
+        report.plans_after = explain_hot_queries(conn)
+    return report
+
+
+def init_schema(force: bool = False) -> None:
+    """Bring the database to ``SCHEMA_VERSION`` unless it already carries it.
+
+    The check is a single ``PRAGMA user_version`` read, so calling this at the start of
+    every command is cheap; ``force`` runs ``migrate`` (checksum verification included)
+    regardless.
+    """
+    conn = get_connection()
+    if not force and conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    migrate()
+
+
+# Hot queries registered by the modules that run them; ``explain_hot_queries`` shows whether
+# the planner uses the indexes the migrations create.
+_hot_queries: Dict[str, Tuple[str, Tuple[object, ...]]] = {}
+
+
+def register_hot_query(name: str, sql: str, params: Sequence[object] = ()) -> None:
+    """Register a query (with representative parameters) for EXPLAIN QUERY PLAN capture."""
+    _hot_queries[name] = (sql, tuple(params))
+
+
+def explain_hot_queries(conn: Optional[sqlite3.Connection] = None) -> Dict[str, List[str]]:
+    """Return the EXPLAIN QUERY PLAN detail lines of every registered hot query."""
+    conn = conn if conn is not None else get_connection()
+    plans: Dict[str, List[str]] = {}
+    for name, (sql, params) in sorted(_hot_queries.items()):
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            plans[name] = [str(row[3]) for row in rows]
+        except sqlite3.Error as exc:  # e.g. table not created yet on the "before" capture
+            plans[name] = [f"error: {exc}"]
+    return plans
+
+
+def format_query_plans(
+    after: Dict[str, List[str]], before: Optional[Dict[str, List[str]]] = None
+) -> str:
+    """Render plans per query; with ``before``, changed plans show both versions."""
+    lines: List[str] = []
+    for name, plan in after.items():
+        previous = None if before is None else before.get(name)
+        if previous is not None and previous != plan:
+            lines.append(f"{name}: (changed)")
+            lines.extend(f"  - {detail}" for detail in previous)
+            lines.extend(f"  + {detail}" for detail in plan)
+        else:
+            lines.append(f"{name}:")
+            lines.extend(f"    {detail}" for detail in plan)
+    return "\n".join(lines)
+
+
+# Storage: the repository the config, flag, heartbeat, order and position services read and
+# write through. SQLiteStorage below is the default; CENTRIX_STORAGE=memory selects the
+# process-local MemoryStorage of centrix.storage. Migrations, the order journal and the hot
+# query plans are SQLite-only and keep using the pooled connections directly.
+
+HeartbeatEntry = Tuple[str, str, int]
+StatusUpdate = Tuple[int, str, Optional[str]]
+Fill = Tuple[int, float, float]
+# (key, scope, value, value_type) of one config_settings row
+ConfigRow = Tuple[str, str, str, str]
+# (trade id, symbol, side, qty, price, ts) of one fill joined with its order
+FillRow = Tuple[int, str, str, float, float, int]
+
+# SQLite's default limit on bound parameters is 999 on older builds
+_IN_CHUNK = 500
+
+
+class Storage(ABC):
+    """Repository for config, control flags, heartbeats, orders, trades and risk snapshots.
+
+    Methods are synchronous and each one is atomic: a failing batch changes nothing. Order
+    status changes are validated against the order state machine and logged as events.
+    """
+
+    @abstractmethod
+    def get_config(self, key: str, scope: str = "global") -> Optional[str]: ...
+
+    @abstractmethod
+    def set_config(
+        self,
+        key: str,
+        value: str,
+        scope: str = "global",
+        value_type: str = "str",
+        updated_by: str = "system",
+        bump_version: bool = False,
+    ) -> Optional[int]:
+        """Insert or replace a value; with ``bump_version`` return the new config version."""
+
+    @abstractmethod
+    def bump_config_version(self) -> int: ...
+
+    @abstractmethod
+    def load_config(self) -> Tuple[int, List[ConfigRow]]:
+        """The config version and every config row, read consistently."""
+
+    @abstractmethod
+    def get_flags(self) -> Dict[str, str]: ...
+
+    @abstractmethod
+    def set_flag(self, key: str, value: str) -> None: ...
+
+    @abstractmethod
+    def add_flag(self, key: str, value: str) -> bool:
+        """Insert a flag unless it exists; return True if it was inserted."""
+
+    @abstractmethod
+    def flags_version(self) -> Hashable:
+        """Token that changes when another writer has committed; equal tokens skip a reload."""
+
+    @abstractmethod
+    def write_heartbeats(self, entries: Sequence[HeartbeatEntry]) -> None: ...
+
+    @abstractmethod
+    def get_latest_heartbeat(self, source: str) -> Optional[Dict[str, int | str]]: ...
+
+    @abstractmethod
+    def compact_heartbeats(self, cutoff: int, aggregate_cutoff: int) -> int:
+        """Fold heartbeats older than ``cutoff`` into minute rows; return raw rows removed."""
+
+    @abstractmethod
+    def insert_orders(
+        self, orders: Sequence[NewOrder], ts: int, known: Optional[Mapping[str, int]] = None
+    ) -> Tuple[List[int], int]:
+        """Insert proposed orders; return (ids in input order, number of rows inserted).
+
+        An order whose client_order_id is already used (or listed in ``known``) gets that
+        order's id and no new row; new ids are contiguous.
+        """
+
+    @abstractmethod
+    def find_client_order_ids(self, client_order_ids: Sequence[str]) -> Dict[str, int]: ...
+
+    @abstractmethod
+    def get_orders(self, order_ids: Sequence[int]) -> Dict[int, OrderRecord]: ...
+
+    @abstractmethod
+    def get_order_by_client_id(self, client_order_id: str) -> Optional[OrderRecord]: ...
+
+    @abstractmethod
+    def list_orders_by_status(
+        self, status: str, limit: int = 500, symbols: Optional[Sequence[str]] = None
+    ) -> List[OrderRecord]: ...
+
+    @abstractmethod
+    def list_open_orders(self, limit: int = 10000) -> List[OrderRecord]:
+        """Orders in flight, 'executing' first, each group oldest update first."""
+
+    @abstractmethod
+    def load_order_batch(
+        self, status: Optional[str] = None, since_id: int = 0, limit: Optional[int] = None
+    ) -> OrderBatch: ...
+
+    @abstractmethod
+    def get_order_events(self, order_id: int) -> List[Dict[str, object]]: ...
+
+    @abstractmethod
+    def update_order_statuses(
+        self, updates: Sequence[StatusUpdate], ts: int, skip_invalid: bool = False
+    ) -> None:
+        """Apply validated transitions; ValueError on an invalid one unless ``skip_invalid``."""
+
+    @abstractmethod
+    def claim_orders(self, order_ids: Sequence[int], ts: int) -> List[int]:
+        """Move the still-'proposed' orders to 'executing'; return the ids claimed."""
+
+    @abstractmethod
+    def insert_trades(self, fills: Sequence[Fill], ts: int) -> List[int]:
+        """Insert (order_id, price, qty) fills; return their contiguous trade ids."""
+
+    @abstractmethod
+    def list_trades(self, since_id: int = 0, limit: int = 10000) -> List[TradeRecord]: ...
+
+    @abstractmethod
+    def list_fills(self, since_id: int = 0) -> List[FillRow]: ...
+
+    @abstractmethod
+    def fill_summary(self, order_ids: Sequence[int]) -> Dict[int, Tuple[float, float]]:
+        """(filled quantity, average price) per order that has fills."""
+
+    @abstractmethod
+    def load_risk_snapshot(self) -> Optional[Tuple[int, int, str]]:
+        """(last_trade_id, session_start, state JSON) of the saved snapshot, if any."""
+
+    @abstractmethod
+    def save_risk_snapshot(
+        self, last_trade_id: int, session_start: int, ts: int, state: str
+    ) -> None: ...
+
+
+# ids up to this control flag are handed out by the order journal ahead of materialization
+RESERVED_ID_FLAG = "orders.reserved_id"
+_NEXT_ORDER_ID = """
+    SELECT MAX(
+        COALESCE((SELECT MAX(id) FROM orders), 0),
+        COALESCE((SELECT CAST(value AS INTEGER) FROM control_flags WHERE key = ?), 0)
+    ) + 1
+"""
+_INSERT_ORDER = """
+    INSERT INTO orders (id, symbol, side, quantity, client_order_id, status,
+                        created_at, updated_at, error_message)
+    VALUES (?, ?, ?, ?, ?, 'proposed', ?, ?, NULL)
+"""
+_OPEN_ORDERS = f"""
+    SELECT {ORDER_COLUMNS} FROM orders
+    WHERE status IN ({",".join("?" * len(OPEN_STATUSES))})
+    ORDER BY status, updated_at
+    LIMIT ?
+"""
+_ORDER_EVENTS = """
+    SELECT from_status, to_status, ts, error_message
+    FROM order_events
+    WHERE order_id = ?
+    ORDER BY id
+"""
+_TRADES_SINCE = f"SELECT {TRADE_COLUMNS} FROM trades WHERE id > ? ORDER BY id LIMIT ?"
+_FILLS_SINCE = """
+    SELECT t.id, o.symbol, o.side, t.fill_qty, t.fill_price, t.ts
+    FROM trades t JOIN orders o ON o.id = t.order_id
+    WHERE t.id > ?
+    ORDER BY t.id
+"""
+_ORDER_BY_CLIENT_ID = f"SELECT {ORDER_COLUMNS} FROM orders WHERE client_order_id = ?"
+
+_SELECT_CONFIG = "SELECT value FROM config_settings WHERE key = ? AND scope = ?"
+_SELECT_CONFIG_VERSION = "SELECT value FROM control_flags WHERE key = 'config_version'"
+_SELECT_ALL_CONFIG = "SELECT key, scope, value, value_type FROM config_settings"
+_UPSERT_CONFIG = """
+    INSERT OR REPLACE INTO config_settings
+    (id, key, value, value_type, scope, updated_at, updated_by)
+    VALUES (
+        (
+            SELECT id FROM config_settings WHERE key = ? AND scope = ?
+        ),
+        ?, ?, ?, ?, ?, ?
+    )
+"""
+_BUMP_CONFIG_VERSION = """
+    INSERT INTO control_flags (key, value, updated_at)
+    VALUES ('config_version', '1', ?)
+    ON CONFLICT(key) DO UPDATE SET
+        value = CAST(CAST(value AS INTEGER) + 1 AS TEXT),
+        updated_at = excluded.updated_at
+"""
+
+_INSERT_HEARTBEAT = "INSERT INTO heartbeats (source, status, ts) VALUES (?, ?, ?)"
+_UPSERT_LATEST = """
+    INSERT INTO heartbeat_latest (source, status, ts)
+    VALUES (?, ?, ?)
+    ON CONFLICT(source) DO UPDATE SET status = excluded.status, ts = excluded.ts
+    WHERE excluded.ts >= heartbeat_latest.ts
+"""
+_SELECT_LATEST = "SELECT source, status, ts FROM heartbeat_latest WHERE source = ?"
+# databases written before heartbeat_latest existed; served by the covering index
+_SELECT_LATEST_FALLBACK = """
+    SELECT source, status, ts
+    FROM heartbeats
+    WHERE source = ?
+    ORDER BY ts DESC
+    LIMIT 1
+"""
+_COMPACT_MINUTES = """
+    INSERT INTO heartbeat_minutes (source, minute_ts, status, count, first_ts, last_ts)
+    SELECT source, (ts / 60) * 60, status, COUNT(*), MIN(ts), MAX(ts)
+    FROM heartbeats
+    WHERE ts < ?
+    GROUP BY source, (ts / 60) * 60, status
+    ON CONFLICT(source, minute_ts, status) DO UPDATE SET
+        count = heartbeat_minutes.count + excluded.count,
+        first_ts = MIN(heartbeat_minutes.first_ts, excluded.first_ts),
+        last_ts = MAX(heartbeat_minutes.last_ts, excluded.last_ts)
+"""
+_DELETE_COMPACTED = "DELETE FROM heartbeats WHERE ts < ?"
+
+
+def _orders_by_status_sql(symbol_count: int) -> str:
+    sql = f"SELECT {ORDER_COLUMNS} FROM orders WHERE status = ?"
+    if symbol_count:
+        sql += f" AND symbol IN ({','.join('?' * symbol_count)})"
+    return sql + " ORDER BY id LIMIT ?"
+
+
+register_hot_query("config.get", _SELECT_CONFIG, ("risk.max_order_size", "global"))
+register_hot_query("config.version", _SELECT_CONFIG_VERSION)
+register_hot_query("config.snapshot", _SELECT_ALL_CONFIG)
+register_hot_query("heartbeat.latest", _SELECT_LATEST, ("engine",))
+register_hot_query("heartbeat.latest_fallback", _SELECT_LATEST_FALLBACK, ("engine",))
+register_hot_query("heartbeat.compact_minutes", _COMPACT_MINUTES, (0,))
+register_hot_query("heartbeat.delete_compacted", _DELETE_COMPACTED, (0,))
+register_hot_query("order.next_id", _NEXT_ORDER_ID, (RESERVED_ID_FLAG,))
+register_hot_query("order.by_status", _orders_by_status_sql(0), (PROPOSED, 500))
+register_hot_query(
+    "order.by_status_symbols", _orders_by_status_sql(2), (PROPOSED, "AAPL", "MSFT", 500)
+)
+register_hot_query("order.open", _OPEN_ORDERS, (*OPEN_STATUSES, 10000))
+register_hot_query("order.events", _ORDER_EVENTS, (1,))
+register_hot_query("order.trades_since", _TRADES_SINCE, (0, 10000))
+register_hot_query("order.by_client_id", _ORDER_BY_CLIENT_ID, ("demo-1",))
+
+
+def next_order_id(conn: sqlite3.Connection) -> int:
+    """First free order id, skipping ranges reserved by the journal (hold the write lock)."""
+    return int(conn.execute(_NEXT_ORDER_ID, (RESERVED_ID_FLAG,)).fetchone()[0])
+
+
+def _order_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """Cursor that yields OrderRecord directly (queries must select ORDER_COLUMNS)."""
+    cursor = conn.cursor()
+    cursor.row_factory = order_row_factory
+    return cursor
+
+
+def _select_client_order_ids(
+    conn: sqlite3.Connection, client_order_ids: Sequence[str]
+) -> Dict[str, int]:
+    found: Dict[str, int] = {}
+    for start in range(0, len(client_order_ids), _IN_CHUNK):
+        chunk = client_order_ids[start : start + _IN_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(
+            f"SELECT client_order_id, id FROM orders WHERE client_order_id IN ({placeholders})",
+            chunk,
+        ).fetchall():
+            found[row[0]] = row[1]
+    return found
+
+
+def _write_heartbeat_batch(conn: sqlite3.Connection, entries: Sequence[HeartbeatEntry]) -> None:
+    """Append heartbeat rows and refresh heartbeat_latest inside the caller's transaction."""
+    conn.executemany(_INSERT_HEARTBEAT, entries)
+    latest: Dict[str, HeartbeatEntry] = {}
+    for entry in entries:
+        latest[entry[0]] = entry
+    conn.executemany(_UPSERT_LATEST, list(latest.values()))
+
+
+class SQLiteStorage(Storage):
+    """Storage over the pooled per-thread connections of the current database path."""
+
+    def get_config(self, key: str, scope: str = "global") -> Optional[str]:
+        with get_connection() as conn:
+            row = conn.execute(_SELECT_CONFIG, (key, scope)).fetchone()
+        return None if row is None else row["value"]
+
+    def set_config(
+        self,
+        key: str,
+        value: str,
+        scope: str = "global",
+        value_type: str = "str",
+        updated_by: str = "system",
+        bump_version: bool = False,
+    ) -> Optional[int]:
+        ts = int(time.time())
+        with get_connection() as conn:
+            conn.execute(
+                _UPSERT_CONFIG, (key, scope, key, value, value_type, scope, ts, updated_by)
+            )
+            if bump_version:
+                return self._bump_config_version_in(conn, ts)
+        return None
+
+    @staticmethod
+    def _bump_config_version_in(conn: sqlite3.Connection, ts: int) -> int:
+        conn.execute(_BUMP_CONFIG_VERSION, (ts,))
+        return int(conn.execute(_SELECT_CONFIG_VERSION).fetchone()["value"])
+
+    def bump_config_version(self) -> int:
+        with get_connection() as conn:
+            return self._bump_config_version_in(conn, int(time.time()))
+
+    def load_config(self) -> Tuple[int, List[ConfigRow]]:
+        with get_connection() as conn:
+            # without an explicit read transaction each SELECT autocommits, and a version
+            # bump in between would pair the old version with the new rows
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            version_row = conn.execute(_SELECT_CONFIG_VERSION).fetchone()
+            rows = conn.execute(_SELECT_ALL_CONFIG).fetchall()
+        try:
+            version = int(version_row["value"]) if version_row is not None else 0
+        except (TypeError, ValueError):
+            version = 0
+        return version, [(row[0], row[1], row[2], row[3]) for row in rows]
+
+    def get_flags(self) -> Dict[str, str]:
+        with get_connection() as conn:
+            rows = conn.execute("SELECT key, value FROM control_flags").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def set_flag(self, key: str, value: str) -> None:
+        with get_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO control_flags (key, value, updated_at) VALUES (?, ?, ?)",
+                (key, value, int(time.time())),
+            )
+
+    def add_flag(self, key: str, value: str) -> bool:
+        with get_connection() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO control_flags (key, value, updated_at) VALUES (?, ?, ?)",
+                (key, value, int(time.time())),
+            )
+        return cursor.rowcount == 1
+
+    def flags_version(self) -> Hashable:
+        # data_version moves when another connection commits; it is per connection, so the
+        # token carries the pid (connections are not shared across fork)
+        version = get_connection().execute("PRAGMA data_version").fetchone()[0]
+        return (os.getpid(), version)
+
+    def write_heartbeats(self, entries: Sequence[HeartbeatEntry]) -> None:
+        if entries:
+            with get_connection() as conn:
+                _write_heartbeat_batch(conn, entries)
+
+    def get_latest_heartbeat(self, source: str) -> Optional[Dict[str, int | str]]:
+        with get_connection() as conn:
+            row = conn.execute(_SELECT_LATEST, (source,)).fetchone()
+            if row is None:
+                row = conn.execute(_SELECT_LATEST_FALLBACK, (source,)).fetchone()
+        if row is None:
+            return None
+        return {"source": row["source"], "status": row["status"], "ts": row["ts"]}
+
+    def compact_heartbeats(self, cutoff: int, aggregate_cutoff: int) -> int:
+        with get_connection() as conn:
+            conn.execute(_COMPACT_MINUTES, (cutoff,))
+            removed = conn.execute(_DELETE_COMPACTED, (cutoff,)).rowcount
+            conn.execute("DELETE FROM heartbeat_minutes WHERE minute_ts < ?", (aggregate_cutoff,))
+        return removed
+
+    def insert_orders(
+        self, orders: Sequence[NewOrder], ts: int, known: Optional[Mapping[str, int]] = None
+    ) -> Tuple[List[int], int]:
+        assigned: Dict[str, int] = dict(known or {})
+        unknown = list(
+            dict.fromkeys(
+                order.client_order_id
+                for order in orders
+                if order.client_order_id is not None and order.client_order_id not in assigned
+            )
+        )
+        order_ids: List[int] = []
+        rows: List[Tuple[int, str, str, float, Optional[str], int, int]] = []
+        with get_connection() as conn:
+            # the write lock keeps the id range contiguous and the key lookup authoritative
+            conn.execute("BEGIN IMMEDIATE")
+            if unknown:
+                assigned.update(_select_client_order_ids(conn, unknown))
+            next_id = next_order_id(conn)
+            for order in orders:
+                client_order_id = order.client_order_id
+                if client_order_id is not None and client_order_id in assigned:
+                    order_ids.append(assigned[client_order_id])
+                    continue
+                if client_order_id is not None:
+                    assigned[client_order_id] = next_id
+                rows.append(
+                    (next_id, order.symbol, order.side, order.quantity, client_order_id, ts, ts)
+                )
+                order_ids.append(next_id)
+                next_id += 1
+            if rows:
+                conn.executemany(_INSERT_ORDER, rows)
+                record_created(conn, [row[0] for row in rows], ts)
+        return order_ids, len(rows)
+
+    def find_client_order_ids(self, client_order_ids: Sequence[str]) -> Dict[str, int]:
+        with get_connection() as conn:
+            return _select_client_order_ids(conn, list(client_order_ids))
+
+    def get_orders(self, order_ids: Sequence[int]) -> Dict[int, OrderRecord]:
+        ids = list(order_ids)
+        result: Dict[int, OrderRecord] = {}
+        with get_connection() as conn:
+            for start in range(0, len(ids), _IN_CHUNK):
+                chunk = ids[start : start + _IN_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = _order_cursor(conn).execute(
+                    f"SELECT {ORDER_COLUMNS} FROM orders WHERE id IN ({placeholders})", chunk
+                )
+                for record in cursor.fetchall():
+                    result[record.id] = record
+        return result
+
+    def get_order_by_client_id(self, client_order_id: str) -> Optional[OrderRecord]:
+        with get_connection() as conn:
+            return _order_cursor(conn).execute(_ORDER_BY_CLIENT_ID, (client_order_id,)).fetchone()
+
+    def list_orders_by_status(
+        self, status: str, limit: int = 500, symbols: Optional[Sequence[str]] = None
+    ) -> List[OrderRecord]:
+        params: List[object] = [status, *(symbols or ()), limit]
+        with get_connection() as conn:
+            cursor = _order_cursor(conn).execute(_orders_by_status_sql(len(symbols or ())), params)
+            return cursor.fetchall()
+
+    def list_open_orders(self, limit: int = 10000) -> List[OrderRecord]:
+        with get_connection() as conn:
+            return _order_cursor(conn).execute(_OPEN_ORDERS, (*OPEN_STATUSES, limit)).fetchall()
+
+    def load_order_batch(
+        self, status: Optional[str] = None, since_id: int = 0, limit: Optional[int] = None
+    ) -> OrderBatch:
+        sql = f"SELECT {ORDER_COLUMNS} FROM orders WHERE id > ?"
+        params: List[object] = [since_id]
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        batch = OrderBatch()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.arraysize = 4096
+            batch.extend_rows(cursor.execute(sql, params))
+        return batch
+
+    def get_order_events(self, order_id: int) -> List[Dict[str, object]]:
+        with get_connection() as conn:
+            return [dict(row) for row in conn.execute(_ORDER_EVENTS, (order_id,)).fetchall()]
+
+    def update_order_statuses(
+        self, updates: Sequence[StatusUpdate], ts: int, skip_invalid: bool = False
+    ) -> None:
+        with get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            apply_transitions(conn, updates, ts, skip_invalid=skip_invalid)
+
+    def claim_orders(self, order_ids: Sequence[int], ts: int) -> List[int]:
+        with get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return claim_proposed(conn, order_ids, ts)
+
+    def insert_trades(self, fills: Sequence[Fill], ts: int) -> List[int]:
+        with get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM trades").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO trades (order_id, fill_price, fill_qty, ts) VALUES (?, ?, ?, ?)",
+                [(order_id, price, qty, ts) for order_id, price, qty in fills],
+            )
+        return list(range(first_id, first_id + len(fills)))
+
+    def list_trades(self, since_id: int = 0, limit: int = 10000) -> List[TradeRecord]:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = trade_row_factory
+            return cursor.execute(_TRADES_SINCE, (since_id, limit)).fetchall()
+
+    def list_fills(self, since_id: int = 0) -> List[FillRow]:
+        with get_connection() as conn:
+            rows = conn.execute(_FILLS_SINCE, (since_id,)).fetchall()
+        return [
+            (row[0], row[1], row[2], float(row[3] or 0.0), float(row[4] or 0.0), row[5])
+            for row in rows
+        ]
+
+    def fill_summary(self, order_ids: Sequence[int]) -> Dict[int, Tuple[float, float]]:
+        ids = list(order_ids)
+        summary: Dict[int, Tuple[float, float]] = {}
+        with get_connection() as conn:
+            for start in range(0, len(ids), _IN_CHUNK):
+                chunk = ids[start : start + _IN_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for order_id, qty, value in conn.execute(
+                    f"""
+                    SELECT order_id, SUM(fill_qty), SUM(fill_qty * fill_price) FROM trades
+                    WHERE order_id IN ({placeholders})
+                    GROUP BY order_id
+                    """,
+                    chunk,
+                ):
+                    if qty:
+                        summary[order_id] = (qty, value / qty)
+        return summary
+
+    def load_risk_snapshot(self) -> Optional[Tuple[int, int, str]]:
+        with get_connection() as conn:
+            row = conn.execute(
+                "SELECT last_trade_id, session_start, state FROM risk_snapshots WHERE id = 1"
+            ).fetchone()
+        if row is None:
+            return None
+        return int(row["last_trade_id"]), int(row["session_start"]), row["state"]
+
+    def save_risk_snapshot(
+        self, last_trade_id: int, session_start: int, ts: int, state: str
+    ) -> None:
+        with get_connection() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO risk_snapshots (id, last_trade_id, session_start, ts, state)
+                VALUES (1, ?, ?, ?, ?)
+                """,
+                (last_trade_id, session_start, ts, state),
+            )
+
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """Return the process-wide backend, selected by CENTRIX_STORAGE (sqlite | memory)."""
+    global _storage
+    storage = _storage
+    if storage is not None:
+        return storage
+    with _storage_lock:
+        if _storage is None:
+            kind = os.getenv("CENTRIX_STORAGE", "sqlite").lower()
+            if kind == "sqlite":
+                _storage = SQLiteStorage()
+            elif kind == "memory":
+                from centrix.storage import MemoryStorage
+
+                _storage = MemoryStorage()
+            else:
+                raise ValueError(f"Unknown storage backend: {kind}")
+        return _storage
 
-    with get_connection() as conn:
-        conn.executescript(schema)
 
+def set_storage(storage: Optional[Storage]) -> None:
+    """Install ``storage`` as the process-wide backend (None: select from CENTRIX_STORAGE)."""
+    global _storage
+    with _storage_lock:
+        _storage = storage
 
 if __name__ == "__main__":
-    init_schema()
+    result = migrate(capture_plans=True)
+    print(f"schema version {SCHEMA_VERSION}, applied {[v for v, _, _ in result.applied]}")
     with get_connection() as conn:
         cursor = conn.execute(
             "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
@@ -1,79 +1,266 @@
 from __future__ import annotations
 
+import asyncio
 import sys
 import time
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 if __name__ == "__main__" and __package__ is None:
     sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from centrix.config_service import get_config, get_config_version, set_config
+from centrix.config_service import (
+    get_config,
+    get_config_snapshot,
+    get_config_version,
+    set_config,
+)
 from centrix.control import (
+    get_control_mirror,
     get_restart_needed,
     set_engine_state,
 )
 from centrix.db import init_schema
-from centrix.heartbeat import write_heartbeat
+from centrix.heartbeat import compact_heartbeats, get_heartbeat_sink, write_heartbeat_async
+from centrix.ib_client import get_ib_session
+from centrix.market_data import MarketDataFeed, get_market_data
+from centrix.metrics import start_http_exporter, write_prometheus
+from centrix.order_journal import get_order_journal, journal_enabled
+from centrix.order_router import get_order_router, submit_orders_async
+from centrix.order_service import execute_order, list_orders_by_status, recover_open_orders
+from centrix.order_state import PROPOSED
+from centrix.positions import get_position_tracker, snapshot_positions
+from centrix.scheduler import EngineScheduler
+from centrix.shard import get_shard_id, shard_scope, shard_source
+from centrix.strategy_runtime import StrategyRuntime
 
 
 def load_engine_config() -> Dict[str, int]:
-    """Load engine loop configuration with defaults."""
-    loop_sleep_ms = int(get_config("engine.loop_sleep_ms", default="500") or "500")
-    heartbeat_interval_sec = int(
-        get_config("engine.heartbeat_interval_sec", default="5") or "5"
-    )
+    """Load engine loop configuration with defaults from the cached config snapshot.
+
+    A shard reads its own ``shard:<id>`` scope first and falls back to global values.
+    """
+    snapshot = get_config_snapshot()
+    scope = shard_scope()
+
+    def get_int(key: str, default: int) -> int:
+        return snapshot.get_int(key, scope=scope, default=default) or default
+
+    def get_bool(key: str) -> bool:
+        return bool(snapshot.get_bool(key, scope=scope, default=False))
+
+    loop_sleep_ms = get_int("engine.loop_sleep_ms", 500)
+    heartbeat_interval_sec = get_int("engine.heartbeat_interval_sec", 5)
+    control_poll_ms = get_int("engine.control_poll_ms", 5000)
+    order_poll_ms = get_int("engine.order_poll_ms", 1000)
+    compaction_interval_sec = get_int("heartbeat.compaction_interval_sec", 3600)
+    risk_sync_ms = get_int("risk.sync_interval_ms", 5000)
+    risk_snapshot_sec = get_int("risk.snapshot_interval_sec", 60)
+    gateway_check_sec = get_int("engine.gateway_check_sec", 0)
+    metrics_export_sec = get_int("metrics.export_interval_sec", 10)
+    metrics_http_port = get_int("metrics.http_port", 0)
+    process_orders = get_bool("engine.process_orders")
+    async_submit = get_bool("orders.async_submit")
     return {
         "loop_sleep_ms": loop_sleep_ms,
         "heartbeat_interval_sec": heartbeat_interval_sec,
+        "control_poll_ms": control_poll_ms,
+        "order_poll_ms": order_poll_ms,
+        "compaction_interval_sec": compaction_interval_sec,
+        "risk_sync_ms": risk_sync_ms,
+        "risk_snapshot_sec": risk_snapshot_sec,
+        "gateway_check_sec": gateway_check_sec,
+        "metrics_export_sec": metrics_export_sec,
+        "metrics_http_port": metrics_http_port,
+        "process_orders": int(process_orders),
+        "async_submit": int(async_submit),
     }
 
 
-def run_engine_loop(max_iterations: Optional[int] = None) -> None:
-    """Run the engine loop, emitting heartbeats and reloading config on change."""
+def _task_intervals(config: Dict[str, int]) -> Dict[str, float]:
+    """Period in seconds of each scheduler task whose interval comes from the engine config."""
+    return {
+        "heartbeat": config["heartbeat_interval_sec"],
+        "heartbeat_compaction": config["compaction_interval_sec"],
+        "control_watch": config["control_poll_ms"] / 1000.0,
+        "risk_sync": config["risk_sync_ms"] / 1000.0,
+        "risk_snapshot": config["risk_snapshot_sec"],
+        "gateway_check": config["gateway_check_sec"],
+        "order_processing": config["order_poll_ms"] / 1000.0,
+        "metrics_export": config["metrics_export_sec"],
+    }
+
+
+def _config_list(key: str) -> List[str]:
+    """Comma-separated config value in this process's scope."""
+    value = get_config_snapshot().get(key, scope=shard_scope()) or ""
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+async def _process_proposed_orders(symbols: Optional[List[str]] = None) -> None:
+    """Execute proposed orders off the event loop so slow gateway calls never block it."""
+    loop = asyncio.get_running_loop()
+    for order in list_orders_by_status(PROPOSED, symbols=symbols):
+        await loop.run_in_executor(None, execute_order, order.id)
+
+
+async def _submit_proposed_orders(symbols: Optional[List[str]] = None) -> None:
+    """Pipeline all proposed orders through the order router; fills are persisted by it."""
+    order_ids = [order.id for order in list_orders_by_status(PROPOSED, symbols=symbols)]
+    if order_ids:
+        await asyncio.get_running_loop().run_in_executor(None, submit_orders_async, order_ids)
+
+
+async def _check_gateway() -> None:
+    """Probe the shared gateway session (reconnecting with backoff) and record its status."""
+    loop = asyncio.get_running_loop()
+    connected = await loop.run_in_executor(None, get_ib_session().ensure_connected)
+    write_heartbeat_async(shard_source("gateway"), "connected" if connected else "disconnected")
+
+
+async def run_engine_async(
+    max_iterations: Optional[int] = None, max_runtime_sec: Optional[float] = None
+) -> None:
+    """Run the event-driven engine until restart_needed is set or the runtime limit passes.
+
+    Heartbeats, config/control watch and (optionally) order processing run as timer-wheel
+    tasks; ``set_restart_needed``/``bump_config_version`` wake the engine immediately.
+    ``max_iterations`` keeps its old meaning of a number of ``loop_sleep_ms`` periods.
+
+    Run as a shard (``CENTRIX_SHARD``), the engine uses its scoped config and flags, beats
+    as ``engine:<id>`` and only picks up proposed orders for its ``engine.symbols``.
+    """
     init_schema()
     config = load_engine_config()
-    loop_sleep_ms = config["loop_sleep_ms"]
-    heartbeat_interval_sec = config["heartbeat_interval_sec"]
 
     set_engine_state("starting")
     current_version = get_config_version()
-    set_engine_state("running")
-
-    i = 0
-    last_heartbeat_ts = 0.0
+    journal = get_order_journal() if journal_enabled() else None
+    if journal is not None and journal.replayed:
+        print(f"[engine_loop] {journal.replayed} journal records replayed")
+    open_orders = recover_open_orders()
+    if open_orders:
+        print(f"[engine_loop] {len(open_orders)} open orders after startup recovery")
 
-    while True:
-        now = time.time()
-
-        if now - last_heartbeat_ts >= heartbeat_interval_sec:
-            write_heartbeat("engine", "ok")
-            last_heartbeat_ts = now
+    shard_id = get_shard_id()
+    engine_source = shard_source("engine")
+    scheduler = EngineScheduler(channel_name=engine_source)
 
+    def check_control() -> None:
+        nonlocal config, current_version
+        get_control_mirror().refresh(force=True)
         new_version = get_config_version()
         if new_version != current_version:
             config = load_engine_config()
-            loop_sleep_ms = config["loop_sleep_ms"]
-            heartbeat_interval_sec = config["heartbeat_interval_sec"]
             current_version = new_version
+            for name, interval in _task_intervals(config).items():
+                if name == "gateway_check" and interval <= 0:
+                    scheduler.remove(name)
+                elif name == "gateway_check" and name not in scheduler.tasks:
+                    scheduler.add_periodic(name, interval, _check_gateway)
+                elif name in scheduler.tasks:
+                    scheduler.set_interval(name, interval)
             print(f"[engine_loop] Config reloaded, version={current_version}")
 
         if get_restart_needed():
             print("[engine_loop] restart_needed = true, stopping loop")
             set_engine_state("stopping")
-            break
+            scheduler.stop()
+
+    def on_wakeup(reasons: List[str]) -> None:
+        check_control()
+        if "orders" in reasons:
+            scheduler.trigger("order_processing")
+
+    intervals = _task_intervals(config)
+    scheduler.add_periodic(
+        "heartbeat", intervals["heartbeat"], lambda: write_heartbeat_async(engine_source, "ok")
+    )
+    scheduler.add_periodic(
+        "heartbeat_compaction", intervals["heartbeat_compaction"], compact_heartbeats
+    )
+    scheduler.add_periodic("control_watch", intervals["control_watch"], check_control)
+    tracker = get_position_tracker()
+    scheduler.add_periodic("risk_sync", intervals["risk_sync"], tracker.sync)
+    scheduler.add_periodic(
+        "risk_snapshot", intervals["risk_snapshot"], snapshot_positions, run_immediately=False
+    )
+    if intervals["gateway_check"] > 0:
+        scheduler.add_periodic("gateway_check", intervals["gateway_check"], _check_gateway)
+    # strategy intents and the proposed-order poll must not pick up the same orders
+    order_lock = asyncio.Lock()
+    owned_symbols = _config_list("engine.symbols") or None
+    if config["process_orders"] and shard_id is not None and owned_symbols is None:
+        # without a symbol assignment every shard would poll the same proposed orders
+        print(f"[engine_loop] shard {shard_id} has no engine.symbols, order processing disabled")
+    elif config["process_orders"]:
+        process_orders = (
+            _submit_proposed_orders if config["async_submit"] else _process_proposed_orders
+        )
 
-        if max_iterations is not None:
-            i += 1
-            if i >= max_iterations:
-                print("[engine_loop] max_iterations reached, stopping loop")
-                break
+        async def run_order_processing() -> None:
+            async with order_lock:
+                await process_orders(owned_symbols)
 
-        time.sleep(loop_sleep_ms / 1000.0)
+        scheduler.add_periodic(
+            "order_processing", intervals["order_processing"], run_order_processing
+        )
+    scheduler.add_periodic(
+        "metrics_export", intervals["metrics_export"], write_prometheus, run_immediately=False
+    )
+    scheduler.on_wakeup(on_wakeup)
+    feed = None
+    symbols = _config_list("market_data.symbols")
+    if symbols:
+        feed = MarketDataFeed(get_market_data(), symbols).start()
+        scheduler.add_periodic("market_data_flush", 5.0, get_market_data().flush, False)
+    strategies = StrategyRuntime.from_config(order_lock=order_lock)
+    if strategies.workers:
+        strategies.start(get_market_data())
+    else:
+        strategies = None
+    http_exporter = None
+    if config["metrics_http_port"] > 0:
+        try:
+            http_exporter = start_http_exporter(config["metrics_http_port"])
+        except OSError as exc:
+            print(f"[engine_loop] metrics exporter not started: {exc}")
 
+    if max_iterations is not None:
+        limit = max_iterations * config["loop_sleep_ms"] / 1000.0
+        max_runtime_sec = limit if max_runtime_sec is None else min(max_runtime_sec, limit)
+    deadline = time.monotonic() + max_runtime_sec if max_runtime_sec is not None else None
+
+    set_engine_state("running")
+    await scheduler.run(deadline=deadline)
+    if deadline is not None and time.monotonic() >= deadline:
+        print("[engine_loop] max_iterations reached, stopping loop")
+
+    if strategies is not None:
+        await strategies.stop()
+    if (config["process_orders"] or strategies is not None) and config["async_submit"]:
+        # let in-flight orders settle so their fills land before the position snapshot
+        get_order_router().wait_idle(timeout=5.0)
+    if feed is not None:
+        feed.stop()
+    get_heartbeat_sink().flush()
+    if journal is not None:
+        journal.wait_materialized(timeout=5.0)
+    snapshot_positions()
+    write_prometheus()
+    if http_exporter is not None:
+        http_exporter.shutdown()
+        http_exporter.server_close()
     set_engine_state("stopped")
 
 
+def run_engine_loop(
+    max_iterations: Optional[int] = None, max_runtime_sec: Optional[float] = None
+) -> None:
+    """Run the engine loop, emitting heartbeats and reloading config on change."""
+    asyncio.run(run_engine_async(max_iterations=max_iterations, max_runtime_sec=max_runtime_sec))
+
+
 if __name__ == "__main__":
     init_schema()
 
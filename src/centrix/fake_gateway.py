@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import random
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Iterable, List, Optional
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix.ib_client import IBClient, IBSession, ReconnectPolicy
+
+
+class FakeGateway:
+    """Local TCP server standing in for the IBKR gateway in demos and benchmarks.
+
+    Answers ORDER lines (see ``ib_client.encode_orders``) with an ACK followed by
+    ``fill_parts`` partial FILLs at ``prices[symbol]``, or a REJECT for ``reject_symbols``.
+    After ``SUBSCRIBE <symbol>`` it streams random-walk TICK lines every ``tick_interval_sec``.
+    With ``max_msgs_per_sec`` a client sending more ORDER/CANCEL lines within one second is
+    disconnected, like the real gateway's pacing violation.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        prices: Optional[Dict[str, float]] = None,
+        fill_parts: int = 1,
+        fill_delay_sec: float = 0.0,
+        reject_symbols: Iterable[str] = (),
+        tick_interval_sec: float = 0.01,
+        max_msgs_per_sec: Optional[int] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.prices = dict(prices or {})
+        self.default_price = 100.0
+        self.fill_parts = max(1, fill_parts)
+        self.fill_delay_sec = fill_delay_sec
+        self.reject_symbols = set(reject_symbols)
+        self.tick_interval_sec = tick_interval_sec
+        self.ticks_sent = 0
+        self.accepted = 0
+        self.orders_received = 0
+        self.cancels_received = 0
+        self.max_msgs_per_sec = max_msgs_per_sec
+        self.pacing_violations = 0
+        self._server: Optional[socket.socket] = None
+        self._clients: List[socket.socket] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "FakeGateway":
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.host, self.port))
+        server.listen(64)
+        server.settimeout(0.2)
+        self.port = server.getsockname()[1]
+        self._server = server
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._accept_loop, name="fake-gateway", daemon=True)
+        self._thread.start()
+        return self
+
+    def _accept_loop(self) -> None:
+        assert self._server is not None
+        while not self._stopped.is_set():
+            try:
+                conn, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._clients.append(conn)
+                self.accepted += 1
+            threading.Thread(
+                target=self._serve_client, args=(conn,), name="fake-gateway-client", daemon=True
+            ).start()
+
+    def _serve_client(self, conn: socket.socket) -> None:
+        buffer = b""
+        subscriptions: List[str] = []
+        sent_at: Deque[float] = deque()
+        while not self._stopped.is_set():
+            try:
+                chunk = conn.recv(65536)
+            except OSError:
+                break
+            if not chunk:
+                break
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            replies: List[str] = []
+            for line in lines:
+                text = line.decode(errors="replace")
+                if text.startswith("SUBSCRIBE "):
+                    if not subscriptions:
+                        threading.Thread(
+                            target=self._stream_ticks,
+                            args=(conn, subscriptions),
+                            name="fake-gateway-ticks",
+                            daemon=True,
+                        ).start()
+                    subscriptions.append(text.split()[1])
+                    continue
+                if self.max_msgs_per_sec is not None and text.startswith(("ORDER ", "CANCEL ")):
+                    now = time.monotonic()
+                    sent_at.append(now)
+                    while sent_at and sent_at[0] <= now - 1.0:
+                        sent_at.popleft()
+                    if len(sent_at) > self.max_msgs_per_sec:
+                        with self._lock:
+                            self.pacing_violations += 1
+                        conn.close()
+                        return
+                replies.extend(self._handle_line(text))
+            if not replies:
+                continue
+            if self.fill_delay_sec:
+                time.sleep(self.fill_delay_sec)
+            try:
+                conn.sendall("".join(replies).encode())
+            except OSError:
+                break
+
+    def _stream_ticks(self, conn: socket.socket, symbols: List[str]) -> None:
+        while not self._stopped.is_set():
+            now = time.time()
+            lines = []
+            for symbol in list(symbols):
+                price = self.prices.get(symbol, self.default_price)
+                price = max(0.01, price * (1.0 + random.gauss(0.0, 0.0005)))
+                self.prices[symbol] = price
+                lines.append(
+                    f"TICK {symbol} {now!r} {price - 0.01!r} {price + 0.01!r} {price!r} 100\n"
+                )
+            try:
+                conn.sendall("".join(lines).encode())
+            except OSError:
+                return
+            self.ticks_sent += len(lines)
+            time.sleep(self.tick_interval_sec)
+
+    def _handle_line(self, line: str) -> List[str]:
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == "CANCEL":
+            # orders are answered as soon as they arrive, so there is nothing left to cancel
+            with self._lock:
+                self.cancels_received += 1
+            return []
+        if len(parts) != 5 or parts[0] != "ORDER":
+            return []
+        _, order_id, symbol, _side, raw_qty = parts
+        with self._lock:
+            self.orders_received += 1
+        if symbol in self.reject_symbols:
+            return [f"REJECT {order_id} symbol {symbol} not tradable\n"]
+        qty = float(raw_qty)
+        price = self.prices.get(symbol, self.default_price)
+        part = qty / self.fill_parts
+        replies = [f"ACK {order_id}\n"]
+        for index in range(self.fill_parts):
+            # last part takes the rounding remainder so fills sum to the order quantity
+            fill = qty - part * (self.fill_parts - 1) if index == self.fill_parts - 1 else part
+            replies.append(f"FILL {order_id} {fill!r} {price!r}\n")
+        return replies
+
+    def drop_clients(self) -> None:
+        """Close all client connections, simulating a gateway restart."""
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for conn in clients:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.drop_clients()
+
+    def __enter__(self) -> "FakeGateway":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    with FakeGateway() as gateway:
+        session = IBSession(
+            IBClient(host=gateway.host, port=gateway.port, client_id=1),
+            policy=ReconnectPolicy(initial_delay_sec=0.05),
+        )
+        print(session.submit_market_order("AAPL", "buy", 10))
+        print(session.submit_market_order("MSFT", "buy", 5))
+        while gateway.accepted < 1:
+            time.sleep(0.01)
+        gateway.drop_clients()
+        time.sleep(0.05)
+        print(f"alive after drop: {session.is_alive()}")
+        print(session.submit_market_order("AAPL", "sell", 10))
+        print(f"connections accepted: {gateway.accepted}")
+        session.close()
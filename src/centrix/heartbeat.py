@@ -1,46 +1,166 @@
 from __future__ import annotations
 
+import sqlite3
 import sys
+import threading
 import time
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 if __name__ == "__main__" and __package__ is None:
     sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from centrix.db import get_connection, init_schema
+from centrix.config_service import get_config_snapshot
+from centrix.db import get_storage, init_schema, register_close_hook
+from centrix.metrics import incr
+
+
+def write_heartbeats(entries: List[Tuple[str, str, int]]) -> None:
+    """Write many (source, status, ts) heartbeats in one transaction."""
+    if not entries:
+        return
+    get_storage().write_heartbeats(entries)
 
 
 def write_heartbeat(source: str, status: str = "ok") -> None:
     """Insert a heartbeat entry for any source (e.g. engine, gateway) with current timestamp."""
-    ts = int(time.time())
-    with get_connection() as conn:
-        conn.execute(
-            """
-            INSERT INTO heartbeats (source, status, ts)
-            VALUES (?, ?, ?)
-            """,
-            (source, status, ts),
-        )
+    get_storage().write_heartbeats([(source, status, int(time.time()))])
 
 
 def get_latest_heartbeat(source: str) -> Optional[Dict[str, int | str]]:
     """Return the most recent heartbeat for a source or None if missing."""
-    with get_connection() as conn:
-        cursor = conn.execute(
-            """
-            SELECT source, status, ts
-            FROM heartbeats
-            WHERE source = ?
-            ORDER BY ts DESC
-            LIMIT 1
-            """,
-            (source,),
+    return get_storage().get_latest_heartbeat(source)
+
+
+class HeartbeatSink:
+    """Buffers heartbeats in memory and flushes them from a background thread in batches.
+
+    While the database refuses writes the buffer keeps at most ``max_buffer`` entries (four
+    batches by default); the oldest are dropped first and counted in ``dropped``.
+    """
+
+    def __init__(
+        self,
+        flush_interval_sec: float = 1.0,
+        max_batch: int = 500,
+        max_buffer: Optional[int] = None,
+    ) -> None:
+        self.flush_interval_sec = flush_interval_sec
+        self.max_batch = max_batch
+        self.max_buffer = max_buffer if max_buffer is not None else 4 * max_batch
+        self.dropped = 0
+        self._buffer: List[Tuple[str, str, int]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the background flush thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="heartbeat-sink", daemon=True)
+        self._thread.start()
+
+    def submit(self, source: str, status: str = "ok") -> None:
+        """Queue a heartbeat; never touches the database on the caller's thread."""
+        entry = (source, status, int(time.time()))
+        with self._lock:
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.max_batch
+            if len(self._buffer) > self.max_buffer:
+                self._drop_oldest()
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Write all buffered heartbeats in one transaction and return how many were written.
+
+        On a database error the batch goes back to the front of the buffer for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                entries, self._buffer = self._buffer, []
+            try:
+                write_heartbeats(entries)
+            except sqlite3.Error:
+                with self._lock:
+                    self._buffer[:0] = entries
+                    self._drop_oldest()
+                raise
+            return len(entries)
+
+    def _drop_oldest(self) -> None:
+        """Trim the buffer to ``max_buffer`` entries; caller holds ``_lock``."""
+        excess = len(self._buffer) - self.max_buffer
+        if excess > 0:
+            del self._buffer[:excess]
+            self.dropped += excess
+            incr("heartbeat.dropped", excess)
+
+    def stop(self) -> None:
+        """Stop the flush thread and write whatever is still buffered."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+        self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval_sec)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as exc:
+                print(f"[heartbeat] flush failed: {exc}")
+
+
+_sink: Optional[HeartbeatSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_heartbeat_sink() -> HeartbeatSink:
+    """Return the process-wide heartbeat sink, starting it on first use."""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = HeartbeatSink()
+            register_close_hook(_sink.stop)
+        _sink.start()
+        return _sink
+
+
+def write_heartbeat_async(source: str, status: str = "ok") -> None:
+    """Queue a heartbeat on the background sink instead of committing on the caller's thread."""
+    get_heartbeat_sink().submit(source, status)
+
+
+def compact_heartbeats(
+    retention_sec: Optional[int] = None,
+    aggregate_retention_sec: Optional[int] = None,
+    now: Optional[int] = None,
+) -> int:
+    """Fold heartbeats older than the retention window into per-minute aggregates.
+
+    Defaults come from ``heartbeat.retention_sec`` (1 day) and
+    ``heartbeat.aggregate_retention_sec`` (30 days). Returns the number of raw rows removed.
+    """
+    snapshot = get_config_snapshot()
+    if retention_sec is None:
+        retention_sec = snapshot.get_int("heartbeat.retention_sec", default=86400) or 86400
+    if aggregate_retention_sec is None:
+        aggregate_retention_sec = (
+            snapshot.get_int("heartbeat.aggregate_retention_sec", default=30 * 86400) or 30 * 86400
         )
-        row = cursor.fetchone()
-        if row is None:
-            return None
-        return {"source": row["source"], "status": row["status"], "ts": row["ts"]}
+    now = int(time.time()) if now is None else now
+    # align to a minute boundary so a minute is never split across two compaction runs
+    cutoff = (now - retention_sec) // 60 * 60
+
+    return get_storage().compact_heartbeats(cutoff, now - aggregate_retention_sec)
 
 
 if __name__ == "__main__":
@@ -56,3 +176,8 @@ if __name__ == "__main__":
 
     print(get_latest_heartbeat("engine"))
     print(get_latest_heartbeat("gateway"))
+
+    for _ in range(100):
+        write_heartbeat_async("engine", "ok")
+    print(get_heartbeat_sink().flush())
+    print(compact_heartbeats(retention_sec=0, now=int(time.time()) + 120))
@@ -1,10 +1,21 @@
 from __future__ import annotations
 
 import os
+import random
+import select
 import socket
+import sys
+import threading
+import time
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix.metrics import timed
+from centrix.pacing import NORMAL, GatewayPacer, get_gateway_pacer
 
 
 @dataclass
@@ -16,7 +27,28 @@ class IBClient:
     _socket: Optional[socket.socket] = field(default=None, repr=False)
 
 
+_settings_cache: Optional[Dict[str, int | str]] = None
+_settings_lock = threading.Lock()
+
+
 def _load_ibkr_settings() -> Dict[str, int | str]:
+    """Return IBKR settings, parsed once per process (see ``reload_ibkr_settings``)."""
+    global _settings_cache
+    with _settings_lock:
+        if _settings_cache is None:
+            _settings_cache = _read_ibkr_settings()
+        return dict(_settings_cache)
+
+
+def reload_ibkr_settings() -> Dict[str, int | str]:
+    """Drop the cached settings and parse env/infra file again."""
+    global _settings_cache
+    with _settings_lock:
+        _settings_cache = None
+    return _load_ibkr_settings()
+
+
+def _read_ibkr_settings() -> Dict[str, int | str]:
     """Load IBKR host/port/client_id from env or optional infra/ibkr.env file."""
     defaults = {"host": "127.0.0.1", "port": 4002, "client_id": 1}
 
@@ -71,6 +103,7 @@ def create_ib_client() -> IBClient:
     )
 
 
+@timed("ib.connect")
 def connect_ib(client: IBClient, timeout: float = 5.0) -> bool:
     """Attempt to connect to the IBKR gateway; return True on success."""
     try:
@@ -100,6 +133,23 @@ def is_ib_connected(client: IBClient) -> bool:
     return client.connected
 
 
+def probe_ib_connection(client: IBClient) -> bool:
+    """Check the socket itself (peer closed/reset) and update the cached status."""
+    sock = client._socket
+    if sock is None:
+        client.connected = False
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if readable and not sock.recv(1, socket.MSG_PEEK):
+            raise ConnectionError("gateway closed the connection")
+        return client.connected
+    except (OSError, ValueError):
+        disconnect_ib(client)
+        return False
+
+
+@timed("ib.submit")
 def submit_market_order(client: IBClient, symbol: str, side: str, quantity: float) -> Tuple[bool, str]:
     """Minimal market-order wrapper for Phase 5; returns (success, error_message)."""
     if not is_ib_connected(client):
@@ -110,3 +160,161 @@ def submit_market_order(client: IBClient, symbol: str, side: str, quantity: floa
         return True, ""
     except Exception as exc:
         return False, str(exc)
+
+
+# Line protocol spoken on the order socket (FakeGateway implements the gateway side):
+#   client:  ORDER <order_id> <symbol> <side> <qty> | CANCEL <order_id>
+#   gateway: ACK <order_id> | FILL <order_id> <qty> <price> | REJECT <order_id> <reason>
+GatewayMessage = Tuple[str, int, float, float, str]
+
+
+def encode_orders(orders: Sequence[Tuple[int, str, str, float]]) -> bytes:
+    """Encode (order_id, symbol, side, qty) tuples as ORDER lines for one sendall."""
+    return "".join(
+        f"ORDER {order_id} {symbol} {side} {qty!r}\n" for order_id, symbol, side, qty in orders
+    ).encode()
+
+
+def encode_cancels(order_ids: Sequence[int]) -> bytes:
+    """Encode CANCEL lines for orders already sent to the gateway."""
+    return "".join(f"CANCEL {order_id}\n" for order_id in order_ids).encode()
+
+
+def send_orders(client: IBClient, payload: bytes) -> None:
+    """Write encoded orders to the gateway socket; raises ConnectionError when not connected."""
+    sock = client._socket
+    if sock is None or not client.connected:
+        raise ConnectionError("IB client not connected")
+    sock.sendall(payload)
+
+
+def parse_gateway_messages(buffer: bytearray) -> List[GatewayMessage]:
+    """Consume complete lines from ``buffer`` as (kind, order_id, qty, price, text) tuples."""
+    messages: List[GatewayMessage] = []
+    end = buffer.rfind(b"\n")
+    if end < 0:
+        return messages
+    lines = bytes(buffer[:end]).decode(errors="replace").split("\n")
+    del buffer[: end + 1]
+    for line in lines:
+        parts = line.split(" ", 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            continue
+        kind, order_id = parts[0], int(parts[1])
+        if kind == "FILL" and len(parts) == 3:
+            qty, _, price = parts[2].partition(" ")
+            try:
+                messages.append((kind, order_id, float(qty), float(price), ""))
+            except ValueError:
+                continue
+        elif kind in ("ACK", "REJECT"):
+            messages.append((kind, order_id, 0.0, 0.0, parts[2] if len(parts) == 3 else ""))
+    return messages
+
+
+@dataclass
+class ReconnectPolicy:
+    initial_delay_sec: float = 0.5
+    max_delay_sec: float = 30.0
+    multiplier: float = 2.0
+    jitter: float = 0.1
+
+    def delay(self, failures: int) -> float:
+        """Backoff delay after ``failures`` consecutive failed attempts."""
+        if failures <= 0:
+            return 0.0
+        base = min(self.max_delay_sec, self.initial_delay_sec * self.multiplier ** (failures - 1))
+        return base * (1.0 + random.uniform(-self.jitter, self.jitter))
+
+
+class IBSession:
+    """Long-lived gateway connection shared by the order, status and heartbeat paths."""
+
+    def __init__(
+        self,
+        client: Optional[IBClient] = None,
+        policy: Optional[ReconnectPolicy] = None,
+        connect_timeout: float = 5.0,
+        pacer: Optional[GatewayPacer] = None,
+    ) -> None:
+        self.client = client if client is not None else create_ib_client()
+        # message pacing toward the gateway; None sends unthrottled (simulations, tests)
+        self.pacer = pacer
+        self.policy = policy if policy is not None else ReconnectPolicy()
+        self.connect_timeout = connect_timeout
+        self.failures = 0
+        self.next_attempt_at = 0.0
+        self.lock = threading.RLock()
+
+    def is_alive(self) -> bool:
+        """Return True if the connection is open and the peer has not closed it."""
+        with self.lock:
+            return probe_ib_connection(self.client)
+
+    def ensure_connected(self, force: bool = False) -> bool:
+        """Reuse the live connection or reconnect, respecting the backoff window unless forced."""
+        with self.lock:
+            if probe_ib_connection(self.client):
+                return True
+            now = time.monotonic()
+            if not force and now < self.next_attempt_at:
+                return False
+            if connect_ib(self.client, timeout=self.connect_timeout):
+                self.failures = 0
+                self.next_attempt_at = 0.0
+                return True
+            self.failures += 1
+            self.next_attempt_at = now + self.policy.delay(self.failures)
+            return False
+
+    def mark_broken(self) -> None:
+        """Drop the connection after an I/O error so the next call reconnects."""
+        with self.lock:
+            disconnect_ib(self.client)
+
+    def submit_market_order(
+        self, symbol: str, side: str, quantity: float, lane: int = NORMAL
+    ) -> Tuple[bool, str]:
+        """Submit over the shared connection once the pacer grants a token for ``lane``."""
+        if self.pacer is not None:
+            self.pacer.acquire(lane)
+        with self.lock:
+            if not self.ensure_connected():
+                return False, "IB connection failed"
+            success, err = submit_market_order(self.client, symbol, side, quantity)
+            if not success and not probe_ib_connection(self.client):
+                self.mark_broken()
+            return success, err
+
+    def close(self) -> None:
+        with self.lock:
+            disconnect_ib(self.client)
+
+
+_session: Optional[IBSession] = None
+_session_lock = threading.Lock()
+
+
+def get_ib_session() -> IBSession:
+    """Return the process-wide gateway session (created lazily, connected on demand)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = IBSession(pacer=get_gateway_pacer())
+        return _session
+
+
+def set_ib_session(session: Optional[IBSession]) -> None:
+    """Replace the process-wide session, e.g. with a simulated gateway in backtests."""
+    global _session
+    with _session_lock:
+        _session = session
+
+
+def close_ib_session() -> None:
+    """Disconnect and forget the process-wide session."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -3,29 +3,262 @@ from __future__ import annotations
 import sys
 import time
 from pathlib import Path
+from typing import Callable, Dict, List
 
 if __name__ == "__main__" and __package__ is None:
     sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from centrix.config_service import get_config, set_config
-from centrix.control import get_safe_mode, set_safe_mode
-from centrix.db import init_schema
-from centrix.engine_loop import run_engine_loop
-from centrix.heartbeat import get_latest_heartbeat, write_heartbeat
-from centrix.ib_client import (
-    connect_ib,
-    create_ib_client,
-    disconnect_ib,
-    is_ib_connected,
-)
-from centrix.order_model import NewOrder
-from centrix.order_service import (
-    check_risk,
-    create_order_proposal,
-    execute_order,
-    get_order,
-)
-from centrix.risk import DummyOrder, evaluate_order, load_risk_limits
+# Handlers import what they use when they run: status commands that monitoring calls many
+# times a minute should not load the engine, gateway, risk or backtest modules.
+Command = Callable[[List[str]], None]
+COMMANDS: Dict[str, Command] = {}
+
+
+def command(name: str) -> Callable[[Command], Command]:
+    """Register ``handler(args)`` as the ``main.py <name>`` subcommand."""
+
+    def register(handler: Command) -> Command:
+        COMMANDS[name] = handler
+        return handler
+
+    return register
+
+
+@command("init-db")
+def _init_db(args: List[str]) -> None:
+    from centrix.db import init_schema
+
+    init_schema()
+    print("DB schema initialized")
+
+
+@command("migrate")
+def _migrate(args: List[str]) -> None:
+    # main.py migrate [--status] [--plans] [--pause-ms N]
+    from centrix.db import MIGRATIONS, SCHEMA_VERSION, applied_migrations, migrate
+
+    if "--status" in args:
+        applied = applied_migrations()
+        for migration in MIGRATIONS:
+            checksum = applied.get(migration.version)
+            if checksum is None:
+                state = "pending"
+            elif checksum == migration.checksum:
+                state = "applied"
+            else:
+                state = "CHECKSUM MISMATCH"
+            print(f"{migration.version:>4}  {migration.name:<40}{state}")
+        return
+
+    pause_ms = float(args[args.index("--pause-ms") + 1]) if "--pause-ms" in args else 0.0
+    capture = "--plans" in args
+    if capture:
+        # importing the modules registers their hot queries
+        import centrix.config_service  # noqa: F401
+        import centrix.heartbeat  # noqa: F401
+        import centrix.order_service  # noqa: F401
+    report = migrate(pause_sec=pause_ms / 1000.0, capture_plans=capture)
+    print(
+        f"schema version {SCHEMA_VERSION}: {len(report.applied)} migration(s) applied, "
+        f"{report.backfill_chunks} backfill chunk(s)"
+    )
+    if capture:
+        from centrix.db import format_query_plans
+
+        print(format_query_plans(report.plans_after, report.plans_before))
+
+
+@command("run-engine")
+def _run_engine(args: List[str]) -> None:
+    from centrix.db import init_schema
+    from centrix.engine_loop import run_engine_loop
+
+    init_schema()
+    run_engine_loop(max_iterations=20)
+    print("Engine loop finished (test mode)")
+
+
+@command("run-risk-demo")
+def _run_risk_demo(args: List[str]) -> None:
+    from centrix.config_service import get_config, set_config
+    from centrix.control import get_safe_mode, set_safe_mode
+    from centrix.db import init_schema
+    from centrix.order_model import NewOrder
+    from centrix.risk import evaluate_order, load_risk_limits
+
+    init_schema()
+    set_safe_mode(False)
+    if get_config("risk.max_daily_loss") is None:
+        set_config("risk.max_daily_loss", "150", value_type="float")
+    if get_config("risk.max_order_size") is None:
+        set_config("risk.max_order_size", "100", value_type="float")
+
+    limits = load_risk_limits()
+    print(
+        f"Risk-Limits: max_daily_loss={limits.max_daily_loss}, max_order_size={limits.max_order_size}"
+    )
+
+    effective_limit = limits.max_order_size if limits.max_order_size is not None else 100.0
+    small_order = NewOrder(symbol="AAPL", side="buy", quantity=effective_limit / 2)
+    large_order = NewOrder(symbol="AAPL", side="buy", quantity=effective_limit * 2)
+
+    evaluate_order(small_order)
+    evaluate_order(large_order)
+
+    print(f"safe_mode={get_safe_mode()}")
+
+
+@command("show-safe-mode")
+def _show_safe_mode(args: List[str]) -> None:
+    from centrix.control import get_safe_mode
+    from centrix.db import init_schema
+
+    init_schema()
+    print(f"safe_mode={get_safe_mode()}")
+
+
+@command("test-ib-connection")
+def _test_ib_connection(args: List[str]) -> None:
+    from centrix.db import init_schema
+    from centrix.heartbeat import write_heartbeat
+    from centrix.ib_client import get_ib_session
+
+    init_schema()
+    if get_ib_session().ensure_connected(force=True):
+        write_heartbeat("gateway", "connected")
+        print("IBKR: connected")
+    else:
+        write_heartbeat("gateway", "disconnected")
+        print("IBKR: connection failed")
+
+
+@command("show-gateway-status")
+def _show_gateway_status(args: List[str]) -> None:
+    from centrix.db import init_schema
+    from centrix.heartbeat import get_latest_heartbeat
+
+    init_schema()
+    hb = get_latest_heartbeat("gateway")
+    if hb is None:
+        print("gateway: kein Heartbeat vorhanden")
+    else:
+        age = int(time.time() - hb["ts"])
+        print(f"gateway: {hb['status']} (vor {age} Sekunden)")
+
+
+@command("run-order-demo")
+def _run_order_demo(args: List[str]) -> None:
+    from centrix.db import init_schema
+    from centrix.heartbeat import write_heartbeat
+    from centrix.ib_client import get_ib_session
+    from centrix.metrics import write_prometheus
+    from centrix.order_model import NewOrder
+    from centrix.order_service import check_risk, create_order_proposal, execute_order, get_order
+
+    init_schema()
+
+    # Optional connectivity check (non-fatal); the session stays open for execute_order
+    if get_ib_session().ensure_connected(force=True):
+        write_heartbeat("gateway", "connected")
+    else:
+        write_heartbeat("gateway", "disconnected")
+
+    demo_order = NewOrder(symbol="AAPL", side="buy", quantity=10)
+    order_id = create_order_proposal(demo_order)
+    print(f"Order angelegt: id={order_id}, symbol={demo_order.symbol}, side={demo_order.side}, qty={demo_order.quantity}")
+
+    allowed, reason = check_risk(order_id)
+    if not allowed:
+        ord_rec = get_order(order_id)
+        print(f"Order geblockt: id={order_id}, status={ord_rec.status if ord_rec else 'unknown'}, reason={reason}")
+        return
+
+    execute_order(order_id)
+    final_order = get_order(order_id)
+    if final_order is None:
+        print(f"Order {order_id} nicht gefunden")
+        return
+    print(
+        f"Order fertig: id={final_order.id}, symbol={final_order.symbol}, side={final_order.side}, qty={final_order.quantity}, status={final_order.status}, error={final_order.error_message}"
+    )
+    write_prometheus()
+
+
+@command("run-supervisor")
+def _run_supervisor(args: List[str]) -> None:
+    # one engine process per shard in engine.shards; optional runtime in seconds
+    from centrix.db import init_schema
+    from centrix.supervisor import EngineSupervisor
+
+    init_schema()
+    runtime = float(args[0]) if args else None
+    EngineSupervisor().run(max_runtime_sec=runtime)
+    print("Supervisor beendet")
+
+
+@command("show-shards")
+def _show_shards(args: List[str]) -> None:
+    from centrix.db import init_schema
+    from centrix.supervisor import collect_shard_status, format_shard_status, list_shards
+
+    init_schema()
+    shards = list_shards()
+    if not shards:
+        print("shards: keine konfiguriert (engine.shards)")
+    else:
+        print(format_shard_status(collect_shard_status(shards)))
+
+
+@command("replay-market-data")
+def _replay_market_data(args: List[str]) -> None:
+    if not args:
+        print("usage: main.py replay-market-data <ticks.csv> [speed]")
+        return
+    from centrix.db import init_schema
+    from centrix.market_data import get_market_data, replay_file
+
+    init_schema()
+    speed = float(args[1]) if len(args) > 1 else None
+    store = get_market_data()
+    started = time.perf_counter()
+    count = replay_file(store, Path(args[0]), speed=speed)
+    elapsed = time.perf_counter() - started
+    print(f"{count} Ticks in {elapsed:.3f}s ({count / max(elapsed, 1e-9):,.0f}/s)")
+    for symbol in sorted(store.rings):
+        bars = store.recent_bars(symbol)
+        last_bar = bars[-1] if bars else None
+        print(f"{symbol}: mark={store.latest_price(symbol)}, bars={len(bars)}, last={last_bar}")
+    store.close()
+
+
+@command("backtest")
+def _backtest(args: List[str]) -> None:
+    from centrix.backtest import run_cli
+
+    sys.exit(run_cli(args))
+
+
+@command("bench")
+def _bench(args: List[str]) -> None:
+    from centrix.bench import run_cli
+
+    sys.exit(run_cli(args))
+
+
+@command("show-metrics")
+def _show_metrics(args: List[str]) -> None:
+    # percentiles from the last export (engine or demo run), or an explicit .prom file
+    from centrix.metrics import format_percentiles, get_registry, load_prometheus
+
+    path = Path(args[0]) if args else None
+    stages = get_registry().percentiles()
+    if not stages:
+        try:
+            stages = load_prometheus(path)
+        except FileNotFoundError as exc:
+            print(f"metrics: keine Daten ({exc.filename})")
+            return
+    print(format_percentiles(stages))
 
 
 def main() -> None:
@@ -34,92 +267,12 @@ def main() -> None:
         return
 
     cmd = sys.argv[1]
-
-    if cmd == "init-db":
-        init_schema()
-        print("DB schema initialized")
-    elif cmd == "run-engine":
-        init_schema()
-        run_engine_loop(max_iterations=20)
-        print("Engine loop finished (test mode)")
-    elif cmd == "run-risk-demo":
-        init_schema()
-        set_safe_mode(False)
-        if get_config("risk.max_daily_loss") is None:
-            set_config("risk.max_daily_loss", "150", value_type="float")
-        if get_config("risk.max_order_size") is None:
-            set_config("risk.max_order_size", "100", value_type="float")
-
-        limits = load_risk_limits()
-        print(
-            f"Risk-Limits: max_daily_loss={limits.max_daily_loss}, max_order_size={limits.max_order_size}"
-        )
-
-        effective_limit = limits.max_order_size if limits.max_order_size is not None else 100.0
-        small_order = DummyOrder(symbol="AAPL", side="buy", quantity=effective_limit / 2)
-        large_order = DummyOrder(symbol="AAPL", side="buy", quantity=effective_limit * 2)
-
-        evaluate_order(small_order)
-        evaluate_order(large_order)
-
-        print(f"safe_mode={get_safe_mode()}")
-    elif cmd == "show-safe-mode":
-        init_schema()
-        print(f"safe_mode={get_safe_mode()}")
-    elif cmd == "test-ib-connection":
-        init_schema()
-        client = create_ib_client()
-        ok = connect_ib(client)
-        if ok and is_ib_connected(client):
-            write_heartbeat("gateway", "connected")
-            print("IBKR: connected")
-        else:
-            write_heartbeat("gateway", "disconnected")
-            print("IBKR: connection failed")
-        disconnect_ib(client)
-    elif cmd == "show-gateway-status":
-        init_schema()
-        hb = get_latest_heartbeat("gateway")
-        if hb is None:
-            print("gateway: kein Heartbeat vorhanden")
-        else:
-            age = int(time.time() - hb["ts"])
-            print(f"gateway: {hb['status']} (vor {age} Sekunden)")
-    elif cmd == "run-order-demo":
-        init_schema()
-
-        # Optional connectivity check (non-fatal)
-        client = create_ib_client()
-        if connect_ib(client):
-            write_heartbeat("gateway", "connected")
-            disconnect_ib(client)
-        else:
-            write_heartbeat("gateway", "disconnected")
-
-        demo_order = NewOrder(symbol="AAPL", side="buy", quantity=10)
-        order_id = create_order_proposal(demo_order)
-        print(f"Order angelegt: id={order_id}, symbol={demo_order.symbol}, side={demo_order.side}, qty={demo_order.quantity}")
-
-        allowed, reason = check_risk(order_id)
-        if not allowed:
-            ord_rec = get_order(order_id)
-            print(f"Order geblockt: id={order_id}, status={ord_rec.status if ord_rec else 'unknown'}, reason={reason}")
-            return
-
-        ok = execute_order(order_id)
-        final_order = get_order(order_id)
-        if final_order is None:
-            print(f"Order {order_id} nicht gefunden")
-            return
-        print(
-            f"Order fertig: id={final_order.id}, symbol={final_order.symbol}, side={final_order.side}, qty={final_order.quantity}, status={final_order.status}, error={final_order.error_message}"
-        )
-    else:
+    handler = COMMANDS.get(cmd)
+    if handler is None:
         print(f"Unknown command: {cmd}")
-        print(
-            "Available commands: init-db, run-engine, run-risk-demo, show-safe-mode, "
-            "test-ib-connection, show-gateway-status, run-order-demo"
-        )
+        print(f"Available commands: {', '.join(COMMANDS)}")
+        return
+    handler(sys.argv[2:])
 
 
 if __name__ == "__main__":
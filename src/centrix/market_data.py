@@ -0,0 +1,538 @@
+from __future__ import annotations
+
+import mmap
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix.config_service import get_config_snapshot
+from centrix.ib_client import IBClient, connect_ib, create_ib_client, disconnect_ib
+
+# ts, bid, ask, last, size
+TICK_FIELDS = ("ts", "bid", "ask", "last", "size")
+Tick = Tuple[float, float, float, float, float]
+
+
+@dataclass(frozen=True, slots=True)
+class Bar:
+    symbol: str
+    start: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    ticks: int
+
+
+class TickRing:
+    """Preallocated per-symbol ring of the most recent ticks, one typed array per field."""
+
+    __slots__ = ("capacity", "mask", "head", "count", "ts", "bid", "ask", "last", "size")
+
+    def __init__(self, capacity: int = 65536) -> None:
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError(f"capacity must be a power of two: {capacity}")
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.head = 0
+        self.count = 0
+        zeros = bytes(8 * capacity)
+        self.ts = array("d", zeros)
+        self.bid = array("d", zeros)
+        self.ask = array("d", zeros)
+        self.last = array("d", zeros)
+        self.size = array("d", zeros)
+
+    def append(self, ts: float, bid: float, ask: float, last: float, size: float) -> None:
+        i = self.head
+        self.ts[i] = ts
+        self.bid[i] = bid
+        self.ask[i] = ask
+        self.last[i] = last
+        self.size[i] = size
+        self.head = (i + 1) & self.mask
+        if self.count < self.capacity:
+            self.count += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def latest(self) -> Optional[Tick]:
+        if not self.count:
+            return None
+        i = (self.head - 1) & self.mask
+        return self.ts[i], self.bid[i], self.ask[i], self.last[i], self.size[i]
+
+    def column(self, name: str, n: Optional[int] = None) -> array:
+        """Oldest-to-newest copy of the last ``n`` values of one field."""
+        n = self.count if n is None else min(n, self.count)
+        data: array = getattr(self, name)
+        start = (self.head - n) & self.mask
+        if start + n <= self.capacity:
+            return data[start : start + n]
+        return data[start:] + data[: (start + n) & self.mask]
+
+
+class BarAggregator:
+    """Builds OHLCV bars of ``interval_sec`` incrementally, one tick at a time."""
+
+    def __init__(self, symbol: str, interval_sec: int = 60, history: int = 1024) -> None:
+        self.symbol = symbol
+        self.interval_sec = interval_sec
+        self.bars: Deque[Bar] = deque(maxlen=history)
+        self.start = -1
+        self.open = self.high = self.low = self.close = 0.0
+        self.volume = 0.0
+        self.ticks = 0
+
+    def update(self, ts: float, price: float, size: float) -> Optional[Bar]:
+        """Fold a trade price into the current bar; return the bar this tick completed, if any."""
+        start = int(ts) - int(ts) % self.interval_sec
+        completed = None
+        if start != self.start:
+            if self.ticks:
+                completed = self.current()
+                self.bars.append(completed)
+            self.start = start
+            self.open = self.high = self.low = price
+            self.volume = 0.0
+            self.ticks = 0
+        elif price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += size
+        self.ticks += 1
+        return completed
+
+    def current(self) -> Bar:
+        """The bar still being built."""
+        return Bar(
+            self.symbol, self.start, self.open, self.high, self.low, self.close, self.volume, self.ticks
+        )
+
+
+_SEGMENT_MAGIC = b"CTXTICK1"
+_SEGMENT_HEADER = struct.Struct("<8sqq")  # magic, rows written, capacity
+
+
+class TickSegment:
+    """Fixed-capacity memory-mapped columnar tick file: header, then one float64 column per field."""
+
+    def __init__(self, path: Path, capacity: int = 1 << 16) -> None:
+        self.path = path
+        existing = path.exists() and path.stat().st_size > _SEGMENT_HEADER.size
+        size = _SEGMENT_HEADER.size + len(TICK_FIELDS) * capacity * 8
+        with open(path, "r+b" if existing else "w+b") as fh:
+            if existing:
+                magic, count, capacity = _SEGMENT_HEADER.unpack(fh.read(_SEGMENT_HEADER.size))
+                if magic != _SEGMENT_MAGIC:
+                    raise ValueError(f"not a tick segment: {path}")
+            else:
+                count = 0
+                fh.truncate(size)
+                fh.write(_SEGMENT_HEADER.pack(_SEGMENT_MAGIC, 0, capacity))
+            self._map = mmap.mmap(fh.fileno(), 0)
+        self.capacity = capacity
+        self.count = count
+        body = memoryview(self._map)[_SEGMENT_HEADER.size :].cast("d")
+        self.columns = [body[i * capacity : (i + 1) * capacity] for i in range(len(TICK_FIELDS))]
+
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def append(self, ts: float, bid: float, ask: float, last: float, size: float) -> None:
+        i = self.count
+        columns = self.columns
+        columns[0][i] = ts
+        columns[1][i] = bid
+        columns[2][i] = ask
+        columns[3][i] = last
+        columns[4][i] = size
+        self.count = i + 1
+
+    def sync_header(self) -> None:
+        _SEGMENT_HEADER.pack_into(self._map, 0, _SEGMENT_MAGIC, self.count, self.capacity)
+
+    def read(self) -> Dict[str, array]:
+        """Copy the written rows out as one array per field."""
+        return {name: array("d", col[: self.count]) for name, col in zip(TICK_FIELDS, self.columns)}
+
+    def close(self) -> None:
+        self.sync_header()
+        self.columns = []
+        self._map.flush()
+        self._map.close()
+
+
+class TickPersister:
+    """Appends ticks to ``<dir>/<symbol>.<n>.ticks`` segments, opening a new one when full."""
+
+    def __init__(self, directory: Path, segment_capacity: int = 1 << 16) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_capacity = segment_capacity
+        self.segments: Dict[str, TickSegment] = {}
+
+    def _open(self, symbol: str) -> TickSegment:
+        paths = segment_paths(self.directory, symbol)
+        index = len(paths)
+        if paths:
+            segment = TickSegment(paths[-1], self.segment_capacity)
+            if not segment.full():
+                return segment
+            segment.close()
+        return TickSegment(self.directory / f"{symbol}.{index:06d}.ticks", self.segment_capacity)
+
+    def append(self, symbol: str, ts: float, bid: float, ask: float, last: float, size: float) -> None:
+        segment = self.segments.get(symbol)
+        if segment is None or segment.full():
+            if segment is not None:
+                segment.close()
+            segment = self.segments[symbol] = self._open(symbol)
+        segment.append(ts, bid, ask, last, size)
+
+    def flush(self) -> None:
+        for segment in self.segments.values():
+            segment.sync_header()
+
+    def close(self) -> None:
+        for segment in self.segments.values():
+            segment.close()
+        self.segments.clear()
+
+
+def segment_paths(directory: Path, symbol: str) -> List[Path]:
+    return sorted(Path(directory).glob(f"{symbol}.*.ticks"))
+
+
+def read_persisted_ticks(directory: Path, symbol: str) -> Dict[str, array]:
+    """Concatenate all persisted segments of a symbol into one array per field."""
+    result = {name: array("d") for name in TICK_FIELDS}
+    for path in segment_paths(directory, symbol):
+        segment = TickSegment(path)
+        for name, values in segment.read().items():
+            result[name].extend(values)
+        segment.close()
+    return result
+
+
+BarCallback = Callable[[Bar], None]
+TickListener = Callable[[str, float, float, float, float], None]
+
+
+class MarketDataStore:
+    """Ring-buffered ticks per symbol, latest quotes for risk and incremental bars."""
+
+    def __init__(
+        self,
+        ring_capacity: int = 65536,
+        bar_interval_sec: int = 60,
+        persist_dir: Optional[Path] = None,
+    ) -> None:
+        self.ring_capacity = ring_capacity
+        self.bar_interval_sec = bar_interval_sec
+        self.rings: Dict[str, TickRing] = {}
+        self.bars: Dict[str, BarAggregator] = {}
+        # symbol -> (ts, bid, ask, last); replaced per tick, so a lookup is one dict get
+        self.quotes: Dict[str, Tuple[float, float, float, float]] = {}
+        self.marks: Dict[str, float] = {}
+        self.persister = TickPersister(persist_dir) if persist_dir else None
+        self.tick_count = 0
+        self._bar_callbacks: List[BarCallback] = []
+        self._tick_listeners: List[TickListener] = []
+        self.lock = threading.Lock()
+
+    def on_bar(self, callback: BarCallback) -> None:
+        """Call ``callback(bar)`` whenever a bar completes."""
+        self._bar_callbacks.append(callback)
+
+    def add_tick_listener(self, listener: TickListener) -> None:
+        """Call ``listener(symbol, ts, bid, ask, last)`` after every tick (keep it cheap)."""
+        self._tick_listeners.append(listener)
+
+    def remove_bar_callback(self, callback: BarCallback) -> None:
+        if callback in self._bar_callbacks:
+            self._bar_callbacks.remove(callback)
+
+    def remove_tick_listener(self, listener: TickListener) -> None:
+        if listener in self._tick_listeners:
+            self._tick_listeners.remove(listener)
+
+    def on_tick(
+        self, symbol: str, ts: float, bid: float, ask: float, last: float, size: float = 0.0
+    ) -> None:
+        with self.lock:
+            ring = self.rings.get(symbol)
+            if ring is None:
+                ring = self.rings[symbol] = TickRing(self.ring_capacity)
+                self.bars[symbol] = BarAggregator(symbol, self.bar_interval_sec)
+            ring.append(ts, bid, ask, last, size)
+            self.quotes[symbol] = (ts, bid, ask, last)
+            mark = last if last > 0 else (bid + ask) / 2
+            self.marks[symbol] = mark
+            self.tick_count += 1
+            completed = self.bars[symbol].update(ts, mark, size)
+            if self.persister is not None:
+                self.persister.append(symbol, ts, bid, ask, last, size)
+        # a failing subscriber must not stop the feed or starve the others
+        for listener in self._tick_listeners:
+            try:
+                listener(symbol, ts, bid, ask, last)
+            except Exception as exc:
+                print(f"[market_data] tick listener failed: {exc}")
+        if completed is not None:
+            for callback in self._bar_callbacks:
+                try:
+                    callback(completed)
+                except Exception as exc:
+                    print(f"[market_data] bar callback failed: {exc}")
+
+    def on_ticks(self, ticks: Iterable[Tuple[str, float, float, float, float, float]]) -> int:
+        """Ingest many (symbol, ts, bid, ask, last, size) ticks; return how many."""
+        count = 0
+        on_tick = self.on_tick
+        for symbol, ts, bid, ask, last, size in ticks:
+            on_tick(symbol, ts, bid, ask, last, size)
+            count += 1
+        return count
+
+    def latest_quote(self, symbol: str) -> Optional[Tuple[float, float, float, float]]:
+        return self.quotes.get(symbol)
+
+    def latest_price(self, symbol: str) -> Optional[float]:
+        return self.marks.get(symbol)
+
+    def mark_prices(self, symbols: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        """Current marks (last trade, else mid) for the given symbols or all of them."""
+        marks = self.marks
+        if symbols is None:
+            return dict(marks)
+        return {symbol: marks[symbol] for symbol in symbols if symbol in marks}
+
+    def recent_bars(self, symbol: str, include_current: bool = True) -> List[Bar]:
+        aggregator = self.bars.get(symbol)
+        if aggregator is None:
+            return []
+        bars = list(aggregator.bars)
+        if include_current and aggregator.ticks:
+            bars.append(aggregator.current())
+        return bars
+
+    def flush(self) -> None:
+        if self.persister is not None:
+            with self.lock:
+                self.persister.flush()
+
+    def close(self) -> None:
+        if self.persister is not None:
+            with self.lock:
+                self.persister.close()
+
+
+def parse_tick_line(line: str) -> Optional[Tuple[str, float, float, float, float, float]]:
+    """Parse ``symbol,ts,bid,ask,last,size`` (replay files) into a tick tuple."""
+    parts = line.strip().split(",")
+    if len(parts) != 6 or parts[0] == "symbol":
+        return None
+    try:
+        return (
+            parts[0],
+            float(parts[1]),
+            float(parts[2]),
+            float(parts[3]),
+            float(parts[4]),
+            float(parts[5]),
+        )
+    except ValueError:
+        return None
+
+
+def iter_replay_file(path: Path) -> Iterator[Tuple[str, float, float, float, float, float]]:
+    with open(path) as fh:
+        for line in fh:
+            tick = parse_tick_line(line)
+            if tick is not None:
+                yield tick
+
+
+def replay_file(store: MarketDataStore, path: Path, speed: Optional[float] = None) -> int:
+    """Feed a CSV replay file into ``store``; ``speed`` > 0 paces by tick timestamps."""
+    if not speed:
+        return store.on_ticks(iter_replay_file(path))
+    count = 0
+    first_ts: Optional[float] = None
+    started = time.monotonic()
+    for tick in iter_replay_file(path):
+        if first_ts is None:
+            first_ts = tick[1]
+        delay = (tick[1] - first_ts) / speed - (time.monotonic() - started)
+        if delay > 0:
+            time.sleep(delay)
+        store.on_tick(*tick)
+        count += 1
+    return count
+
+
+class MarketDataFeed:
+    """Streams TICK lines from the gateway into a store on its own connection and thread.
+
+    Line protocol: client ``SUBSCRIBE <symbol>``; gateway ``TICK <symbol> <ts> <bid> <ask>
+    <last> <size>``. A separate client id keeps the order connection free of quote traffic.
+    """
+
+    def __init__(
+        self, store: MarketDataStore, symbols: Sequence[str], client: Optional[IBClient] = None
+    ) -> None:
+        self.store = store
+        self.symbols = list(symbols)
+        if client is None:
+            client = create_ib_client()
+            client.client_id += 100
+        self.client = client
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "MarketDataFeed":
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="market-data-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        disconnect_ib(self.client)
+        self.store.flush()
+
+    def _subscribe(self) -> bool:
+        if not connect_ib(self.client, timeout=2.0):
+            return False
+        assert self.client._socket is not None
+        payload = "".join(f"SUBSCRIBE {symbol}\n" for symbol in self.symbols).encode()
+        try:
+            self.client._socket.sendall(payload)
+        except OSError:
+            disconnect_ib(self.client)
+            return False
+        return True
+
+    def _run(self) -> None:
+        delay = 0.5
+        while not self._stopped.is_set():
+            if not self._subscribe():
+                self._stopped.wait(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            delay = 0.5
+            self._read(self.client._socket)
+            disconnect_ib(self.client)
+
+    def _read(self, sock: Optional[socket.socket]) -> None:
+        buffer = b""
+        on_tick = self.store.on_tick
+        while sock is not None and not self._stopped.is_set():
+            try:
+                readable, _, _ = select.select([sock], [], [], 0.1)
+                if not readable:
+                    continue
+                chunk = sock.recv(1 << 16)
+            except (OSError, ValueError):
+                return
+            if not chunk:
+                return
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                parts = line.split()
+                if len(parts) != 7 or parts[0] != b"TICK":
+                    continue
+                try:
+                    tick = (
+                        parts[1].decode(),
+                        float(parts[2]),
+                        float(parts[3]),
+                        float(parts[4]),
+                        float(parts[5]),
+                        float(parts[6]),
+                    )
+                except (ValueError, UnicodeDecodeError):
+                    print(f"[market_data] skipping malformed tick {line[:80]!r}")
+                    continue
+                on_tick(*tick)
+
+
+_store: Optional[MarketDataStore] = None
+_store_lock = threading.Lock()
+
+
+def get_market_data() -> MarketDataStore:
+    """Return the process-wide store, configured from ``market_data.*`` settings on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            snapshot = get_config_snapshot()
+            persist_dir = snapshot.get("market_data.persist_dir") or os.environ.get(
+                "CENTRIX_TICK_DIR"
+            )
+            _store = MarketDataStore(
+                ring_capacity=snapshot.get_int("market_data.ring_capacity", default=65536) or 65536,
+                bar_interval_sec=snapshot.get_int("market_data.bar_interval_sec", default=60) or 60,
+                persist_dir=Path(persist_dir) if persist_dir else None,
+            )
+        return _store
+
+
+def set_market_data(store: Optional[MarketDataStore]) -> None:
+    """Install ``store`` as the process-wide store (backtests feed their own)."""
+    global _store
+    with _store_lock:
+        _store = store
+
+
+def reset_market_data() -> None:
+    """Close and forget the process-wide store."""
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
+
+
+if __name__ == "__main__":
+    import random
+    import tempfile
+
+    tmp = Path(tempfile.mkdtemp())
+    store = MarketDataStore(ring_capacity=1024, bar_interval_sec=1, persist_dir=tmp)
+    price = {"AAPL": 190.0, "MSFT": 410.0}
+    ticks = []
+    now = time.time()
+    for i in range(200000):
+        symbol = "AAPL" if i % 2 else "MSFT"
+        price[symbol] += random.uniform(-0.05, 0.05)
+        p = price[symbol]
+        ticks.append((symbol, now + i * 0.0001, p - 0.01, p + 0.01, p, 100.0))
+    start = time.perf_counter()
+    store.on_ticks(ticks)
+    elapsed = time.perf_counter() - start
+    print(f"{len(ticks) / elapsed:,.0f} ticks/s (with mmap persistence)")
+    print(store.latest_quote("AAPL"), len(store.recent_bars("AAPL")))
+    store.close()
+    print({name: len(col) for name, col in read_persisted_ticks(tmp, "AAPL").items()})
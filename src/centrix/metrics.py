@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import functools
+import math
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# 2**5 sub-buckets per power of two: every recorded value is within ~3% of its bucket bound
+_SUB_BITS = 5
+_SUB_COUNT = 1 << _SUB_BITS
+# values are capped at 2**40 ns (~18 minutes)
+_MAX_VALUE_NS = (1 << 40) - 1
+_BUCKETS = (40 - _SUB_BITS) * _SUB_COUNT + 2 * _SUB_COUNT
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def _bucket_index(value_ns: int) -> int:
+    shift = value_ns.bit_length() - _SUB_BITS - 1
+    if shift <= 0:
+        return value_ns
+    return shift * _SUB_COUNT + (value_ns >> shift)
+
+
+def _bucket_upper(index: int) -> int:
+    """Highest value (ns) that maps to ``index``."""
+    if index < 2 * _SUB_COUNT:
+        return index
+    shift = index // _SUB_COUNT - 1
+    mantissa = index % _SUB_COUNT + _SUB_COUNT
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of nanosecond latencies with fixed memory."""
+
+    def __init__(self) -> None:
+        self.counts = array("q", bytes(8 * _BUCKETS))
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = 0
+        self.max_ns = 0
+        self.lock = threading.Lock()
+
+    def record(self, value_ns: int) -> None:
+        value_ns = min(max(int(value_ns), 0), _MAX_VALUE_NS)
+        index = _bucket_index(value_ns)
+        with self.lock:
+            self.counts[index] += 1
+            if self.count == 0 or value_ns < self.min_ns:
+                self.min_ns = value_ns
+            if value_ns > self.max_ns:
+                self.max_ns = value_ns
+            self.count += 1
+            self.total_ns += value_ns
+
+    def percentile(self, quantile: float) -> int:
+        """Value (ns) at or below which ``quantile`` of the recorded samples fall."""
+        with self.lock:
+            if self.count == 0:
+                return 0
+            target = max(1, math.ceil(quantile * self.count))
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                if bucket_count:
+                    seen += bucket_count
+                    if seen >= target:
+                        return min(_bucket_upper(index), self.max_ns)
+            return self.max_ns
+
+    def summary(self, quantiles: Tuple[float, ...] = QUANTILES) -> Dict[str, float]:
+        """Return count, sum, min, max and the given quantiles in seconds."""
+        values: Dict[str, float] = {f"p{q * 100:g}": self.percentile(q) / 1e9 for q in quantiles}
+        with self.lock:
+            values.update(
+                count=float(self.count),
+                sum=self.total_ns / 1e9,
+                min=self.min_ns / 1e9,
+                max=self.max_ns / 1e9,
+            )
+        return values
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counts = array("q", bytes(8 * _BUCKETS))
+            self.count = self.total_ns = self.min_ns = self.max_ns = 0
+
+
+class MetricsRegistry:
+    """Per-stage latency histograms, counters, gauges and a ring buffer of recent spans."""
+
+    def __init__(self, span_capacity: int = 4096) -> None:
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        # (stage, wall-clock start, duration ns, ok)
+        self.spans: Deque[Tuple[str, float, int, bool]] = deque(maxlen=span_capacity)
+        self.lock = threading.Lock()
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        hist = self.histograms.get(stage)
+        if hist is None:
+            with self.lock:
+                hist = self.histograms.setdefault(stage, LatencyHistogram())
+        return hist
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def observe(self, stage: str, duration_ns: int, ok: bool = True, started: float = 0.0) -> None:
+        """Record one timed stage execution."""
+        self.histogram(stage).record(duration_ns)
+        self.spans.append((stage, started, duration_ns, ok))
+        if not ok:
+            self.incr(f"{stage}.errors")
+
+    def recent_spans(self, limit: int = 100) -> List[Tuple[str, float, int, bool]]:
+        spans = list(self.spans)
+        return spans[-limit:]
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        return {stage: hist.summary() for stage, hist in sorted(self.histograms.items())}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+            self.spans.clear()
+
+
+_registry = MetricsRegistry()
+_enabled = os.environ.get("CENTRIX_METRICS", "1").lower() not in ("0", "false", "no", "off")
+
+
+def get_registry() -> MetricsRegistry:
+    return _registry
+
+
+def set_metrics_enabled(enabled: bool) -> None:
+    """Turn stage timing on or off process-wide (``CENTRIX_METRICS=0`` disables it at start)."""
+    global _enabled
+    _enabled = enabled
+
+
+class timed:
+    """Time a stage as a context manager (``with timed("order.risk"):``) or a decorator."""
+
+    __slots__ = ("stage", "_start_ns", "_started")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+        self._start_ns = 0
+        self._started = 0.0
+
+    def __enter__(self) -> "timed":
+        if _enabled:
+            self._started = time.time()
+            self._start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type: object, exc: object, tb: object) -> None:
+        if _enabled and self._start_ns:
+            _registry.observe(
+                self.stage, time.perf_counter_ns() - self._start_ns, exc_type is None, self._started
+            )
+
+    def __call__(self, func: F) -> F:
+        stage = self.stage
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return func(*args, **kwargs)
+            started = time.time()
+            start_ns = time.perf_counter_ns()
+            ok = False
+            try:
+                result = func(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                _registry.observe(stage, time.perf_counter_ns() - start_ns, ok, started)
+
+        return wrapper  # type: ignore[return-value]
+
+
+def incr(name: str, amount: int = 1) -> None:
+    """Increment a named counter."""
+    if _enabled:
+        _registry.incr(name, amount)
+
+
+def set_gauge(name: str, value: float) -> None:
+    """Record the current value of a level metric (e.g. a queue depth)."""
+    if _enabled:
+        _registry.gauges[name] = value
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(registry: Optional[MetricsRegistry] = None) -> str:
+    """Render histograms as a Prometheus summary and counters as a counter family."""
+    registry = registry or _registry
+    lines = [
+        "# HELP centrix_stage_latency_seconds Latency of instrumented hot-path stages.",
+        "# TYPE centrix_stage_latency_seconds summary",
+    ]
+    for stage, hist in sorted(registry.histograms.items()):
+        label = _escape_label(stage)
+        for quantile in QUANTILES:
+            value = hist.percentile(quantile) / 1e9
+            lines.append(
+                f'centrix_stage_latency_seconds{{stage="{label}",quantile="{quantile:g}"}} {value:.9f}'
+            )
+        lines.append(f'centrix_stage_latency_seconds_sum{{stage="{label}"}} {hist.total_ns / 1e9:.9f}')
+        lines.append(f'centrix_stage_latency_seconds_count{{stage="{label}"}} {hist.count}')
+    lines.append("# HELP centrix_events_total Counters of instrumented events.")
+    lines.append("# TYPE centrix_events_total counter")
+    for name, value in sorted(registry.counters.items()):
+        lines.append(f'centrix_events_total{{name="{_escape_label(name)}"}} {value}')
+    lines.append("# HELP centrix_gauge Current value of instrumented levels.")
+    lines.append("# TYPE centrix_gauge gauge")
+    for name, value in sorted(registry.gauges.items()):
+        lines.append(f'centrix_gauge{{name="{_escape_label(name)}"}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+
+def get_metrics_path() -> Path:
+    """Export file: ``CENTRIX_METRICS_PATH`` or ``<db file>.metrics.prom`` next to the database."""
+    env_path = os.environ.get("CENTRIX_METRICS_PATH")
+    if env_path:
+        return Path(env_path)
+    from centrix.db import get_db_path
+
+    db_path = get_db_path()
+    return db_path.with_name(db_path.name + ".metrics.prom")
+
+
+def write_prometheus(path: Optional[Path] = None) -> Path:
+    """Atomically write the Prometheus text exposition to ``path``."""
+    target = Path(path) if path is not None else get_metrics_path()
+    tmp = target.with_name(target.name + ".tmp")
+    tmp.write_text(render_prometheus())
+    os.replace(tmp, target)
+    return target
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802 - http.server naming
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def start_http_exporter(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve ``/metrics`` from a daemon thread; call ``shutdown()`` on the result to stop."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    print(f"[metrics] serving http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def load_prometheus(path: Optional[Path] = None) -> Dict[str, Dict[str, float]]:
+    """Parse a file written by ``write_prometheus`` back into per-stage summaries."""
+    target = Path(path) if path is not None else get_metrics_path()
+    stages: Dict[str, Dict[str, float]] = {}
+    for line in target.read_text().splitlines():
+        if not line.startswith("centrix_stage_latency_seconds"):
+            continue
+        name_labels, value = line.rsplit(" ", 1)
+        name, _, labels = name_labels.partition("{")
+        fields = {
+            key: raw.strip('"')
+            for key, raw in (part.split("=", 1) for part in labels.rstrip("}").split(",") if "=" in part)
+        }
+        stage = fields.get("stage", "")
+        entry = stages.setdefault(stage, {})
+        if name.endswith("_sum"):
+            entry["sum"] = float(value)
+        elif name.endswith("_count"):
+            entry["count"] = float(value)
+        elif "quantile" in fields:
+            entry[f"p{float(fields['quantile']) * 100:g}"] = float(value)
+    return stages
+
+
+def format_percentiles(stages: Dict[str, Dict[str, float]]) -> str:
+    """Render per-stage summaries as a fixed-width table in milliseconds."""
+    columns = [f"p{q * 100:g}" for q in QUANTILES]
+    width = max([len("stage")] + [len(stage) for stage in stages]) + 2
+    header = f"{'stage':<{width}}{'count':>10}" + "".join(f"{c + ' ms':>12}" for c in columns)
+    lines = [header]
+    for stage, values in sorted(stages.items()):
+        row = f"{stage:<{width}}{int(values.get('count', 0)):>10}"
+        row += "".join(f"{values.get(c, 0.0) * 1000:>12.3f}" for c in columns)
+        lines.append(row)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import random
+
+    @timed("demo.fast")
+    def _fast() -> None:
+        pass
+
+    for _ in range(10000):
+        _fast()
+        with timed("demo.sleep"):
+            time.sleep(random.choice((0.0, 0.0, 0.0001)))
+    print(format_percentiles(get_registry().percentiles()))
+    print(render_prometheus().splitlines()[2])
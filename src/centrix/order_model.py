@@ -1,19 +1,27 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Optional
+from array import array
+from dataclasses import dataclass, field
+from sys import intern
+from typing import Dict, List, Mapping, Optional, Union
 
 import sqlite3
 
+# Column order used by the positional row factories below; SELECTs must match it.
+ORDER_COLUMNS = "id, symbol, side, quantity, status, error_message, created_at, updated_at"
+TRADE_COLUMNS = "id, order_id, fill_price, fill_qty, ts"
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class NewOrder:
     symbol: str
     side: str
     quantity: float
+    # idempotency key: proposing the same key again returns the existing order's id
+    client_order_id: Optional[str] = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class OrderRecord:
     id: int
     symbol: str
@@ -21,6 +29,8 @@ class OrderRecord:
     quantity: float
     status: str
     error_message: Optional[str]
+    created_at: int = 0
+    updated_at: int = 0
 
     @staticmethod
     def from_row(row: sqlite3.Row) -> "OrderRecord":
@@ -31,4 +41,94 @@ class OrderRecord:
             quantity=row["quantity"],
             status=row["status"],
             error_message=row["error_message"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class TradeRecord:
+    id: int
+    order_id: int
+    fill_price: Optional[float]
+    fill_qty: Optional[float]
+    ts: int
+
+
+@dataclass(frozen=True, slots=True)
+class RiskLimits:
+    max_daily_loss: Optional[float]
+    max_order_size: Optional[float]
+    max_order_notional: Optional[float] = None
+    max_position: Optional[float] = None
+    max_symbol_exposure: Optional[float] = None
+    # price for the notional and exposure limits when no market data is known
+    reference_price: Optional[float] = None
+    # limits for symbols with their own risk.* settings (symbol:<SYM> config scope)
+    symbol_limits: Mapping[str, "RiskLimits"] = field(default_factory=dict)
+
+    def for_symbol(self, symbol: str) -> "RiskLimits":
+        """Limits that apply to orders in ``symbol``: its override entry, else these."""
+        return self.symbol_limits.get(symbol, self)
+
+
+OrderLike = Union[NewOrder, OrderRecord]
+
+
+def order_row_factory(cursor: sqlite3.Cursor, row: tuple) -> OrderRecord:
+    """Cursor row factory building OrderRecord positionally from an ORDER_COLUMNS select.
+
+    Symbol, side and status repeat across rows, so they are interned to share one string.
+    """
+    return OrderRecord(
+        row[0], intern(row[1]), intern(row[2]), row[3], intern(row[4]), row[5], row[6], row[7]
+    )
+
+
+def trade_row_factory(cursor: sqlite3.Cursor, row: tuple) -> TradeRecord:
+    """Cursor row factory building TradeRecord positionally from a TRADE_COLUMNS select."""
+    return TradeRecord(*row)
+
+
+@dataclass
+class OrderBatch:
+    """Column-oriented set of orders: typed arrays for numbers, interned strings for labels."""
+
+    ids: array = field(default_factory=lambda: array("q"))
+    symbols: List[str] = field(default_factory=list)
+    sides: List[str] = field(default_factory=list)
+    quantities: array = field(default_factory=lambda: array("d"))
+    statuses: List[str] = field(default_factory=list)
+    error_messages: List[Optional[str]] = field(default_factory=list)
+    created_at: array = field(default_factory=lambda: array("q"))
+    updated_at: array = field(default_factory=lambda: array("q"))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def extend_rows(self, rows: "sqlite3.Cursor | List[tuple]") -> None:
+        """Append plain ORDER_COLUMNS tuples (e.g. a cursor with row_factory=None)."""
+        interned: Dict[str, str] = {}
+        share = interned.setdefault
+        for order_id, symbol, side, quantity, status, error, created, updated in rows:
+            self.ids.append(order_id)
+            self.symbols.append(share(symbol, symbol))
+            self.sides.append(share(side, side))
+            self.quantities.append(quantity)
+            self.statuses.append(share(status, status))
+            self.error_messages.append(error)
+            self.created_at.append(created)
+            self.updated_at.append(updated)
+
+    def record(self, index: int) -> OrderRecord:
+        """Materialize a single row as an OrderRecord."""
+        return OrderRecord(
+            self.ids[index],
+            self.symbols[index],
+            self.sides[index],
+            self.quantities[index],
+            self.statuses[index],
+            self.error_messages[index],
+            self.created_at[index],
+            self.updated_at[index],
         )
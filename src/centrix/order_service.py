@@ -1,114 +1,504 @@
 from __future__ import annotations
 
 import sys
-import time
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 if __name__ == "__main__" and __package__ is None:
     sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from centrix import clock
+from centrix.config_service import get_config_snapshot
 from centrix.control import get_safe_mode, set_safe_mode
-from centrix.db import get_connection
-from centrix.ib_client import create_ib_client, connect_ib, disconnect_ib, submit_market_order
-from centrix.order_model import NewOrder, OrderRecord
-from centrix.risk import DummyOrder, check_order_against_limits, load_risk_limits
+from centrix.db import get_db_key, get_storage
+from centrix.ib_client import get_ib_session
+from centrix.metrics import incr, timed
+from centrix.order_model import NewOrder, OrderBatch, OrderRecord, TradeRecord
+from centrix.order_state import EXECUTED, EXECUTING, FAILED, PROPOSED, RISK_BLOCKED
+from centrix.pacing import order_lane
+from centrix.positions import get_position_tracker
+from centrix.risk import (
+    OrderColumns,
+    RiskContext,
+    RiskLimits,
+    check_order_against_limits,
+    evaluate_order_batch,
+    load_risk_context,
+    load_risk_limits,
+)
+from centrix.wakeup import notify_engine
 
 
 def _now_ts() -> int:
-    return int(time.time())
+    return int(clock.now())
+
+
+MAX_CLIENT_ORDER_ID_LEN = 64
+
+
+def validate_client_order_id(client_order_id: str) -> str:
+    """Raise ValueError for an empty or overlong client order id."""
+    if not client_order_id or len(client_order_id) > MAX_CLIENT_ORDER_ID_LEN:
+        raise ValueError(f"Invalid client order id: {client_order_id!r}")
+    return client_order_id
+
+
+class ClientOrderIdCache:
+    """Bounded LRU of client order id -> order id for rejecting retried proposals in memory.
+
+    Only keys whose order is committed (or journaled) are added, so a hit is always a
+    duplicate; a miss is answered by the unique index on orders.client_order_id.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(int(capacity), 1)
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def get(self, client_order_id: str) -> Optional[int]:
+        with self._lock:
+            order_id = self._ids.get(client_order_id)
+            if order_id is not None:
+                self._ids.move_to_end(client_order_id)
+            return order_id
+
+    def put(self, client_order_id: str, order_id: int) -> None:
+        with self._lock:
+            self._ids[client_order_id] = order_id
+            self._ids.move_to_end(client_order_id)
+            while len(self._ids) > self.capacity:
+                self._ids.popitem(last=False)
+
+
+_client_id_caches: Dict[str, ClientOrderIdCache] = {}
+_client_id_lock = threading.Lock()
+
+
+def get_client_id_cache() -> ClientOrderIdCache:
+    """Return the cache for the current database, sized by ``orders.dedupe_cache_size``."""
+    db_key = get_db_key()
+    cache = _client_id_caches.get(db_key)
+    if cache is not None:
+        return cache
+    with _client_id_lock:
+        cache = _client_id_caches.get(db_key)
+        if cache is None:
+            size = get_config_snapshot().get_int("orders.dedupe_cache_size", default=100_000)
+            cache = _client_id_caches[db_key] = ClientOrderIdCache(size or 100_000)
+        return cache
+
+
+def reset_client_id_cache() -> None:
+    """Forget the cached client order ids of the current database."""
+    with _client_id_lock:
+        _client_id_caches.pop(get_db_key(), None)
+
+
+def find_client_order_ids(client_order_ids: Iterable[str]) -> Dict[str, int]:
+    """Map the already used client order ids among ``client_order_ids`` to their order ids.
+
+    The LRU answers first; only its misses go to the unique index, and those hits are cached.
+    """
+    cache = get_client_id_cache()
+    found: Dict[str, int] = {}
+    missing: Dict[str, None] = {}
+    for client_order_id in client_order_ids:
+        order_id = cache.get(validate_client_order_id(client_order_id))
+        if order_id is not None:
+            found[client_order_id] = order_id
+        else:
+            missing[client_order_id] = None
+    if missing:
+        stored = get_storage().find_client_order_ids(list(missing))
+        for client_order_id, order_id in stored.items():
+            cache.put(client_order_id, order_id)
+        found.update(stored)
+    return found
+
+
+# The open OrderJournal (set by order_journal, which imports this module). With
+# ``orders.journal`` intake is acknowledged from the journal, and order reads first wait
+# until the intents journaled so far have been materialized into SQLite.
+_journal: Optional[Any] = None
+
+
+def set_intake_journal(journal: Optional[Any]) -> None:
+    global _journal
+    _journal = journal
+
+
+def _intake_journal() -> Optional[Any]:
+    if not get_config_snapshot().get_bool("orders.journal", default=False):
+        return None
+    from centrix.order_journal import get_order_journal
+
+    return get_order_journal()
+
+
+def _await_journaled_intents() -> None:
+    journal = _journal
+    if journal is not None:
+        journal.wait_intents_materialized()
 
 
 def create_order_proposal(new_order: NewOrder) -> int:
-    """Insert a proposed order into the orders table and return its id."""
-    ts = _now_ts()
-    with get_connection() as conn:
-        cursor = conn.execute(
-            """
-            INSERT INTO orders (symbol, side, quantity, status, created_at, updated_at, error_message)
-            VALUES (?, ?, ?, 'proposed', ?, ?, NULL)
-            """,
-            (new_order.symbol, new_order.side, new_order.quantity, ts, ts),
-        )
-        return int(cursor.lastrowid)
+    """Insert a proposed order into the orders table and return its id.
+
+    With a client_order_id that is already used, the existing order's id is returned instead.
+    """
+    return create_order_proposals([new_order])[0]
+
+
+def get_order_by_client_id(client_order_id: str) -> Optional[OrderRecord]:
+    """Fetch an order by its client order id."""
+    return get_storage().get_order_by_client_id(client_order_id)
 
 
 def get_order(order_id: int) -> Optional[OrderRecord]:
     """Fetch an order by id."""
-    with get_connection() as conn:
-        cursor = conn.execute(
-            "SELECT * FROM orders WHERE id = ?",
-            (order_id,),
+    _await_journaled_intents()
+    return get_storage().get_orders([order_id]).get(order_id)
+
+
+def list_orders_by_status(
+    status: str, limit: int = 500, symbols: Optional[Sequence[str]] = None
+) -> List[OrderRecord]:
+    """Return up to ``limit`` orders with the given status (and symbols), oldest first."""
+    return get_storage().list_orders_by_status(status, limit, symbols)
+
+
+def load_order_batch(
+    status: Optional[str] = None, since_id: int = 0, limit: Optional[int] = None
+) -> OrderBatch:
+    """Load orders (optionally filtered by status) into a columnar OrderBatch for analysis."""
+    return get_storage().load_order_batch(status, since_id, limit)
+
+
+def list_open_orders(limit: int = 10000) -> List[OrderRecord]:
+    """Return orders still in flight ('executing' first, then 'proposed') via the status index."""
+    return get_storage().list_open_orders(limit)
+
+
+def get_order_events(order_id: int) -> List[Dict[str, object]]:
+    """Return the transition log of an order, oldest first."""
+    return get_storage().get_order_events(order_id)
+
+
+def recover_open_orders(stale_after_sec: Optional[int] = None) -> List[OrderRecord]:
+    """Fail 'executing' orders left behind by a crash and return the remaining open orders.
+
+    An order counts as stale when it has been 'executing' for longer than
+    ``orders.recovery_timeout_sec`` (default 300), so a concurrent executor is not disturbed.
+    """
+    if stale_after_sec is None:
+        stale_after_sec = (
+            get_config_snapshot().get_int("orders.recovery_timeout_sec", default=300) or 300
         )
-        row = cursor.fetchone()
-        if row is None:
-            return None
-        return OrderRecord.from_row(row)
+    cutoff = _now_ts() - stale_after_sec
+    open_orders = list_open_orders()
+    stale = [o for o in open_orders if o.status == EXECUTING and o.updated_at < cutoff]
+    if stale:
+        update_order_statuses(
+            [(o.id, FAILED, "interrupted: execution outcome unknown after restart") for o in stale]
+        )
+    stale_ids = {o.id for o in stale}
+    return [o for o in open_orders if o.id not in stale_ids]
 
 
+@timed("order.status_update")
 def update_order_status(order_id: int, status: str, error_message: Optional[str] = None) -> None:
-    """Update order status and optional error message."""
-    ts = _now_ts()
-    with get_connection() as conn:
-        conn.execute(
-            """
-            UPDATE orders
-            SET status = ?, updated_at = ?, error_message = ?
-            WHERE id = ?
-            """,
-            (status, ts, error_message, order_id),
-        )
+    """Move an order to a new status; the transition is validated and logged in order_events."""
+    get_storage().update_order_statuses([(order_id, status, error_message)], _now_ts())
 
 
+@timed("order.risk")
 def check_risk(order_id: int) -> Tuple[bool, str]:
     """Evaluate risk limits for an order; update status if blocked."""
     order = get_order(order_id)
     if order is None:
         return False, "order not found"
 
-    dummy = DummyOrder(symbol=order.symbol, side=order.side, quantity=order.quantity)
+    if order.status != PROPOSED:
+        return False, f"order is {order.status}"
+
     limits = load_risk_limits()
-    allowed, reason = check_order_against_limits(dummy, limits)
+    allowed, reason = check_order_against_limits(order, limits, load_risk_context())
 
     if not allowed:
-        update_order_status(order_id, "risk_blocked", error_message=reason)
+        update_order_status(order_id, RISK_BLOCKED, error_message=reason)
         set_safe_mode(True)
         return False, reason or "risk blocked"
 
     return True, ""
 
 
+def claim_orders(order_ids: Sequence[int]) -> List[int]:
+    """Atomically move still-'proposed' orders to 'executing'; returns the ids claimed."""
+    if not order_ids:
+        return []
+    return get_storage().claim_orders(order_ids, _now_ts())
+
+
+def _execute_noop(order: OrderRecord) -> bool:
+    # a retry (or a concurrent caller) of an order that already left 'proposed'
+    incr("orders.execute_noop")
+    return order.status == EXECUTED
+
+
+@timed("order.execute")
 def execute_order(order_id: int) -> bool:
-    """Execute an order end-to-end for Phase 5 (paper)."""
+    """Execute an order end-to-end for Phase 5 (paper).
+
+    Safe to retry: once the order has left 'proposed' nothing is sent again and the result
+    only says whether it ended up executed.
+    """
     order = get_order(order_id)
     if order is None:
         return False
+    if order.status != PROPOSED:
+        return _execute_noop(order)
 
     if get_safe_mode():
-        update_order_status(order_id, "failed", error_message="Safe-Mode active")
+        update_order_status(order_id, FAILED, error_message="Safe-Mode active")
         return False
 
     allowed, reason = check_risk(order_id)
     if not allowed:
         return False
 
-    client = create_ib_client()
+    if not claim_orders([order_id]):
+        return _execute_noop(get_order(order_id) or order)
 
-    connected = connect_ib(client)
+    session = get_ib_session()
+    with timed("order.connect"):
+        connected = session.ensure_connected()
     if not connected:
-        update_order_status(order_id, "failed", error_message="IB connection failed")
+        update_order_status(order_id, FAILED, error_message="IB connection failed")
         return False
 
+    position = get_position_tracker().positions().get(order.symbol, 0.0)
     try:
-        update_order_status(order_id, "executing")
-        success, err = submit_market_order(client, order.symbol, order.side, order.quantity)
+        with timed("order.submit"):
+            success, err = session.submit_market_order(
+                order.symbol,
+                order.side,
+                order.quantity,
+                lane=order_lane(order.side, order.quantity, position),
+            )
         if success:
-            update_order_status(order_id, "executed", error_message=None)
+            update_order_status(order_id, EXECUTED, error_message=None)
             return True
-        update_order_status(order_id, "failed", error_message=err or "IB order failed")
+        update_order_status(order_id, FAILED, error_message=err or "IB order failed")
         return False
     except Exception as exc:  # safety net to avoid crashes
-        update_order_status(order_id, "failed", error_message=str(exc))
+        session.mark_broken()
+        update_order_status(order_id, FAILED, error_message=str(exc))
         return False
-    finally:
-        disconnect_ib(client)
+
+
+def create_order_proposals(new_orders: Sequence[NewOrder]) -> List[int]:
+    """Insert many proposed orders with one executemany and return their ids in input order.
+
+    An order whose client_order_id is already used gets that order's id and no new row (a
+    repeat within the batch gets the id of its first occurrence); when the LRU knows every
+    key, the call returns without a write transaction. With ``orders.journal`` the orders
+    are journaled instead and the call returns once the intents are fsynced.
+    """
+    if not new_orders:
+        return []
+    journal = _intake_journal()
+    if journal is not None:
+        return journal.propose(new_orders)
+    cache = get_client_id_cache()
+    assigned: Dict[str, int] = {}
+    unknown: Dict[str, None] = {}
+    for order in new_orders:
+        client_order_id = order.client_order_id
+        if client_order_id is None or client_order_id in assigned:
+            continue
+        existing = cache.get(validate_client_order_id(client_order_id))
+        if existing is not None:
+            assigned[client_order_id] = existing
+        else:
+            unknown[client_order_id] = None
+    if not unknown and all(order.client_order_id is not None for order in new_orders):
+        incr("orders.duplicate", len(new_orders))
+        return [assigned[order.client_order_id] for order in new_orders]  # type: ignore[index]
+
+    order_ids, inserted = get_storage().insert_orders(new_orders, _now_ts(), known=assigned)
+    for order, order_id in zip(new_orders, order_ids):
+        if order.client_order_id is not None:
+            cache.put(order.client_order_id, order_id)
+    if inserted < len(new_orders):
+        incr("orders.duplicate", len(new_orders) - inserted)
+    if inserted:
+        notify_engine("orders")
+    return order_ids
+
+
+def get_orders(order_ids: Iterable[int]) -> Dict[int, OrderRecord]:
+    """Fetch many orders by id with chunked IN queries."""
+    _await_journaled_intents()
+    return get_storage().get_orders(list(order_ids))
+
+
+def update_order_statuses(
+    updates: Sequence[Tuple[int, str, Optional[str]]], skip_invalid: bool = False
+) -> None:
+    """Apply many validated (order_id, status, error_message) transitions in one transaction.
+
+    With ``skip_invalid`` an invalid transition is logged and skipped instead of failing all.
+    """
+    if not updates:
+        return
+    get_storage().update_order_statuses(updates, _now_ts(), skip_invalid=skip_invalid)
+
+
+def record_fills(fills: Sequence[Tuple[int, float, float]]) -> List[int]:
+    """Insert (order_id, fill_price, fill_qty) rows into trades and feed the position tracker."""
+    if not fills:
+        return []
+    ts = _now_ts()
+    orders = get_orders(order_id for order_id, _, _ in fills)
+    trade_ids = get_storage().insert_trades(fills, ts)
+    tracker = get_position_tracker()
+    if tracker.last_trade_id == trade_ids[0] - 1:
+        for trade_id, (order_id, price, qty) in zip(trade_ids, fills):
+            order = orders.get(order_id)
+            if order is not None:
+                tracker.apply_fill(trade_id, order.symbol, order.side, qty, price, ts)
+    else:
+        # trades from other writers are interleaved; catch up in id order instead
+        tracker.sync()
+    return trade_ids
+
+
+def get_fill_summary(order_ids: Iterable[int]) -> Dict[int, Tuple[float, float]]:
+    """(filled quantity, average fill price) per order, from the trades table."""
+    return get_storage().fill_summary(list(order_ids))
+
+
+def list_trades(since_id: int = 0, limit: int = 10000) -> List[TradeRecord]:
+    """Return trades with id > since_id in id order."""
+    return get_storage().list_trades(since_id, limit)
+
+
+@timed("order.risk_batch")
+def check_risk_batch(
+    orders: Sequence[OrderRecord],
+    limits: Optional[RiskLimits] = None,
+    context: Optional[RiskContext] = None,
+) -> Dict[int, Tuple[bool, str]]:
+    """Check all orders against one limits snapshot; block violators in a single transaction."""
+    if limits is None:
+        limits = load_risk_limits()
+    if context is None:
+        context = load_risk_context()
+    columns = OrderColumns.from_orders(orders, context.prices)
+    decision = evaluate_order_batch(columns, limits, context)
+
+    results: Dict[int, Tuple[bool, str]] = {}
+    blocked: List[Tuple[int, str, Optional[str]]] = []
+    for order, allowed, reason in zip(orders, decision.allowed, decision.reasons):
+        if allowed:
+            results[order.id] = (True, "")
+        else:
+            results[order.id] = (False, reason or "risk blocked")
+            blocked.append((order.id, RISK_BLOCKED, reason))
+
+    if blocked:
+        update_order_statuses(blocked)
+        set_safe_mode(True)
+    return results
+
+
+def prepare_orders_for_submit(order_ids: Sequence[int]) -> List[OrderRecord]:
+    """Run the pre-trade checks for a batch and move the survivors to 'executing'.
+
+    One load, safe-mode check, one risk pass and a connection check; orders that may not be
+    sent are failed or blocked here. Returns the orders the caller must now submit.
+    """
+    loaded = get_orders(order_ids)
+    # submission order is the caller's order, as if the orders were executed one by one
+    orders = {
+        order_id: loaded[order_id]
+        for order_id in dict.fromkeys(order_ids)
+        if order_id in loaded and loaded[order_id].status == PROPOSED
+    }
+    if not orders:
+        return []
+
+    if get_safe_mode():
+        update_order_statuses([(order_id, FAILED, "Safe-Mode active") for order_id in orders])
+        return []
+
+    checked = list(check_risk_batch(list(orders.values())).items())
+    # a blocked order switched on safe_mode; one by one, the orders before it would have been
+    # sent and the allowed ones after it failed
+    first_blocked = next((k for k, (_, (ok, _)) in enumerate(checked) if not ok), len(checked))
+    allowed = [orders[order_id] for order_id, _ in checked[:first_blocked]]
+    stopped = [orders[order_id] for order_id, (ok, _) in checked[first_blocked:] if ok]
+    if stopped:
+        update_order_statuses([(o.id, FAILED, "Safe-Mode active") for o in stopped])
+    if not allowed:
+        return []
+
+    # orders another caller claimed in the meantime are not sent twice
+    claimed = set(claim_orders([o.id for o in allowed]))
+    allowed = [o for o in allowed if o.id in claimed]
+    if allowed and not get_ib_session().ensure_connected():
+        update_order_statuses([(o.id, FAILED, "IB connection failed") for o in allowed])
+        return []
+    return [
+        OrderRecord(o.id, o.symbol, o.side, o.quantity, EXECUTING, None, o.created_at, o.updated_at)
+        for o in allowed
+    ]
+
+
+@timed("order.execute_batch")
+def execute_orders(order_ids: Sequence[int]) -> Dict[int, bool]:
+    """Execute many orders: one load, one risk pass, paced submits, grouped status writes.
+
+    Submits go one by one over the shared session, which serializes them on its lock; the
+    order router pipelines a whole batch in one write (``orders.async_submit``).
+    """
+    results: Dict[int, bool] = {order_id: False for order_id in order_ids}
+    allowed = prepare_orders_for_submit(order_ids)
+    if not allowed:
+        return results
+
+    session = get_ib_session()
+    # positions as of the risk check; orders that shrink them get the pacer's reduce lane
+    positions = get_position_tracker().positions()
+
+    def _submit(order: OrderRecord) -> Tuple[int, bool, str]:
+        lane = order_lane(order.side, order.quantity, positions.get(order.symbol, 0.0))
+        try:
+            with timed("order.submit"):
+                success, err = session.submit_market_order(
+                    order.symbol, order.side, order.quantity, lane=lane
+                )
+            return order.id, success, err
+        except Exception as exc:  # safety net to avoid crashes
+            session.mark_broken()
+            return order.id, False, str(exc)
+
+    final: List[Tuple[int, str, Optional[str]]] = []
+    for order_id, success, err in map(_submit, allowed):
+        results[order_id] = success
+        if success:
+            final.append((order_id, EXECUTED, None))
+        else:
+            final.append((order_id, FAILED, err or "IB order failed"))
+    update_order_statuses(final)
+    return results
+
+
+def submit_orders(new_orders: Sequence[NewOrder]) -> Dict[int, bool]:
+    """Propose and execute a basket of orders through the batch pipeline."""
+    return execute_orders(create_order_proposals(new_orders))
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+PROPOSED = "proposed"
+EXECUTING = "executing"
+EXECUTED = "executed"
+FAILED = "failed"
+RISK_BLOCKED = "risk_blocked"
+
+ALL_STATUSES: FrozenSet[str] = frozenset({PROPOSED, EXECUTING, EXECUTED, FAILED, RISK_BLOCKED})
+OPEN_STATUSES: Tuple[str, ...] = (EXECUTING, PROPOSED)
+TERMINAL_STATUSES: FrozenSet[str] = frozenset({EXECUTED, FAILED, RISK_BLOCKED})
+
+TRANSITIONS: Dict[str, FrozenSet[str]] = {
+    PROPOSED: frozenset({EXECUTING, FAILED, RISK_BLOCKED}),
+    EXECUTING: frozenset({EXECUTED, FAILED}),
+    EXECUTED: frozenset(),
+    FAILED: frozenset(),
+    RISK_BLOCKED: frozenset(),
+}
+
+# SQLite's default limit on bound parameters is 999 on older builds
+_IN_CHUNK = 500
+
+
+def can_transition(current: str, new: str) -> bool:
+    """Return True if an order may move from ``current`` to ``new``."""
+    return new in TRANSITIONS.get(current, frozenset())
+
+
+def validate_transition(current: str, new: str) -> None:
+    """Raise ValueError for transitions the order pipeline does not allow."""
+    if new not in ALL_STATUSES:
+        raise ValueError(f"Invalid order status: {new}")
+    if not can_transition(current, new):
+        raise ValueError(f"Invalid order transition: {current} -> {new}")
+
+
+def record_created(conn: sqlite3.Connection, order_ids: Sequence[int], ts: int) -> None:
+    """Log the creation event of freshly inserted 'proposed' orders."""
+    conn.executemany(
+        """
+        INSERT INTO order_events (order_id, from_status, to_status, ts, error_message)
+        VALUES (?, NULL, ?, ?, NULL)
+        """,
+        [(order_id, PROPOSED, ts) for order_id in order_ids],
+    )
+
+
+def claim_proposed(conn: sqlite3.Connection, order_ids: Sequence[int], ts: int) -> List[int]:
+    """Move the orders among ``order_ids`` that are still 'proposed' to 'executing'.
+
+    The status check is part of the UPDATE, so of two callers executing the same order only
+    one claims it. Runs inside the caller's transaction; returns the claimed ids.
+    """
+    claimed: List[int] = []
+    for start in range(0, len(order_ids), _IN_CHUNK):
+        chunk = list(order_ids[start : start + _IN_CHUNK])
+        placeholders = ",".join("?" * len(chunk))
+        cursor = conn.execute(
+            f"""
+            UPDATE orders SET status = ?, updated_at = ?, error_message = NULL
+            WHERE status = ? AND id IN ({placeholders})
+            RETURNING id
+            """,
+            (EXECUTING, ts, PROPOSED, *chunk),
+        )
+        claimed.extend(row[0] for row in cursor.fetchall())
+    conn.executemany(
+        """
+        INSERT INTO order_events (order_id, from_status, to_status, ts, error_message)
+        VALUES (?, ?, ?, ?, NULL)
+        """,
+        [(order_id, PROPOSED, EXECUTING, ts) for order_id in claimed],
+    )
+    return claimed
+
+
+def apply_transitions(
+    conn: sqlite3.Connection,
+    updates: Sequence[Tuple[int, str, Optional[str]]],
+    ts: int,
+    skip_invalid: bool = False,
+) -> List[int]:
+    """Validate and apply (order_id, status, error_message) updates with their events.
+
+    Runs inside the caller's write transaction (``BEGIN IMMEDIATE``, so the status read
+    below cannot go stale) and the status UPDATE and the order_events row commit together.
+    Raises ValueError on an invalid transition before writing anything, or with
+    ``skip_invalid`` logs and skips it; returns unknown order ids. Each UPDATE is
+    conditional on the status read, and a row that changed anyway raises ValueError.
+    """
+    current: Dict[int, str] = {}
+    ids = [order_id for order_id, _, _ in updates]
+    for start in range(0, len(ids), _IN_CHUNK):
+        chunk = ids[start : start + _IN_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(
+            f"SELECT id, status FROM orders WHERE id IN ({placeholders})", chunk
+        ).fetchall():
+            current[row[0]] = row[1]
+
+    missing: List[int] = []
+    rows: List[Tuple[str, int, Optional[str], int, str]] = []
+    events: List[Tuple[int, str, str, int, Optional[str]]] = []
+    for order_id, status, error_message in updates:
+        old = current.get(order_id)
+        if old is None:
+            missing.append(order_id)
+            continue
+        try:
+            validate_transition(old, status)
+        except ValueError as exc:
+            if not skip_invalid:
+                raise
+            print(f"[order_state] skipping transition of order {order_id}: {exc}")
+            continue
+        current[order_id] = status
+        rows.append((status, ts, error_message, order_id, old))
+        events.append((order_id, old, status, ts, error_message))
+
+    cursor = conn.executemany(
+        "UPDATE orders SET status = ?, updated_at = ?, error_message = ? "
+        "WHERE id = ? AND status = ?",
+        rows,
+    )
+    if cursor.rowcount != len(rows):
+        raise ValueError(
+            f"Order status changed concurrently: {len(rows) - cursor.rowcount} of "
+            f"{len(rows)} transitions found a different status"
+        )
+    conn.executemany(
+        """
+        INSERT INTO order_events (order_id, from_status, to_status, ts, error_message)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        events,
+    )
+    return missing
+
+
+if __name__ == "__main__":
+    print(can_transition(PROPOSED, EXECUTING), can_transition(EXECUTED, FAILED))
+    try:
+        validate_transition(RISK_BLOCKED, EXECUTING)
+    except ValueError as exc:
+        print(exc)
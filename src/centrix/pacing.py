@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix.config_service import get_config_snapshot
+from centrix.metrics import get_registry, incr, set_gauge
+
+# Priority lanes, most urgent first: cancels, then orders that shrink a position.
+CANCEL = 0
+REDUCE = 1
+NORMAL = 2
+LANE_NAMES = ("cancel", "reduce", "normal")
+
+# IBKR disconnects clients sending more than 50 messages per second; stay below that.
+DEFAULT_RATE_PER_SEC = 45.0
+
+
+def order_lane(side: str, quantity: float, position: float) -> int:
+    """REDUCE for an order that brings the current net position closer to flat, else NORMAL."""
+    signed = quantity if side.lower() == "buy" else -quantity
+    return REDUCE if abs(position + signed) < abs(position) else NORMAL
+
+
+class TokenBucket:
+    """Refills ``rate_per_sec`` tokens per second up to ``burst``; not thread-safe on its own."""
+
+    def __init__(self, rate_per_sec: float, burst: float) -> None:
+        if rate_per_sec <= 0 or burst < 1:
+            raise ValueError(f"Invalid token bucket: rate={rate_per_sec}, burst={burst}")
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate_per_sec)
+        self.updated = now
+
+    def take(self, max_tokens: int) -> int:
+        """Take up to ``max_tokens`` whole tokens without waiting; return how many were taken."""
+        self._refill()
+        granted = min(int(self.tokens), max_tokens)
+        self.tokens -= granted
+        return granted
+
+    def delay(self, tokens: int = 1) -> float:
+        """Seconds until ``tokens`` are available."""
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate_per_sec)
+
+
+class GatewayPacer:
+    """Token-bucket pacing of gateway messages shared by every submit path of a process.
+
+    A caller only gets a token while no caller of a more urgent lane is waiting, so cancels
+    and risk-reducing orders are sent first when the bucket runs dry. Settings:
+    ``gateway.pacing.rate_per_sec`` (0 disables pacing) and ``gateway.pacing.burst``.
+    """
+
+    def __init__(self, rate_per_sec: Optional[float] = None, burst: Optional[float] = None) -> None:
+        snapshot = get_config_snapshot()
+        if rate_per_sec is None:
+            rate_per_sec = snapshot.resolve_float(
+                "gateway.pacing.rate_per_sec", default=DEFAULT_RATE_PER_SEC
+            )
+        if burst is None:
+            burst = snapshot.resolve_float("gateway.pacing.burst", default=rate_per_sec)
+        self.enabled = bool(rate_per_sec and rate_per_sec > 0)
+        self.bucket = TokenBucket(rate_per_sec, max(1.0, burst or 1.0)) if self.enabled else None
+        self._cond = threading.Condition()
+        self._waiting = [0] * len(LANE_NAMES)
+
+    def _blocked(self, lane: int) -> bool:
+        return any(self._waiting[:lane])
+
+    def take(self, max_tokens: int, lane: int = NORMAL) -> int:
+        """Non-blocking: up to ``max_tokens`` tokens unless a more urgent lane is waiting."""
+        if self.bucket is None:
+            return max_tokens
+        with self._cond:
+            if self._blocked(lane):
+                return 0
+            return self.bucket.take(max_tokens)
+
+    def delay(self) -> float:
+        """Seconds until the next token."""
+        if self.bucket is None:
+            return 0.0
+        with self._cond:
+            return self.bucket.delay()
+
+    def acquire(self, lane: int = NORMAL, timeout: Optional[float] = None) -> bool:
+        """Block until one token is granted to this lane; False on timeout."""
+        if self.bucket is None:
+            return True
+        started = time.perf_counter_ns()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiting[lane] += 1
+            try:
+                while self._blocked(lane) or self.bucket.take(1) == 0:
+                    wait = self.bucket.delay()
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._cond.wait(max(wait, 0.001))
+            finally:
+                self._waiting[lane] -= 1
+                self._cond.notify_all()
+        waited_ns = time.perf_counter_ns() - started
+        get_registry().observe(f"gateway.pacing_wait.{LANE_NAMES[lane]}", waited_ns)
+        return True
+
+
+@dataclass
+class QueuedMessage:
+    """One pending gateway message; coalesced items share it."""
+
+    lane: int
+    key: Optional[Hashable]
+    items: List[Any]
+    enqueued_ns: int = field(default_factory=time.perf_counter_ns)
+    # summed size of the items (order quantity), checked against the put's ``max_size``
+    size: float = 0.0
+
+
+class SubmissionQueue:
+    """Priority lanes of pending gateway messages.
+
+    Items put with the same ``key`` in the same lane while a message for that key is still
+    queued join it instead of taking a message (and a token) of their own, as long as the
+    message's summed ``size`` stays within ``max_size``; past it a new message starts.
+    """
+
+    def __init__(self, coalesce: bool = True) -> None:
+        self.coalesce = coalesce
+        self.lanes: List[Deque[QueuedMessage]] = [deque() for _ in LANE_NAMES]
+        self._open: Dict[Tuple[int, Hashable], QueuedMessage] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(lane) for lane in self.lanes)
+
+    def put(
+        self,
+        item: Any,
+        lane: int = NORMAL,
+        key: Optional[Hashable] = None,
+        size: float = 0.0,
+        max_size: Optional[float] = None,
+    ) -> bool:
+        """Queue ``item``; True when it was coalesced into an already queued message."""
+        with self._lock:
+            message = self._open.get((lane, key)) if self.coalesce and key is not None else None
+            if message is not None and (max_size is None or message.size + size <= max_size):
+                message.items.append(item)
+                message.size += size
+            else:
+                message = QueuedMessage(lane, key, [item], size=size)
+                self.lanes[lane].append(message)
+                if self.coalesce and key is not None:
+                    self._open[(lane, key)] = message
+            coalesced = len(message.items) > 1
+            self._publish()
+        if coalesced:
+            incr("gateway.coalesced")
+        return coalesced
+
+    def top_lane(self) -> Optional[int]:
+        with self._lock:
+            for lane, messages in enumerate(self.lanes):
+                if messages:
+                    return lane
+            return None
+
+    def pop(self, max_messages: int) -> List[QueuedMessage]:
+        """Take up to ``max_messages`` messages, most urgent lane first, FIFO within a lane."""
+        taken: List[QueuedMessage] = []
+        with self._lock:
+            for messages in self.lanes:
+                while messages and len(taken) < max_messages:
+                    message = messages.popleft()
+                    if message.key is not None:
+                        self._open.pop((message.lane, message.key), None)
+                    taken.append(message)
+            self._publish()
+        registry = get_registry()
+        now_ns = time.perf_counter_ns()
+        for message in taken:
+            waited_ns = now_ns - message.enqueued_ns
+            registry.observe(f"gateway.queue_wait.{LANE_NAMES[message.lane]}", waited_ns)
+        return taken
+
+    def remove(self, item: Any, size: float = 0.0) -> bool:
+        """Drop a queued item (e.g. a cancelled order); False when it is not queued anymore."""
+        with self._lock:
+            for messages in self.lanes:
+                for message in messages:
+                    if item in message.items:
+                        message.items.remove(item)
+                        message.size -= size
+                        if not message.items:
+                            messages.remove(message)
+                            if message.key is not None:
+                                self._open.pop((message.lane, message.key), None)
+                        self._publish()
+                        return True
+        return False
+
+    def _publish(self) -> None:
+        total = 0
+        for lane, messages in enumerate(self.lanes):
+            set_gauge(f"gateway.queue_depth.{LANE_NAMES[lane]}", len(messages))
+            total += len(messages)
+        set_gauge("gateway.queue_depth", total)
+
+
+_pacer: Optional[GatewayPacer] = None
+_pacer_lock = threading.Lock()
+
+
+def get_gateway_pacer() -> GatewayPacer:
+    """Return the process-wide pacer (one gateway connection per process)."""
+    global _pacer
+    with _pacer_lock:
+        if _pacer is None:
+            _pacer = GatewayPacer()
+        return _pacer
+
+
+def reset_gateway_pacer() -> None:
+    """Forget the pacer so the next use reads the pacing settings again."""
+    global _pacer
+    with _pacer_lock:
+        _pacer = None
+
+
+if __name__ == "__main__":
+    from centrix.db import init_schema
+
+    init_schema()
+    pacer = GatewayPacer(rate_per_sec=20, burst=5)
+    started = time.monotonic()
+    sent: List[Tuple[str, float]] = []
+
+    def _worker(lane: int, count: int) -> None:
+        for _ in range(count):
+            pacer.acquire(lane)
+            sent.append((LANE_NAMES[lane], time.monotonic() - started))
+
+    threads = [threading.Thread(target=_worker, args=(NORMAL, 30))]
+    threads[0].start()
+    time.sleep(0.3)
+    threads.append(threading.Thread(target=_worker, args=(REDUCE, 5)))
+    threads[1].start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    print(f"{len(sent)} messages in {elapsed:.2f}s ({len(sent) / elapsed:.1f}/s, limit 20/s)")
+    reduce_times = [at for lane, at in sent if lane == "reduce"]
+    print(f"reduce lane sent between {reduce_times[0]:.2f}s and {reduce_times[-1]:.2f}s")
+
+    queue = SubmissionQueue()
+    for index in range(6):
+        queue.put(index, NORMAL, key=("AAPL", "buy") if index % 2 else ("MSFT", "buy"))
+    queue.put("close", REDUCE, key=("NVDA", "sell"))
+    print([(LANE_NAMES[m.lane], m.items) for m in queue.pop(10)])
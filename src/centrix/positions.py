@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix import clock
+from centrix.config_service import get_config_snapshot
+from centrix.db import get_storage, init_schema
+
+
+@dataclass
+class SymbolState:
+    qty: float = 0.0
+    day_cash: float = 0.0
+    open_qty: float = 0.0
+    open_mark: float = 0.0
+    last_price: float = 0.0
+
+    def day_pnl(self, mark: Optional[float] = None) -> float:
+        """Cash flow of today's fills plus the change in value of the position since the open."""
+        price = self.last_price if mark is None else mark
+        return self.day_cash + self.qty * price - self.open_qty * self.open_mark
+
+
+def session_start_for(ts: float, boundary_sec: int) -> int:
+    """Return the most recent session boundary (seconds after UTC midnight) at or before ts."""
+    day_start = int(ts // 86400 * 86400)
+    start = day_start + boundary_sec
+    return start if start <= ts else start - 86400
+
+
+def _session_boundary_sec() -> int:
+    """Parse ``risk.session_start_utc`` ("HH:MM", default midnight UTC)."""
+    raw = get_config_snapshot().get("risk.session_start_utc", default="00:00") or "00:00"
+    try:
+        hours, minutes = raw.split(":", 1)
+        return (int(hours) % 24) * 3600 + (int(minutes) % 60) * 60
+    except ValueError:
+        return 0
+
+
+class PositionTracker:
+    """Net positions and day P&L maintained incrementally from fills (O(1) per fill)."""
+
+    def __init__(self, boundary_sec: int = 0, now: Optional[float] = None) -> None:
+        self.boundary_sec = boundary_sec
+        self.symbols: Dict[str, SymbolState] = {}
+        self.last_trade_id = 0
+        self.session_start = session_start_for(clock.now() if now is None else now, boundary_sec)
+        self.lock = threading.RLock()
+
+    def apply_fill(
+        self, trade_id: int, symbol: str, side: str, qty: float, price: float, ts: float
+    ) -> None:
+        """Fold one fill into the state; fills at or below last_trade_id are ignored."""
+        with self.lock:
+            if trade_id <= self.last_trade_id:
+                return
+            self._roll_if_needed(ts)
+            state = self.symbols.get(symbol)
+            if state is None:
+                state = self.symbols[symbol] = SymbolState(open_mark=price)
+            signed = -qty if side == "sell" else qty
+            state.qty += signed
+            if ts >= self.session_start:
+                state.day_cash -= signed * price
+            else:
+                # fill from a previous session: part of the opening position
+                state.open_qty += signed
+                state.open_mark = price
+            state.last_price = price
+            self.last_trade_id = trade_id
+
+    def _roll_if_needed(self, now: float) -> None:
+        start = session_start_for(now, self.boundary_sec)
+        if start <= self.session_start:
+            return
+        for state in self.symbols.values():
+            state.open_qty = state.qty
+            state.open_mark = state.last_price
+            state.day_cash = 0.0
+        self.session_start = start
+
+    def positions(self) -> Dict[str, float]:
+        with self.lock:
+            return {symbol: state.qty for symbol, state in self.symbols.items() if state.qty}
+
+    def daily_pnl(
+        self, marks: Optional[Mapping[str, float]] = None, now: Optional[float] = None
+    ) -> float:
+        """Day P&L across symbols, rolling to a new session first when the boundary has passed."""
+        with self.lock:
+            self._roll_if_needed(clock.now() if now is None else now)
+            marks = marks or {}
+            return sum(state.day_pnl(marks.get(symbol)) for symbol, state in self.symbols.items())
+
+    def sync(self) -> int:
+        """Apply trades written since last_trade_id (primary-key range read); return the count."""
+        rows = get_storage().list_fills(self.last_trade_id)
+        for trade_id, symbol, side, qty, price, ts in rows:
+            self.apply_fill(trade_id, symbol, side, qty, price, ts)
+        return len(rows)
+
+    def to_json(self) -> str:
+        with self.lock:
+            return json.dumps(
+                {
+                    symbol: [s.qty, s.day_cash, s.open_qty, s.open_mark, s.last_price]
+                    for symbol, s in self.symbols.items()
+                }
+            )
+
+    def save_snapshot(self) -> None:
+        """Persist the state so a restart only has to replay trades after last_trade_id."""
+        with self.lock:
+            payload = self.to_json()
+            last_trade_id = self.last_trade_id
+            session_start = self.session_start
+        get_storage().save_risk_snapshot(last_trade_id, session_start, int(clock.now()), payload)
+
+    @staticmethod
+    def rebuild(boundary_sec: Optional[int] = None) -> "PositionTracker":
+        """Load the last snapshot, roll the session if needed and replay the trade tail."""
+        if boundary_sec is None:
+            boundary_sec = _session_boundary_sec()
+        tracker = PositionTracker(boundary_sec=boundary_sec)
+        snapshot = get_storage().load_risk_snapshot()
+        if snapshot is not None:
+            tracker.last_trade_id, tracker.session_start, state = snapshot
+            for symbol, values in json.loads(state).items():
+                tracker.symbols[symbol] = SymbolState(*values)
+            tracker._roll_if_needed(clock.now())
+        else:
+            # no snapshot yet: fills before the current session form the opening position
+            tracker.session_start = session_start_for(clock.now(), boundary_sec)
+        tracker.sync()
+        return tracker
+
+
+_tracker: Optional[PositionTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_position_tracker() -> PositionTracker:
+    """Return the process-wide tracker, rebuilt from snapshot + trade tail on first use."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = PositionTracker.rebuild()
+        return _tracker
+
+
+def reset_position_tracker() -> None:
+    """Forget the process-wide tracker (e.g. after switching databases)."""
+    global _tracker
+    with _tracker_lock:
+        _tracker = None
+
+
+def snapshot_positions() -> Tuple[int, int]:
+    """Sync and persist the process-wide tracker; return (trades applied, last_trade_id)."""
+    tracker = get_position_tracker()
+    applied = tracker.sync()
+    tracker.save_snapshot()
+    return applied, tracker.last_trade_id
+
+
+if __name__ == "__main__":
+    init_schema()
+    print(snapshot_positions())
+
+    now = time.time()
+    demo = PositionTracker(now=now)
+    demo.apply_fill(1, "AAPL", "buy", 10, 100.0, now)
+    demo.apply_fill(2, "AAPL", "sell", 5, 102.0, now)
+    print(demo.positions(), demo.daily_pnl(now=now))
+    print(demo.daily_pnl({"AAPL": 104.0}, now=now + 86400))
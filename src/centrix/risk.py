@@ -1,33 +1,29 @@
 from __future__ import annotations
 
+import math
 import sys
-from dataclasses import dataclass
+from array import array
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
 
 if __name__ == "__main__" and __package__ is None:
     sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from centrix.config_service import get_config, set_config
+from centrix.config_service import ConfigSnapshot, get_config_snapshot, set_config
 from centrix.control import set_safe_mode
 from centrix.db import init_schema
+from centrix.market_data import get_market_data
+from centrix.order_model import NewOrder, OrderBatch, OrderLike, RiskLimits
+from centrix.positions import get_position_tracker
 
 
-@dataclass
-class RiskLimits:
-    max_daily_loss: Optional[float]
-    max_order_size: Optional[float]
-
-
-@dataclass
-class DummyOrder:
-    symbol: str
-    side: str
-    quantity: float
+# Orders used for risk checks are plain NewOrder values; the old name stays importable.
+DummyOrder = NewOrder
 
 
-def _parse_optional_float(value: Optional[str]) -> Optional[float]:
-    """Convert a string to float; return None if missing or invalid."""
+def _parse_optional_float(value: object) -> Optional[float]:
+    """Convert a config value to float; return None if missing or invalid."""
     if value is None or value == "":
         return None
     try:
@@ -36,26 +32,275 @@ def _parse_optional_float(value: Optional[str]) -> Optional[float]:
         return None
 
 
-def load_risk_limits() -> RiskLimits:
-    """Load risk limits from config storage."""
-    max_daily_loss = _parse_optional_float(get_config("risk.max_daily_loss"))
-    max_order_size = _parse_optional_float(get_config("risk.max_order_size"))
-    return RiskLimits(max_daily_loss=max_daily_loss, max_order_size=max_order_size)
+def _limits_for(
+    snapshot: ConfigSnapshot,
+    account: Optional[str],
+    strategy: Optional[str],
+    symbol: Optional[str] = None,
+) -> RiskLimits:
+    def value(key: str) -> Optional[float]:
+        return _parse_optional_float(snapshot.resolve(key, account, strategy, symbol))
+
+    return RiskLimits(
+        max_daily_loss=value("risk.max_daily_loss"),
+        max_order_size=value("risk.max_order_size"),
+        max_order_notional=value("risk.max_order_notional"),
+        max_position=value("risk.max_position"),
+        max_symbol_exposure=value("risk.max_symbol_exposure"),
+        reference_price=value("risk.reference_price"),
+    )
+
+
+_limits_cache: Tuple[Optional[ConfigSnapshot], Tuple[str, str], Optional[RiskLimits]] = (
+    None,
+    ("", ""),
+    None,
+)
+
+
+def load_risk_limits(account: Optional[str] = None, strategy: Optional[str] = None) -> RiskLimits:
+    """Load risk limits from the cached config snapshot.
+
+    Values resolve symbol → strategy → account → shard → global; the account defaults to
+    ``engine.account``. Symbols with their own ``risk.*`` settings get an entry in
+    ``symbol_limits``. The result is reused until the snapshot changes.
+    """
+    global _limits_cache
+    snapshot = get_config_snapshot()
+    if account is None:
+        account = snapshot.resolve("engine.account")
+    cache_key = (str(account or ""), strategy or "")
+    cached_snapshot, cached_key, cached_limits = _limits_cache
+    if cached_snapshot is snapshot and cached_key == cache_key and cached_limits is not None:
+        return cached_limits
+    base = _limits_for(snapshot, cache_key[0], strategy)
+    overrides = {
+        symbol: _limits_for(snapshot, cache_key[0], strategy, symbol)
+        for symbol in snapshot.scope_ids("symbol", "risk.")
+    }
+    limits = replace(base, symbol_limits=overrides)
+    _limits_cache = (snapshot, cache_key, limits)
+    return limits
+
+
+_SIDE_SIGN = {"buy": 1, "sell": -1}
 
 
-def check_order_against_limits(order: DummyOrder, limits: RiskLimits) -> Tuple[bool, Optional[str]]:
-    """Return whether the order is allowed and an optional reason when blocked."""
-    if limits.max_order_size is not None and order.quantity > limits.max_order_size:
-        return (
-            False,
-            f"order quantity {order.quantity} exceeds max_order_size {limits.max_order_size}",
+@dataclass
+class OrderColumns:
+    """Columnar view of an order batch: one typed array per field instead of one object per order."""
+
+    symbols: List[str]
+    signs: array  # 'b': +1 buy, -1 sell, 0 invalid side
+    quantities: array  # 'd'
+    prices: array  # 'd', NaN when no reference price is known
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    @staticmethod
+    def from_orders(
+        orders: Sequence[OrderLike], prices: Optional[Mapping[str, float]] = None
+    ) -> "OrderColumns":
+        prices = prices or {}
+        nan = math.nan
+        symbols = [o.symbol for o in orders]
+        return OrderColumns(
+            symbols=symbols,
+            signs=array("b", [_SIDE_SIGN.get(o.side.lower(), 0) for o in orders]),
+            quantities=array("d", [o.quantity for o in orders]),
+            prices=array("d", [prices.get(symbol, nan) for symbol in symbols]),
+        )
+
+    @staticmethod
+    def from_batch(
+        batch: OrderBatch, prices: Optional[Mapping[str, float]] = None
+    ) -> "OrderColumns":
+        """Build risk columns from an OrderBatch without materializing per-order objects."""
+        prices = prices or {}
+        nan = math.nan
+        return OrderColumns(
+            symbols=batch.symbols,
+            signs=array("b", [_SIDE_SIGN.get(side.lower(), 0) for side in batch.sides]),
+            quantities=batch.quantities,
+            prices=array("d", [prices.get(symbol, nan) for symbol in batch.symbols]),
         )
 
-    # max_daily_loss placeholder for future implementation
-    return True, None
+
+@dataclass
+class RiskContext:
+    """Account state the batch checks run against: net positions, day P&L, reference prices."""
+
+    positions: Dict[str, float] = field(default_factory=dict)
+    daily_pnl: Optional[float] = None
+    prices: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class RiskDecision:
+    allowed: List[bool]
+    reasons: List[Optional[str]]
+    notional: array
+
+    def blocked(self) -> List[int]:
+        """Indices of denied orders."""
+        return [i for i, ok in enumerate(self.allowed) if not ok]
+
+
+def load_risk_context(prices: Optional[Mapping[str, float]] = None) -> RiskContext:
+    """Sync the position tracker with new trades (PK range read) and return its state."""
+    tracker = get_position_tracker()
+    tracker.sync()
+    return tracker_context(prices)
+
+
+def tracker_context(prices: Optional[Mapping[str, float]] = None) -> RiskContext:
+    """Return positions and day P&L from the in-memory tracker without touching the DB.
+
+    Without explicit prices, the latest market-data marks price notional and day P&L.
+    """
+    tracker = get_position_tracker()
+    marks = dict(prices) if prices is not None else get_market_data().mark_prices()
+    return RiskContext(
+        positions=tracker.positions(), daily_pnl=tracker.daily_pnl(marks), prices=marks
+    )
+
+
+def _exceeding(
+    values: Sequence[float],
+    attr: str,
+    limits: RiskLimits,
+    row_limits: Optional[List[RiskLimits]],
+) -> List[Tuple[int, float]]:
+    """(index, limit) of the orders whose value is above their limit; NaN never is."""
+    if row_limits is None:
+        limit = getattr(limits, attr)
+        if limit is None:
+            return []
+        return [(i, limit) for i, value in enumerate(values) if value > limit]
+    hits: List[Tuple[int, float]] = []
+    for i, value in enumerate(values):
+        limit = getattr(row_limits[i], attr)
+        if limit is not None and value > limit:
+            hits.append((i, limit))
+    return hits
+
+
+def evaluate_order_batch(
+    columns: OrderColumns, limits: RiskLimits, context: Optional[RiskContext] = None
+) -> RiskDecision:
+    """Evaluate a whole batch in column passes; later orders see exposure added by earlier ones.
+
+    Orders without a market price use ``risk.reference_price``; without either, an order that
+    a notional or exposure limit applies to is blocked rather than passed unpriced.
+    """
+    n = len(columns)
+    quantities = columns.quantities
+    prices = columns.prices
+    signs = columns.signs
+    symbols = columns.symbols
+    allowed = [True] * n
+    reasons: List[Optional[str]] = [None] * n
+
+    for i in [i for i in range(n) if signs[i] == 0]:
+        allowed[i] = False
+        reasons[i] = f"invalid side for order {i}"
+
+    overrides = limits.symbol_limits
+    # one dict probe per order; symbols without overrides share the base limits
+    row_limits = [overrides.get(symbol, limits) for symbol in symbols] if overrides else None
+
+    for i, limit in _exceeding(quantities, "max_order_size", limits, row_limits):
+        if allowed[i]:
+            allowed[i] = False
+            reasons[i] = f"order quantity {quantities[i]} exceeds max_order_size {limit}"
+
+    unpriced = [i for i in range(n) if math.isnan(prices[i])]
+    if unpriced:
+        prices = array("d", prices)
+        for i in unpriced:
+            reference = (row_limits[i] if row_limits is not None else limits).reference_price
+            if reference is not None:
+                prices[i] = reference
+    notional = array("d", [q * p for q, p in zip(quantities, prices)])
+
+    for i in unpriced:
+        order_limits = row_limits[i] if row_limits is not None else limits
+        if allowed[i] and math.isnan(prices[i]) and order_limits.max_order_notional is not None:
+            allowed[i] = False
+            reasons[i] = f"no reference price for {symbols[i]} to check max_order_notional"
+
+    for i, limit in _exceeding(notional, "max_order_notional", limits, row_limits):
+        if allowed[i]:
+            allowed[i] = False
+            reasons[i] = f"order notional {notional[i]:.2f} exceeds max_order_notional {limit}"
+
+    context = context if context is not None else RiskContext()
+    loss_hit = (
+        limits.max_daily_loss is not None
+        and context.daily_pnl is not None
+        and context.daily_pnl <= -limits.max_daily_loss
+    )
+    position_limited = any(
+        lim.max_position is not None or lim.max_symbol_exposure is not None
+        for lim in (limits, *overrides.values())
+    )
+    if not (loss_hit or position_limited):
+        return RiskDecision(allowed=allowed, reasons=reasons, notional=notional)
+
+    positions = dict(context.positions)
+    for i in range(n):
+        if not allowed[i]:
+            continue
+        symbol = symbols[i]
+        current = positions.get(symbol, 0.0)
+        new = current + signs[i] * quantities[i]
+        reducing = abs(new) < abs(current)
+        if not reducing:
+            symbol_limits = row_limits[i] if row_limits is not None else limits
+            max_position = symbol_limits.max_position
+            max_exposure = symbol_limits.max_symbol_exposure
+            if loss_hit:
+                allowed[i] = False
+                reasons[i] = (
+                    f"daily P&L {context.daily_pnl:.2f} breaches max_daily_loss {limits.max_daily_loss}"
+                )
+                continue
+            if max_position is not None and abs(new) > max_position:
+                allowed[i] = False
+                reasons[i] = f"position {new} in {symbol} exceeds max_position {max_position}"
+                continue
+            if max_exposure is not None and math.isnan(prices[i]):
+                allowed[i] = False
+                reasons[i] = f"no reference price for {symbol} to check max_symbol_exposure"
+                continue
+            if max_exposure is not None and abs(new) * prices[i] > max_exposure:
+                allowed[i] = False
+                reasons[i] = (
+                    f"exposure {abs(new) * prices[i]:.2f} in {symbol} exceeds "
+                    f"max_symbol_exposure {max_exposure}"
+                )
+                continue
+        positions[symbol] = new
+
+    return RiskDecision(allowed=allowed, reasons=reasons, notional=notional)
+
+
+def check_order_against_limits(
+    order: OrderLike, limits: RiskLimits, context: Optional[RiskContext] = None
+) -> Tuple[bool, Optional[str]]:
+    """Return whether the order is allowed and an optional reason when blocked.
+
+    Without an explicit context, positions and day P&L come from the in-memory tracker.
+    """
+    if context is None:
+        context = tracker_context()
+    prices = context.prices
+    decision = evaluate_order_batch(OrderColumns.from_orders([order], prices), limits, context)
+    return decision.allowed[0], decision.reasons[0]
 
 
-def evaluate_order(order: DummyOrder) -> bool:
+def evaluate_order(order: OrderLike) -> bool:
     """Evaluate an order against current limits; enable safe_mode if blocked."""
     limits = load_risk_limits()
     allowed, reason = check_order_against_limits(order, limits)
@@ -76,8 +321,8 @@ if __name__ == "__main__":
     init_schema()
     set_config("risk.max_order_size", "1000", value_type="float")
 
-    small_order = DummyOrder(symbol="AAPL", side="buy", quantity=100)
-    large_order = DummyOrder(symbol="AAPL", side="buy", quantity=1500)
+    small_order = NewOrder(symbol="AAPL", side="buy", quantity=100)
+    large_order = NewOrder(symbol="AAPL", side="buy", quantity=1500)
 
     evaluate_order(small_order)
     evaluate_order(large_order)
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix.metrics import timed
+from centrix.wakeup import WakeupChannel, add_wakeup_listener, remove_wakeup_listener
+
+TaskCallback = Callable[[], Union[None, Awaitable[None]]]
+
+
+@dataclass
+class TimerHandle:
+    deadline: float
+    item: Any
+    cancelled: bool = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class TimerWheel:
+    """Hashed timing wheel: O(1) schedule/cancel, expiry checks touch only elapsed slots."""
+
+    def __init__(self, tick_sec: float = 0.01, slots: int = 512, now: Optional[float] = None) -> None:
+        self.tick_sec = tick_sec
+        self.slots: List[List[TimerHandle]] = [[] for _ in range(slots)]
+        self.current_tick = self._tick_of(time.monotonic() if now is None else now)
+        self.size = 0
+
+    def _tick_of(self, ts: float) -> int:
+        return int(ts / self.tick_sec)
+
+    def schedule(self, deadline: float, item: Any) -> TimerHandle:
+        """Schedule ``item`` to expire at the monotonic ``deadline``."""
+        handle = TimerHandle(deadline=deadline, item=item)
+        tick = max(self._tick_of(deadline), self.current_tick)
+        self.slots[tick % len(self.slots)].append(handle)
+        self.size += 1
+        return handle
+
+    def pop_due(self, now: float) -> List[Any]:
+        """Advance the wheel to ``now`` and return the items of all expired timers."""
+        due: List[Any] = []
+        now_tick = self._tick_of(now)
+        if now_tick < self.current_tick:
+            return due
+        span = min(now_tick - self.current_tick + 1, len(self.slots))
+        for offset in range(span):
+            slot_index = (self.current_tick + offset) % len(self.slots)
+            slot = self.slots[slot_index]
+            if not slot:
+                continue
+            remaining: List[TimerHandle] = []
+            for handle in slot:
+                if handle.cancelled:
+                    self.size -= 1
+                elif handle.deadline <= now:
+                    self.size -= 1
+                    due.append(handle.item)
+                else:
+                    remaining.append(handle)
+            self.slots[slot_index] = remaining
+        self.current_tick = now_tick
+        return due
+
+    def next_deadline(self) -> Optional[float]:
+        """Return the earliest pending deadline, or None when the wheel is empty."""
+        if self.size == 0:
+            return None
+        earliest: Optional[float] = None
+        for offset in range(len(self.slots)):
+            slot = self.slots[(self.current_tick + offset) % len(self.slots)]
+            for handle in slot:
+                if handle.cancelled:
+                    continue
+                if earliest is None or handle.deadline < earliest:
+                    earliest = handle.deadline
+            # deadlines within one revolution live in order of slot; stop at the first hit
+            if earliest is not None and earliest < (self.current_tick + offset + 1) * self.tick_sec:
+                return earliest
+        return earliest
+
+
+@dataclass
+class PeriodicTask:
+    name: str
+    interval_sec: float
+    callback: TaskCallback
+    handle: Optional[TimerHandle] = field(default=None, repr=False)
+    runs: int = 0
+
+
+class EngineScheduler:
+    """Asyncio scheduler running periodic tasks from a timer wheel, woken early by notifications."""
+
+    def __init__(self, channel_name: str = "engine", tick_sec: float = 0.01) -> None:
+        self.wheel = TimerWheel(tick_sec=tick_sec)
+        self.tasks: Dict[str, PeriodicTask] = {}
+        self.channel = WakeupChannel(channel_name)
+        self._wake_handlers: List[Callable[[List[str]], Union[None, Awaitable[None]]]] = []
+        self._pending_reasons: List[str] = []
+        self._wake_event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped = False
+
+    def add_periodic(
+        self, name: str, interval_sec: float, callback: TaskCallback, run_immediately: bool = True
+    ) -> None:
+        """Register a task that runs every ``interval_sec`` seconds."""
+        task = PeriodicTask(name=name, interval_sec=interval_sec, callback=callback)
+        self.tasks[name] = task
+        delay = 0.0 if run_immediately else interval_sec
+        task.handle = self.wheel.schedule(time.monotonic() + delay, task)
+
+    def remove(self, name: str) -> None:
+        """Unregister a task; unknown names are ignored."""
+        task = self.tasks.pop(name, None)
+        if task is not None and task.handle is not None:
+            task.handle.cancel()
+
+    def set_interval(self, name: str, interval_sec: float) -> None:
+        """Change a task's interval; the next run is rescheduled from now."""
+        task = self.tasks[name]
+        if task.interval_sec == interval_sec:
+            return
+        task.interval_sec = interval_sec
+        self._reschedule(task, interval_sec)
+
+    def trigger(self, name: str) -> None:
+        """Run the named task on the next scheduler pass."""
+        task = self.tasks.get(name)
+        if task is not None:
+            self._reschedule(task, 0.0)
+            self._set_event()
+
+    def on_wakeup(self, handler: Callable[[List[str]], Union[None, Awaitable[None]]]) -> None:
+        """Register a handler called with the notification reasons after every wake-up."""
+        self._wake_handlers.append(handler)
+
+    def wake(self, reason: str) -> None:
+        """Wake the scheduler from any thread."""
+        self._pending_reasons.append(reason)
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._set_event)
+
+    def stop(self) -> None:
+        """Stop the scheduler after the current pass."""
+        self._stopped = True
+        self._set_event()
+
+    def _set_event(self) -> None:
+        if self._wake_event is not None:
+            self._wake_event.set()
+
+    def _reschedule(self, task: PeriodicTask, delay: float) -> None:
+        if task.handle is not None:
+            task.handle.cancel()
+        task.handle = self.wheel.schedule(time.monotonic() + delay, task)
+
+    def _on_channel_readable(self) -> None:
+        self._pending_reasons.extend(self.channel.drain())
+        self._set_event()
+
+    async def _call(self, callback: Callable[..., Any], *args: Any) -> None:
+        try:
+            result = callback(*args)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as exc:  # one failing task must not stop heartbeats
+            print(f"[scheduler] task failed: {exc}")
+
+    async def run(self, deadline: Optional[float] = None) -> None:
+        """Run until ``stop()`` is called or the monotonic ``deadline`` passes."""
+        self._loop = asyncio.get_running_loop()
+        self._wake_event = asyncio.Event()
+        self._stopped = False
+
+        reader_added = False
+        if self.channel.open():
+            try:
+                self._loop.add_reader(self.channel.fileno(), self._on_channel_readable)
+                reader_added = True
+            except (NotImplementedError, RuntimeError):
+                pass
+        add_wakeup_listener(self.wake)
+
+        try:
+            while not self._stopped:
+                now = time.monotonic()
+                due = self.wheel.pop_due(now)
+                if due:
+                    with timed("engine.tick"):
+                        for task in due:
+                            if task.handle is not None and task.handle.cancelled:
+                                continue
+                            task.handle = self.wheel.schedule(now + task.interval_sec, task)
+                            task.runs += 1
+                            with timed(f"engine.task.{task.name}"):
+                                await self._call(task.callback)
+                            if self._stopped:
+                                break
+                if self._stopped:
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+
+                next_deadline = self.wheel.next_deadline()
+                candidates = [d for d in (next_deadline, deadline) if d is not None]
+                timeout = max(0.0, min(candidates) - time.monotonic()) if candidates else None
+                try:
+                    await asyncio.wait_for(self._wake_event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake_event.clear()
+
+                if self._pending_reasons:
+                    reasons, self._pending_reasons = self._pending_reasons, []
+                    for handler in self._wake_handlers:
+                        await self._call(handler, reasons)
+        finally:
+            remove_wakeup_listener(self.wake)
+            if reader_added:
+                self._loop.remove_reader(self.channel.fileno())
+            self.channel.close()
+            self._loop = None
+
+
+if __name__ == "__main__":
+    async def _demo() -> None:
+        scheduler = EngineScheduler(channel_name="scheduler-selftest")
+        scheduler.add_periodic("tick", 0.1, lambda: print(f"tick {time.monotonic():.3f}"))
+        scheduler.on_wakeup(lambda reasons: print(f"woken: {reasons}"))
+        asyncio.get_running_loop().call_later(0.25, scheduler.wake, "demo")
+        await scheduler.run(deadline=time.monotonic() + 0.5)
+
+    asyncio.run(_demo())
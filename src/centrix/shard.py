@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+SHARD_ENV = "CENTRIX_SHARD"
+GLOBAL_SCOPE = "global"
+
+
+def get_shard_id() -> Optional[str]:
+    """Return the shard this process runs as (``CENTRIX_SHARD``), or None when unsharded."""
+    shard_id = os.getenv(SHARD_ENV, "").strip()
+    return shard_id or None
+
+
+def shard_scope(shard_id: Optional[str] = None) -> str:
+    """Config/flag scope of a shard (``shard:<id>``); the current shard when omitted."""
+    if shard_id is None:
+        shard_id = get_shard_id()
+    return f"shard:{shard_id}" if shard_id else GLOBAL_SCOPE
+
+
+def shard_source(base: str, shard_id: Optional[str] = None) -> str:
+    """Heartbeat source / channel name of a shard, e.g. ``engine:acct1``."""
+    if shard_id is None:
+        shard_id = get_shard_id()
+    return f"{base}:{shard_id}" if shard_id else base
+
+
+def validate_shard_id(shard_id: str) -> str:
+    """Shard ids end up in flag keys, file names and env vars; keep them simple."""
+    if not shard_id or not all(ch.isalnum() or ch in "-_" for ch in shard_id):
+        raise ValueError(f"Invalid shard id: {shard_id!r}")
+    return shard_id
@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import astuple, replace
+from functools import partial
+from pathlib import Path
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix.db import (
+    RESERVED_ID_FLAG,
+    ConfigRow,
+    Fill,
+    FillRow,
+    HeartbeatEntry,
+    StatusUpdate,
+    Storage,
+    get_storage,
+)
+from centrix.order_model import NewOrder, OrderBatch, OrderRecord, TradeRecord
+from centrix.order_state import EXECUTING, OPEN_STATUSES, PROPOSED, validate_transition
+
+
+class MemoryStorage(Storage):
+    """Process-local storage for tests, backtests and demos; same semantics as SQLite."""
+
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.config: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self.flags: Dict[str, str] = {}
+        self.flags_seq = 0
+        self.heartbeats: List[HeartbeatEntry] = []
+        self.latest: Dict[str, HeartbeatEntry] = {}
+        # (source, minute_ts, status) -> [count, first_ts, last_ts]
+        self.heartbeat_minutes: Dict[Tuple[str, int, str], List[int]] = {}
+        self.orders: Dict[int, OrderRecord] = {}
+        self.client_order_ids: Dict[str, int] = {}
+        self.events: Dict[int, List[Dict[str, object]]] = {}
+        self.trades: List[TradeRecord] = []
+        self.risk_snapshot: Optional[Tuple[int, int, str]] = None
+
+    def get_config(self, key: str, scope: str = "global") -> Optional[str]:
+        entry = self.config.get((key, scope))
+        return entry[0] if entry is not None else None
+
+    def set_config(
+        self,
+        key: str,
+        value: str,
+        scope: str = "global",
+        value_type: str = "str",
+        updated_by: str = "system",
+        bump_version: bool = False,
+    ) -> Optional[int]:
+        with self.lock:
+            self.config[(key, scope)] = (value, value_type)
+            return self.bump_config_version() if bump_version else None
+
+    def _config_version(self) -> int:
+        try:
+            return int(self.flags.get("config_version", "0"))
+        except ValueError:
+            return 0
+
+    def bump_config_version(self) -> int:
+        with self.lock:
+            version = self._config_version() + 1
+            self.set_flag("config_version", str(version))
+            return version
+
+    def load_config(self) -> Tuple[int, List[ConfigRow]]:
+        with self.lock:
+            rows = [(key, scope, value, vt) for (key, scope), (value, vt) in self.config.items()]
+            return self._config_version(), rows
+
+    def get_flags(self) -> Dict[str, str]:
+        with self.lock:
+            return dict(self.flags)
+
+    def set_flag(self, key: str, value: str) -> None:
+        with self.lock:
+            self.flags[key] = value
+            self.flags_seq += 1
+
+    def add_flag(self, key: str, value: str) -> bool:
+        with self.lock:
+            if key in self.flags:
+                return False
+            self.set_flag(key, value)
+            return True
+
+    def flags_version(self) -> Hashable:
+        return self.flags_seq
+
+    def write_heartbeats(self, entries: Sequence[HeartbeatEntry]) -> None:
+        with self.lock:
+            self.heartbeats.extend(entries)
+            # like the SQLite upsert: the last entry per source wins unless it is older
+            last = {entry[0]: entry for entry in entries}
+            for source, entry in last.items():
+                previous = self.latest.get(source)
+                if previous is None or entry[2] >= previous[2]:
+                    self.latest[source] = entry
+
+    def get_latest_heartbeat(self, source: str) -> Optional[Dict[str, int | str]]:
+        entry = self.latest.get(source)
+        if entry is None:
+            return None
+        return {"source": entry[0], "status": entry[1], "ts": entry[2]}
+
+    def compact_heartbeats(self, cutoff: int, aggregate_cutoff: int) -> int:
+        with self.lock:
+            kept: List[HeartbeatEntry] = []
+            for source, status, ts in self.heartbeats:
+                if ts >= cutoff:
+                    kept.append((source, status, ts))
+                    continue
+                minute = self.heartbeat_minutes.get((source, ts // 60 * 60, status))
+                if minute is None:
+                    self.heartbeat_minutes[(source, ts // 60 * 60, status)] = [1, ts, ts]
+                else:
+                    minute[0] += 1
+                    minute[1] = min(minute[1], ts)
+                    minute[2] = max(minute[2], ts)
+            removed = len(self.heartbeats) - len(kept)
+            self.heartbeats = kept
+            self.heartbeat_minutes = {
+                key: value
+                for key, value in self.heartbeat_minutes.items()
+                if key[1] >= aggregate_cutoff
+            }
+            return removed
+
+    def _add_event(
+        self, order_id: int, old: Optional[str], new: str, ts: int, error: Optional[str]
+    ) -> None:
+        self.events.setdefault(order_id, []).append(
+            {"from_status": old, "to_status": new, "ts": ts, "error_message": error}
+        )
+
+    def insert_orders(
+        self, orders: Sequence[NewOrder], ts: int, known: Optional[Mapping[str, int]] = None
+    ) -> Tuple[List[int], int]:
+        with self.lock:
+            assigned: Dict[str, int] = dict(known or {})
+            reserved = int(self.flags.get(RESERVED_ID_FLAG, "0"))
+            next_id = max(max(self.orders, default=0), reserved) + 1
+            ids: List[int] = []
+            inserted = 0
+            for order in orders:
+                key = order.client_order_id
+                if key is not None:
+                    existing = assigned.get(key, self.client_order_ids.get(key))
+                    if existing is not None:
+                        ids.append(existing)
+                        continue
+                    assigned[key] = self.client_order_ids[key] = next_id
+                self.orders[next_id] = OrderRecord(
+                    next_id, order.symbol, order.side, order.quantity, PROPOSED, None, ts, ts
+                )
+                self._add_event(next_id, None, PROPOSED, ts, None)
+                ids.append(next_id)
+                next_id += 1
+                inserted += 1
+            return ids, inserted
+
+    def find_client_order_ids(self, client_order_ids: Sequence[str]) -> Dict[str, int]:
+        with self.lock:
+            return {
+                key: self.client_order_ids[key]
+                for key in client_order_ids
+                if key in self.client_order_ids
+            }
+
+    def get_orders(self, order_ids: Sequence[int]) -> Dict[int, OrderRecord]:
+        orders = self.orders
+        return {i: orders[i] for i in order_ids if i in orders}
+
+    def get_order_by_client_id(self, client_order_id: str) -> Optional[OrderRecord]:
+        order_id = self.client_order_ids.get(client_order_id)
+        return None if order_id is None else self.orders.get(order_id)
+
+    def list_orders_by_status(
+        self, status: str, limit: int = 500, symbols: Optional[Sequence[str]] = None
+    ) -> List[OrderRecord]:
+        wanted = set(symbols) if symbols else None
+        with self.lock:
+            matches = [
+                o
+                for o in self.orders.values()
+                if o.status == status and (wanted is None or o.symbol in wanted)
+            ]
+        return sorted(matches, key=lambda o: o.id)[:limit]
+
+    def list_open_orders(self, limit: int = 10000) -> List[OrderRecord]:
+        with self.lock:
+            matches = [o for o in self.orders.values() if o.status in OPEN_STATUSES]
+        return sorted(matches, key=lambda o: (o.status, o.updated_at))[:limit]
+
+    def load_order_batch(
+        self, status: Optional[str] = None, since_id: int = 0, limit: Optional[int] = None
+    ) -> OrderBatch:
+        with self.lock:
+            matches = [
+                o
+                for order_id, o in sorted(self.orders.items())
+                if order_id > since_id and (status is None or o.status == status)
+            ]
+        batch = OrderBatch()
+        batch.extend_rows([astuple(o) for o in matches[:limit]])
+        return batch
+
+    def get_order_events(self, order_id: int) -> List[Dict[str, object]]:
+        with self.lock:
+            return [dict(event) for event in self.events.get(order_id, ())]
+
+    def update_order_statuses(
+        self, updates: Sequence[StatusUpdate], ts: int, skip_invalid: bool = False
+    ) -> None:
+        with self.lock:
+            staged = dict(self.orders)
+            events: List[Tuple[int, str, str, Optional[str]]] = []
+            for order_id, status, error_message in updates:
+                order = staged.get(order_id)
+                if order is None:
+                    continue
+                try:
+                    validate_transition(order.status, status)
+                except ValueError as exc:
+                    if not skip_invalid:
+                        raise
+                    print(f"[storage] skipping transition of order {order_id}: {exc}")
+                    continue
+                staged[order_id] = replace(
+                    order, status=status, error_message=error_message, updated_at=ts
+                )
+                events.append((order_id, order.status, status, error_message))
+            self.orders = staged
+            for order_id, old, new, error_message in events:
+                self._add_event(order_id, old, new, ts, error_message)
+
+    def claim_orders(self, order_ids: Sequence[int], ts: int) -> List[int]:
+        with self.lock:
+            claimed: List[int] = []
+            for order_id in dict.fromkeys(order_ids):
+                order = self.orders.get(order_id)
+                if order is None or order.status != PROPOSED:
+                    continue
+                self.orders[order_id] = replace(
+                    order, status=EXECUTING, error_message=None, updated_at=ts
+                )
+                self._add_event(order_id, PROPOSED, EXECUTING, ts, None)
+                claimed.append(order_id)
+            return claimed
+
+    def insert_trades(self, fills: Sequence[Fill], ts: int) -> List[int]:
+        with self.lock:
+            first_id = (self.trades[-1].id if self.trades else 0) + 1
+            ids = list(range(first_id, first_id + len(fills)))
+            for trade_id, (order_id, price, qty) in zip(ids, fills):
+                self.trades.append(TradeRecord(trade_id, order_id, price, qty, ts))
+            return ids
+
+    def list_trades(self, since_id: int = 0, limit: int = 10000) -> List[TradeRecord]:
+        with self.lock:
+            return [t for t in self.trades if t.id > since_id][:limit]
+
+    def list_fills(self, since_id: int = 0) -> List[FillRow]:
+        with self.lock:
+            fills: List[FillRow] = []
+            for trade in self.trades:
+                order = self.orders.get(trade.order_id)
+                if trade.id <= since_id or order is None:
+                    continue
+                qty, price = float(trade.fill_qty or 0.0), float(trade.fill_price or 0.0)
+                fills.append((trade.id, order.symbol, order.side, qty, price, trade.ts))
+            return fills
+
+    def fill_summary(self, order_ids: Sequence[int]) -> Dict[int, Tuple[float, float]]:
+        wanted = set(order_ids)
+        totals: Dict[int, List[float]] = {}
+        with self.lock:
+            for trade in self.trades:
+                if trade.order_id in wanted and trade.fill_qty is not None:
+                    total = totals.setdefault(trade.order_id, [0.0, 0.0])
+                    total[0] += trade.fill_qty
+                    total[1] += trade.fill_qty * (trade.fill_price or 0.0)
+        return {order_id: (qty, value / qty) for order_id, (qty, value) in totals.items() if qty}
+
+    def load_risk_snapshot(self) -> Optional[Tuple[int, int, str]]:
+        return self.risk_snapshot
+
+    def save_risk_snapshot(
+        self, last_trade_id: int, session_start: int, ts: int, state: str
+    ) -> None:
+        self.risk_snapshot = (last_trade_id, session_start, state)
+
+
+# Storage methods that write; AsyncStorage runs them on its single writer thread.
+_WRITES = frozenset(
+    {
+        "set_config",
+        "bump_config_version",
+        "set_flag",
+        "add_flag",
+        "write_heartbeats",
+        "compact_heartbeats",
+        "insert_orders",
+        "update_order_statuses",
+        "claim_orders",
+        "insert_trades",
+        "save_risk_snapshot",
+    }
+)
+
+
+class AsyncStorage:
+    """Asyncio facade over a Storage: every Storage method, awaitable.
+
+    Reads run on a pool of ``pool_size`` threads, each with its own pooled connection, so
+    they proceed in parallel under WAL. Writes go to one writer thread: SQLite admits a
+    single writer anyway, and queuing them here keeps the read threads from blocking on
+    its lock (``busy_timeout``).
+
+    Going past the one-writer limit needs a server backend, not a wider pool. The path is
+    a ``PostgresStorage(Storage)`` in ``centrix.db`` over a psycopg ``ConnectionPool``
+    (``AsyncConnectionPool`` to drop this facade), selected by ``CENTRIX_STORAGE=postgres``
+    in ``get_storage``: migrations get identity ids and ``ON CONFLICT`` in place of
+    ``INSERT OR REPLACE``; ``BEGIN IMMEDIATE`` becomes ``SELECT ... FOR UPDATE`` on the
+    rows read, plus a sequence for order ids; ``flags_version`` reads a counter that
+    ``set_flag`` increments in the same transaction (or a ``LISTEN`` channel). The
+    order journal and the hot query plans stay SQLite-only. ``tests/test_storage.py``
+    is the contract the new backend has to pass.
+    """
+
+    def __init__(self, backend: Optional[Storage] = None, pool_size: int = 4) -> None:
+        self.backend = backend if backend is not None else get_storage()
+        self.readers = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="storage")
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-writer")
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable[Any]]:
+        if name not in Storage.__abstractmethods__:
+            raise AttributeError(name)
+        fn = getattr(self.backend, name)
+        pool = self.writer if name in _WRITES else self.readers
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, partial(fn, *args, **kwargs))
+
+        return call
+
+    def close(self) -> None:
+        self.writer.shutdown(wait=True)
+        self.readers.shutdown(wait=True)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import importlib
+import sys
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Type
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix.market_data import Bar
+from centrix.order_model import NewOrder
+
+
+class Strategy:
+    """Base class for strategies: event hooks return order intents as NewOrder values."""
+
+    name = "strategy"
+
+    def __init__(self, **params: float) -> None:
+        self.params = params
+        self.positions: Dict[str, float] = {}
+
+    def on_tick(
+        self, symbol: str, ts: float, bid: float, ask: float, last: float
+    ) -> List[NewOrder]:
+        return []
+
+    def on_bar(self, bar: Bar) -> List[NewOrder]:
+        return []
+
+    def on_fill(self, order_id: int, symbol: str, side: str, qty: float, price: float) -> None:
+        """Track the strategy's own net position; override to add bookkeeping."""
+        signed = -qty if side == "sell" else qty
+        self.positions[symbol] = self.positions.get(symbol, 0.0) + signed
+
+    def on_reject(self, order_id: int, symbol: str, reason: str) -> None:
+        """An intent was blocked by risk or failed at the gateway."""
+
+
+class MovingAverageCross(Strategy):
+    """Long ``quantity`` while the fast SMA of closes is above the slow one, flat otherwise."""
+
+    name = "ma_cross"
+
+    def __init__(self, fast: float = 10, slow: float = 30, quantity: float = 10) -> None:
+        super().__init__(fast=fast, slow=slow, quantity=quantity)
+        self.fast = int(fast)
+        self.slow = int(slow)
+        if self.fast <= 0 or self.slow <= self.fast:
+            raise ValueError(f"need 0 < fast < slow, got fast={fast} slow={slow}")
+        self.quantity = quantity
+        self.closes: Dict[str, Deque[float]] = {}
+        # running sums keep each bar O(1) regardless of the window lengths
+        self.sums: Dict[str, List[float]] = {}
+        self.pending: Dict[str, bool] = {}
+
+    def on_bar(self, bar: Bar) -> List[NewOrder]:
+        closes = self.closes.get(bar.symbol)
+        if closes is None:
+            closes = self.closes[bar.symbol] = deque(maxlen=self.slow)
+            self.sums[bar.symbol] = [0.0, 0.0]
+        sums = self.sums[bar.symbol]
+        if len(closes) == self.slow:
+            sums[1] -= closes[0]
+        if len(closes) >= self.fast:
+            sums[0] -= closes[-self.fast]
+        closes.append(bar.close)
+        sums[0] += bar.close
+        sums[1] += bar.close
+        if len(closes) < self.slow or self.pending.get(bar.symbol):
+            return []
+
+        want_long = sums[0] / self.fast > sums[1] / self.slow
+        position = self.positions.get(bar.symbol, 0.0)
+        target = self.quantity if want_long else 0.0
+        delta = target - position
+        if abs(delta) < 1e-9:
+            return []
+        self.pending[bar.symbol] = True
+        side = "buy" if delta > 0 else "sell"
+        return [NewOrder(bar.symbol, side, abs(delta))]
+
+    def on_fill(self, order_id: int, symbol: str, side: str, qty: float, price: float) -> None:
+        super().on_fill(order_id, symbol, side, qty, price)
+        self.pending[symbol] = False
+
+    def on_reject(self, order_id: int, symbol: str, reason: str) -> None:
+        self.pending[symbol] = False
+
+
+STRATEGIES = {cls.name: cls for cls in (MovingAverageCross,)}
+
+
+def load_strategy_class(name: str) -> Type[Strategy]:
+    """Resolve a registered name or a ``package.module:Class`` plugin path."""
+    if ":" in name:
+        module_name, _, class_name = name.partition(":")
+        try:
+            cls = getattr(importlib.import_module(module_name), class_name)
+        except (ImportError, AttributeError) as exc:
+            raise ValueError(f"Cannot load strategy {name}: {exc}") from exc
+        if not (isinstance(cls, type) and issubclass(cls, Strategy)):
+            raise ValueError(f"{name} is not a Strategy subclass")
+        return cls
+    cls = STRATEGIES.get(name)
+    if cls is None:
+        raise ValueError(f"Unknown strategy: {name}")
+    return cls
+
+
+def create_strategy(name: str, params: Optional[Dict[str, float]] = None) -> Strategy:
+    """Instantiate a strategy by registered name or plugin path; raises ValueError if unknown."""
+    return load_strategy_class(name)(**(params or {}))
@@ -0,0 +1,496 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import multiprocessing
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix.config_service import get_config_snapshot
+from centrix.market_data import Bar, MarketDataStore, get_market_data
+from centrix.metrics import get_registry, incr, set_gauge
+from centrix.order_model import NewOrder
+from centrix.order_service import (
+    create_order_proposals,
+    execute_orders,
+    get_fill_summary,
+    get_orders,
+)
+from centrix.shard import shard_scope
+from centrix.strategy import Strategy, create_strategy
+
+ASYNC_MODE = "async"
+PROCESS_MODE = "process"
+MODES = (ASYNC_MODE, PROCESS_MODE)
+
+# strategy instance living in a process-mode worker's child process
+_child_strategy: Optional[Strategy] = None
+
+
+def _init_child(spec: str, params: Dict[str, float]) -> None:
+    global _child_strategy
+    _child_strategy = create_strategy(spec, params)
+
+
+def _call_in_child(kind: str, args: Tuple[Any, ...]) -> List[NewOrder]:
+    """Run one hook on the child's strategy; only on_tick/on_bar produce intents."""
+    result = getattr(_child_strategy, "on_" + kind)(*args)
+    return list(result or []) if kind in ("tick", "bar") else []
+
+
+def parse_params(text: Optional[str]) -> Dict[str, float]:
+    """Parse ``"fast=5,slow=20"`` into keyword parameters; raises ValueError on bad input."""
+    params: Dict[str, float] = {}
+    for item in (text or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        key, sep, value = item.partition("=")
+        if not sep or not key.strip():
+            raise ValueError(f"Invalid strategy parameter: {item!r}")
+        params[key.strip()] = float(value)
+    return params
+
+
+class StrategyWorker:
+    """Event queue and hook dispatch for one strategy.
+
+    Ticks are conflated per symbol (only the latest is delivered), bars are dropped once
+    ``queue_size`` events are waiting, and fills/rejects are never dropped. In ``process``
+    mode the hooks run in a dedicated child process so CPU-heavy work never holds the loop.
+    """
+
+    def __init__(
+        self,
+        strategy_id: str,
+        spec: str,
+        params: Optional[Dict[str, float]] = None,
+        mode: str = ASYNC_MODE,
+        symbols: Optional[Sequence[str]] = None,
+        queue_size: int = 1000,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown strategy mode for {strategy_id}: {mode}")
+        if queue_size <= 0:
+            raise ValueError("queue_size must be positive")
+        self.strategy_id = strategy_id
+        self.spec = spec
+        self.params = dict(params or {})
+        self.mode = mode
+        self.symbols = set(symbols) if symbols else None
+        self.queue_size = queue_size
+        # validates the spec in this process for both modes
+        self.strategy: Strategy = create_strategy(spec, self.params)
+        self.queue: Deque[Tuple[str, Tuple[Any, ...]]] = deque()
+        self._ticks: Dict[str, Tuple[float, float, float, float]] = {}
+        self._ready: Optional[asyncio.Event] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.events_processed = 0
+        self.dropped = 0
+
+    def wants(self, symbol: str) -> bool:
+        return self.symbols is None or symbol in self.symbols
+
+    def start(self, runtime: "StrategyRuntime") -> None:
+        self._ready = asyncio.Event()
+        if self.mode == PROCESS_MODE:
+            self._pool = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_child,
+                initargs=(self.spec, self.params),
+            )
+        self._task = asyncio.get_running_loop().create_task(
+            self._run(runtime), name=f"strategy-{self.strategy_id}"
+        )
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def offer_tick(self, symbol: str, ts: float, bid: float, ask: float, last: float) -> None:
+        if symbol in self._ticks:
+            incr(f"strategy.{self.strategy_id}.conflated")
+        else:
+            self.queue.append(("tick", (symbol,)))
+        self._ticks[symbol] = (ts, bid, ask, last)
+        self._wake()
+
+    def offer_bar(self, bar: Bar) -> None:
+        if len(self.queue) >= self.queue_size:
+            self.dropped += 1
+            incr(f"strategy.{self.strategy_id}.dropped")
+            return
+        self.queue.append(("bar", (bar,)))
+        self._wake()
+
+    def offer_fill(self, order_id: int, symbol: str, side: str, qty: float, price: float) -> None:
+        self.queue.append(("fill", (order_id, symbol, side, qty, price)))
+        self._wake()
+
+    def offer_reject(self, order_id: int, symbol: str, reason: str) -> None:
+        self.queue.append(("reject", (order_id, symbol, reason)))
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._ready is not None:
+            self._ready.set()
+
+    async def _call(self, kind: str, args: Tuple[Any, ...]) -> List[NewOrder]:
+        if self._pool is not None:
+            loop = asyncio.get_running_loop()
+            if kind == "fill":
+                # keep the parent copy's position in step for inspection
+                self.strategy.on_fill(*args)
+            return await loop.run_in_executor(self._pool, _call_in_child, kind, args)
+        result = getattr(self.strategy, "on_" + kind)(*args)
+        if inspect.isawaitable(result):
+            result = await result
+        return list(result or []) if kind in ("tick", "bar") else []
+
+    async def _run(self, runtime: "StrategyRuntime") -> None:
+        assert self._ready is not None
+        registry = get_registry()
+        depth_gauge = f"strategy.{self.strategy_id}.queue_depth"
+        while True:
+            if not self.queue:
+                set_gauge(depth_gauge, 0)
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            kind, args = self.queue.popleft()
+            if kind == "tick":
+                args = (args[0],) + self._ticks.pop(args[0])
+            started = time.perf_counter_ns()
+            try:
+                intents = await self._call(kind, args)
+                ok = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # one broken strategy must not take the runtime down
+                print(f"[strategy_runtime] {self.strategy_id}.on_{kind} failed: {exc}")
+                intents, ok = [], False
+            elapsed = time.perf_counter_ns() - started
+            registry.observe(f"strategy.{self.strategy_id}.{kind}", elapsed, ok, started)
+            set_gauge(depth_gauge, len(self.queue))
+            self.events_processed += 1
+            if intents:
+                runtime.add_intents(self, intents)
+
+
+class StrategyRuntime:
+    """Dispatches market events to strategy workers and batches their order intents.
+
+    Feed threads call ``on_tick``/``on_bar``; events are handed to the event loop and queued
+    per worker, so a slow strategy only backs up its own queue. Intents from all workers are
+    proposed and submitted together, and fills/rejects are routed back to the owner.
+    """
+
+    def __init__(
+        self,
+        workers: Sequence[StrategyWorker],
+        async_submit: bool = False,
+        order_lock: Optional[asyncio.Lock] = None,
+        store: Optional[MarketDataStore] = None,
+    ) -> None:
+        ids = [worker.strategy_id for worker in workers]
+        if len(set(ids)) != len(ids):
+            raise ValueError(f"Duplicate strategy ids: {ids}")
+        self.workers = list(workers)
+        self.async_submit = async_submit
+        self.order_lock = order_lock
+        self.store = store
+        self.order_owner: Dict[int, Tuple[StrategyWorker, NewOrder]] = {}
+        self._intents: List[Tuple[StrategyWorker, NewOrder]] = []
+        self._pending_ticks: Dict[str, Tuple[float, float, float, float]] = {}
+        self._ticks_scheduled = False
+        self._tick_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._intents_ready: Optional[asyncio.Event] = None
+        self._flush_task: Optional["asyncio.Task[None]"] = None
+        self._router_hooked = False
+
+    @classmethod
+    def from_config(cls, order_lock: Optional[asyncio.Lock] = None) -> "StrategyRuntime":
+        """Build workers from ``strategies.enabled`` (``id`` or ``id=module:Class`` entries).
+
+        Keys are read in the shard's scope when running as a shard.
+
+        Per strategy: ``strategy.<id>.mode`` (async|process), ``strategy.<id>.params``
+        (``k=v,...``) and ``strategy.<id>.symbols``; ``strategies.queue_size`` bounds queues.
+        """
+        snapshot = get_config_snapshot()
+        scope = shard_scope()
+        queue_size = snapshot.get_int("strategies.queue_size", scope, default=1000) or 1000
+        workers: List[StrategyWorker] = []
+        for entry in (snapshot.get("strategies.enabled", scope) or "").split(","):
+            entry = entry.strip()
+            if not entry:
+                continue
+            strategy_id, _, spec = entry.partition("=")
+            strategy_id = strategy_id.strip()
+            prefix = f"strategy.{strategy_id}."
+            symbols = [
+                s.strip()
+                for s in (snapshot.get(prefix + "symbols", scope) or "").split(",")
+                if s.strip()
+            ]
+            workers.append(
+                StrategyWorker(
+                    strategy_id,
+                    spec.strip() or strategy_id,
+                    parse_params(snapshot.get(prefix + "params", scope)),
+                    mode=snapshot.get(prefix + "mode", scope) or ASYNC_MODE,
+                    symbols=symbols,
+                    queue_size=queue_size,
+                )
+            )
+        async_submit = bool(snapshot.get_bool("orders.async_submit", scope, default=False))
+        return cls(workers, async_submit=async_submit, order_lock=order_lock)
+
+    def start(self, store: Optional[MarketDataStore] = None) -> "StrategyRuntime":
+        """Start the workers on the running loop and subscribe to ``store`` (default: shared)."""
+        self._loop = asyncio.get_running_loop()
+        self._intents_ready = asyncio.Event()
+        for worker in self.workers:
+            worker.start(self)
+        self._flush_task = self._loop.create_task(self._flush_loop(), name="strategy-intents")
+        self.store = store if store is not None else (self.store or get_market_data())
+        self.store.add_tick_listener(self.on_tick)
+        self.store.on_bar(self.on_bar)
+        if self.async_submit:
+            from centrix.order_router import get_order_router
+
+            if not self._router_hooked:
+                get_order_router().add_fill_callback(self._on_router_fill)
+                self._router_hooked = True
+        print(f"[strategy_runtime] started {len(self.workers)} strategies")
+        return self
+
+    async def stop(self) -> None:
+        """Unsubscribe, submit intents already produced, then stop workers and their pools."""
+        if self.store is not None:
+            self.store.remove_tick_listener(self.on_tick)
+            self.store.remove_bar_callback(self.on_bar)
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        if self._intents:
+            await self._submit_intents()
+        for worker in self.workers:
+            await worker.stop()
+
+    # -- feed side (any thread) -------------------------------------------------------
+
+    def on_tick(self, symbol: str, ts: float, bid: float, ask: float, last: float) -> None:
+        """Record the latest tick; one loop callback drains all symbols that moved."""
+        loop = self._loop
+        if loop is None:
+            return
+        with self._tick_lock:
+            self._pending_ticks[symbol] = (ts, bid, ask, last)
+            if self._ticks_scheduled:
+                return
+            self._ticks_scheduled = True
+        loop.call_soon_threadsafe(self._drain_ticks)
+
+    def on_bar(self, bar: Bar) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._dispatch_bar, bar)
+
+    # -- loop side --------------------------------------------------------------------
+
+    def _drain_ticks(self) -> None:
+        with self._tick_lock:
+            ticks, self._pending_ticks = self._pending_ticks, {}
+            self._ticks_scheduled = False
+        for symbol, (ts, bid, ask, last) in ticks.items():
+            for worker in self.workers:
+                if worker.wants(symbol):
+                    worker.offer_tick(symbol, ts, bid, ask, last)
+
+    def _dispatch_bar(self, bar: Bar) -> None:
+        for worker in self.workers:
+            if worker.wants(bar.symbol):
+                worker.offer_bar(bar)
+
+    def add_intents(self, worker: StrategyWorker, intents: Sequence[NewOrder]) -> None:
+        self._intents.extend((worker, intent) for intent in intents)
+        incr("strategy.intents", len(intents))
+        if self._intents_ready is not None:
+            self._intents_ready.set()
+
+    async def _flush_loop(self) -> None:
+        assert self._intents_ready is not None
+        while True:
+            await self._intents_ready.wait()
+            self._intents_ready.clear()
+            try:
+                await self._submit_intents()
+            except Exception as exc:  # _submit_batch reports its failures; keep flushing
+                print(f"[strategy_runtime] intent flush failed: {exc}")
+
+    async def _submit_intents(self) -> None:
+        """Propose every pending intent in one batch and push it through the order pipeline."""
+        batch, self._intents = self._intents, []
+        if not batch:
+            return
+        loop = asyncio.get_running_loop()
+        if self.order_lock is not None:
+            async with self.order_lock:
+                await loop.run_in_executor(None, self._submit_batch, batch)
+        else:
+            await loop.run_in_executor(None, self._submit_batch, batch)
+
+    def _submit_batch(self, batch: List[Tuple[StrategyWorker, NewOrder]]) -> None:
+        try:
+            order_ids = create_order_proposals([intent for _, intent in batch])
+        except Exception as exc:
+            # no order exists: reject every intent (order id 0) so strategies stop waiting
+            print(f"[strategy_runtime] order proposal failed: {exc}")
+            for worker, intent in batch:
+                self._post(worker.offer_reject, 0, intent.symbol, str(exc) or "proposal failed")
+            return
+        for order_id, owned in zip(order_ids, batch):
+            self.order_owner[order_id] = owned
+        try:
+            if self.async_submit:
+                self._submit_async(order_ids)
+            else:
+                self._report(execute_orders(order_ids))
+        except Exception as exc:
+            print(f"[strategy_runtime] order submit failed: {exc}")
+            self._report({order_id: False for order_id in order_ids})
+
+    def _submit_async(self, order_ids: List[int]) -> None:
+        from centrix.order_router import submit_orders_async
+
+        handles = submit_orders_async(order_ids)
+        self._report({order_id: False for order_id in order_ids if order_id not in handles})
+        for order_id, handle in handles.items():
+            handle.future.add_done_callback(
+                lambda future, order_id=order_id: self._on_router_done(order_id, future)
+            )
+
+    def _report(self, results: Dict[int, bool]) -> None:
+        """Route synchronous outcomes: fills at their recorded trade price (the current mark
+        when the gateway recorded none), rejects with their reason."""
+        failed = [order_id for order_id, ok in results.items() if not ok]
+        executed = [order_id for order_id, ok in results.items() if ok]
+        try:
+            errors = {o.id: o.error_message for o in get_orders(failed).values()}
+            trades = get_fill_summary(executed) if executed else {}
+        except Exception as exc:  # still report the outcomes, with less detail
+            print(f"[strategy_runtime] outcome lookup failed: {exc}")
+            errors, trades = {}, {}
+        marks = self.store.mark_prices() if self.store is not None else {}
+        for order_id, ok in results.items():
+            owned = self.order_owner.pop(order_id, None)
+            if owned is None:
+                continue
+            worker, intent = owned
+            if ok:
+                qty, price = trades.get(order_id, (intent.quantity, marks.get(intent.symbol, 0.0)))
+                fill = (order_id, intent.symbol, intent.side, qty, price)
+                self._post(worker.offer_fill, *fill)
+            else:
+                reason = errors.get(order_id) or "order failed"
+                self._post(worker.offer_reject, order_id, intent.symbol, reason)
+
+    def _on_router_fill(self, order_id: int, price: float, qty: float) -> None:
+        owned = self.order_owner.get(order_id)
+        if owned is not None:
+            worker, intent = owned
+            self._post(worker.offer_fill, order_id, intent.symbol, intent.side, qty, price)
+
+    def _on_router_done(self, order_id: int, future: "Future[bool]") -> None:
+        owned = self.order_owner.pop(order_id, None)
+        if owned is None:
+            return
+        worker, intent = owned
+        try:
+            filled = future.result()
+            reason = "rejected by gateway"
+        except Exception as exc:
+            filled, reason = False, str(exc) or "order failed"
+        if not filled:
+            self._post(worker.offer_reject, order_id, intent.symbol, reason)
+
+    def _post(self, callback: Any, *args: Any) -> None:
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(callback, *args)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {
+            worker.strategy_id: {
+                "mode": worker.mode,
+                "queue": len(worker.queue),
+                "processed": worker.events_processed,
+                "dropped": worker.dropped,
+                "positions": dict(worker.strategy.positions),
+            }
+            for worker in self.workers
+        }
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    from centrix.db import init_schema
+    from centrix.fake_gateway import FakeGateway
+    from centrix.ib_client import reload_ibkr_settings
+    from centrix.metrics import format_percentiles
+    from centrix.order_router import close_order_router
+
+    os.environ.setdefault("CENTRIX_DB_PATH", os.path.join(tempfile.mkdtemp(), "strategies.db"))
+    init_schema()
+
+    async def _demo() -> None:
+        store = MarketDataStore(bar_interval_sec=1)
+        params = {"fast": 3, "slow": 8, "quantity": 5}
+        runtime = StrategyRuntime(
+            [
+                StrategyWorker("inline", "ma_cross", params),
+                StrategyWorker("pooled", "ma_cross", params, mode=PROCESS_MODE),
+            ],
+            async_submit=True,
+        ).start(store)
+        price = 100.0
+        for i in range(600):
+            price += 0.4 if (i // 60) % 2 == 0 else -0.4
+            store.on_tick("AAPL", 1_700_000_000 + i * 0.5, price - 0.01, price + 0.01, price, 100)
+            await asyncio.sleep(0)
+        await asyncio.sleep(1.0)
+        await runtime.stop()
+        for strategy_id, stats in runtime.stats().items():
+            print(f"{strategy_id}: {stats}")
+
+    with FakeGateway(prices={"AAPL": 100.0}) as gateway:
+        os.environ["IBKR_HOST"], os.environ["IBKR_PORT"] = gateway.host, str(gateway.port)
+        reload_ibkr_settings()
+        asyncio.run(_demo())
+        close_order_router()
+    print(format_percentiles(get_registry().percentiles()))
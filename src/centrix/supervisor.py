@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import sys
+import time
+from dataclasses import dataclass
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix.config_service import get_config, get_config_snapshot
+from centrix.control import (
+    get_flag,
+    get_restart_needed,
+    scoped_flag_key,
+    set_control_scope,
+    set_restart_needed,
+)
+from centrix.db import init_schema
+from centrix.heartbeat import get_latest_heartbeat, write_heartbeat
+from centrix.ib_client import _load_ibkr_settings, reload_ibkr_settings
+from centrix.shard import SHARD_ENV, shard_scope, shard_source, validate_shard_id
+
+
+def run_shard(shard_id: str, client_id: int, max_runtime_sec: Optional[float] = None) -> None:
+    """Child-process entry point: run one engine in the shard's scope with its own client id."""
+    os.environ[SHARD_ENV] = shard_id
+    os.environ["IBKR_CLIENT_ID"] = str(client_id)
+    set_control_scope(None)
+    reload_ibkr_settings()
+    from centrix.engine_loop import run_engine_loop
+
+    run_engine_loop(max_runtime_sec=max_runtime_sec)
+
+
+def list_shards() -> List[str]:
+    """Shard ids from ``engine.shards`` (comma-separated)."""
+    value = get_config_snapshot().get("engine.shards") or ""
+    return [validate_shard_id(s.strip()) for s in value.split(",") if s.strip()]
+
+
+def shard_client_ids(shard_ids: Sequence[str]) -> Dict[str, int]:
+    """IB client id per shard: ``ibkr.client_id`` set in the shard scope, else base + n.
+
+    Raises ValueError when two shards would share a client id (the gateway rejects that).
+    """
+    base = int(_load_ibkr_settings()["client_id"])
+    client_ids: Dict[str, int] = {}
+    for index, shard_id in enumerate(shard_ids):
+        # exact scope lookup: the global client id belongs to the unsharded engine
+        explicit = get_config("ibkr.client_id", scope=shard_scope(shard_id))
+        client_ids[shard_id] = int(explicit) if explicit else base + index + 1
+    used = list(client_ids.values())
+    if len(set(used)) != len(used) or base in used:
+        raise ValueError(f"Shard IB client ids must be unique: {client_ids} (base {base})")
+    return client_ids
+
+
+def check_shard_symbols(shard_ids: Sequence[str]) -> Dict[str, List[str]]:
+    """Symbols per order-processing shard from ``engine.symbols`` in each shard's scope.
+
+    Raises ValueError when such a shard has no symbols or two shards share a symbol, since
+    both would poll and submit the same proposed orders.
+    """
+    snapshot = get_config_snapshot()
+    owners: Dict[str, str] = {}
+    assigned: Dict[str, List[str]] = {}
+    for shard_id in shard_ids:
+        scope = shard_scope(shard_id)
+        if not snapshot.get_bool("engine.process_orders", scope=scope, default=False):
+            continue
+        value = snapshot.get("engine.symbols", scope=scope) or ""
+        symbols = [s.strip() for s in value.split(",") if s.strip()]
+        if not symbols:
+            raise ValueError(f"Shard {shard_id} processes orders but has no engine.symbols")
+        for symbol in symbols:
+            if symbol in owners and owners[symbol] != shard_id:
+                raise ValueError(
+                    f"Symbol {symbol} is assigned to shards {owners[symbol]} and {shard_id}"
+                )
+            owners[symbol] = shard_id
+        assigned[shard_id] = symbols
+    return assigned
+
+
+def collect_shard_status(shard_ids: Sequence[str]) -> Dict[str, Dict[str, object]]:
+    """Aggregate each shard's engine heartbeat and scoped flags from the database."""
+    now = time.time()
+    status: Dict[str, Dict[str, object]] = {}
+    for shard_id in shard_ids:
+        scope = shard_scope(shard_id)
+        heartbeat = get_latest_heartbeat(shard_source("engine", shard_id))
+        status[shard_id] = {
+            "engine_state": get_flag(scoped_flag_key("engine_state", scope), "stopped"),
+            "safe_mode": get_flag(scoped_flag_key("safe_mode", scope), "false") == "true",
+            "heartbeat_age": None if heartbeat is None else now - int(heartbeat["ts"]),
+        }
+    return status
+
+
+@dataclass
+class ShardWorker:
+    """One engine process of the supervisor."""
+
+    shard_id: str
+    client_id: int
+    process: Optional[BaseProcess] = None
+    started_at: float = 0.0
+    failures: int = 0
+    next_start: float = 0.0
+
+
+class EngineSupervisor:
+    """Launches one engine process per shard, restarts dead or silent ones, aggregates status.
+
+    A shard stops by itself when its scoped ``restart_needed`` flag is set and is then started
+    again with the flag cleared; the global ``restart_needed`` flag stops every shard and the
+    supervisor. Crashes and stale heartbeats count as failures and back off exponentially;
+    the count resets once a shard has sent heartbeats for longer than ``stale_after_sec``.
+    """
+
+    def __init__(
+        self,
+        shard_ids: Optional[Sequence[str]] = None,
+        stale_after_sec: Optional[float] = None,
+        check_interval_sec: Optional[float] = None,
+        max_failures: Optional[int] = None,
+        shard_runtime_sec: Optional[float] = None,
+    ) -> None:
+        snapshot = get_config_snapshot()
+        shard_ids = list(shard_ids) if shard_ids is not None else list_shards()
+        if not shard_ids:
+            raise ValueError("No shards configured (engine.shards)")
+        for shard_id in shard_ids:
+            validate_shard_id(shard_id)
+        if stale_after_sec is None:
+            stale_after_sec = snapshot.get_float("supervisor.stale_after_sec", default=30.0)
+        if check_interval_sec is None:
+            check_interval_sec = snapshot.get_float("supervisor.check_interval_sec", default=2.0)
+        if max_failures is None:
+            max_failures = snapshot.get_int("supervisor.max_failures", default=5)
+        self.stale_after_sec = float(stale_after_sec or 30.0)
+        self.check_interval_sec = float(check_interval_sec or 2.0)
+        self.max_failures = int(max_failures or 5)
+        self.shard_runtime_sec = shard_runtime_sec
+        client_ids = shard_client_ids(shard_ids)
+        check_shard_symbols(shard_ids)
+        self.workers = [ShardWorker(shard_id, client_ids[shard_id]) for shard_id in shard_ids]
+        self._context = multiprocessing.get_context("spawn")
+
+    def start(self) -> None:
+        for worker in self.workers:
+            self._launch(worker)
+
+    def _launch(self, worker: ShardWorker) -> None:
+        # a leftover scoped stop request would end the new engine right away
+        set_restart_needed(False, scope=shard_scope(worker.shard_id))
+        process = self._context.Process(
+            target=run_shard,
+            args=(worker.shard_id, worker.client_id, self.shard_runtime_sec),
+            name=f"centrix-shard-{worker.shard_id}",
+        )
+        process.start()
+        worker.process = process
+        worker.started_at = time.time()
+        print(
+            f"[supervisor] shard {worker.shard_id} started "
+            f"(pid={process.pid}, client_id={worker.client_id})"
+        )
+
+    def _fail(self, worker: ShardWorker, reason: str) -> None:
+        worker.failures += 1
+        worker.next_start = time.time() + min(30.0, 2.0 ** (worker.failures - 1))
+        print(f"[supervisor] shard {worker.shard_id} {reason} (failure {worker.failures})")
+
+    def check(self) -> Dict[str, Dict[str, object]]:
+        """Restart exited or stale shards and return the aggregated status per shard."""
+        now = time.time()
+        stopping = get_restart_needed()
+        status = collect_shard_status([worker.shard_id for worker in self.workers])
+        for worker in self.workers:
+            process = worker.process
+            info = status[worker.shard_id]
+            age = info["heartbeat_age"]
+            if process is not None and process.is_alive():
+                running_for = now - worker.started_at
+                silent = age is None or age > self.stale_after_sec
+                if worker.failures and not silent and running_for > self.stale_after_sec:
+                    # a healthy run clears the backoff; only consecutive failures count
+                    worker.failures = 0
+                if silent and running_for > self.stale_after_sec and not stopping:
+                    process.terminate()
+                    process.join(timeout=5.0)
+                    worker.process = None
+                    self._fail(worker, "stopped sending heartbeats, terminated")
+            elif process is not None:
+                exitcode = process.exitcode
+                worker.process = None
+                if exitcode != 0:
+                    self._fail(worker, f"exited with code {exitcode}")
+            if worker.process is None and not stopping:
+                if worker.failures >= self.max_failures:
+                    info["engine_state"] = "failed"
+                elif now >= worker.next_start:
+                    self._launch(worker)
+            info.update(
+                pid=worker.process.pid if worker.process is not None else None,
+                client_id=worker.client_id,
+                failures=worker.failures,
+            )
+        alive = sum(1 for w in self.workers if w.process is not None and w.process.is_alive())
+        write_heartbeat("supervisor", f"{alive}/{len(self.workers)} shards")
+        return status
+
+    def run(self, max_runtime_sec: Optional[float] = None) -> None:
+        """Supervise until the global restart_needed flag is set or the runtime passes."""
+        deadline = None if max_runtime_sec is None else time.monotonic() + max_runtime_sec
+        self.start()
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                time.sleep(self.check_interval_sec)
+                self.check()
+                if get_restart_needed():
+                    print("[supervisor] restart_needed = true, stopping shards")
+                    break
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Ask every shard to stop through its scoped flag; terminate the ones that hang."""
+        running = [w for w in self.workers if w.process is not None and w.process.is_alive()]
+        for worker in running:
+            set_restart_needed(True, scope=shard_scope(worker.shard_id))
+        deadline = time.monotonic() + timeout
+        for worker in running:
+            assert worker.process is not None
+            worker.process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                print(f"[supervisor] shard {worker.shard_id} did not stop, terminating")
+                worker.process.terminate()
+                worker.process.join(timeout=5.0)
+        for worker in self.workers:
+            worker.process = None
+            set_restart_needed(False, scope=shard_scope(worker.shard_id))
+
+
+def format_shard_status(status: Dict[str, Dict[str, object]]) -> str:
+    lines = [f"{'shard':<12}{'state':<10}{'heartbeat':>12}  safe_mode"]
+    for shard_id, info in sorted(status.items()):
+        age = info["heartbeat_age"]
+        beat = "-" if age is None else f"{age:.0f}s ago"
+        lines.append(f"{shard_id:<12}{info['engine_state']!s:<10}{beat:>12}  {info['safe_mode']}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from centrix.config_service import set_config
+
+    init_schema()
+    set_config("engine.shards", "alpha,beta")
+    set_config("engine.heartbeat_interval_sec", "1", value_type="int")
+    set_config("engine.control_poll_ms", "200", value_type="int")
+    supervisor = EngineSupervisor(check_interval_sec=0.5, stale_after_sec=5.0)
+    supervisor.start()
+    time.sleep(3.0)
+    print(format_shard_status(supervisor.check()))
+    # restart one shard through its scoped flag; the supervisor brings it back
+    set_restart_needed(True, scope=shard_scope("beta"))
+    time.sleep(2.0)
+    supervisor.check()
+    time.sleep(2.0)
+    print(format_shard_status(supervisor.check()))
+    supervisor.stop()
+    print(format_shard_status(collect_shard_status(list_shards())))
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import errno
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from centrix.db import get_db_path, is_memory_db
+
+_listeners: List[Callable[[str], None]] = []
+_listeners_lock = threading.Lock()
+
+# notify_engine runs on every order write: the socket list is globbed at most once per TTL
+# (or again when a target has gone away) and one datagram socket is reused per process
+_TARGETS_TTL_SEC = 2.0
+_sender_lock = threading.Lock()
+_targets: Tuple[str, float, List[str]] = ("", 0.0, [])
+_sender: Optional[Tuple[int, socket.socket]] = None
+
+
+def _channel_dir() -> Optional[Path]:
+    """Return the directory holding wake-up sockets, or None for non-file databases."""
+    db_path = get_db_path()
+    if is_memory_db(db_path):
+        return None
+    return db_path.resolve().parent
+
+
+def get_wakeup_path(name: str) -> Optional[Path]:
+    """Return the datagram socket path of the named wake-up channel for the current DB."""
+    directory = _channel_dir()
+    if directory is None:
+        return None
+    return directory / f".{get_db_path().name}.{name}.wake"
+
+
+def add_wakeup_listener(listener: Callable[[str], None]) -> None:
+    """Register an in-process callback invoked with the reason on every notification."""
+    with _listeners_lock:
+        _listeners.append(listener)
+
+
+def remove_wakeup_listener(listener: Callable[[str], None]) -> None:
+    """Remove a previously registered in-process callback."""
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def notify_engine(reason: str) -> None:
+    """Wake every engine on this DB (in-process listeners and local sockets); never raises."""
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(reason)
+        except Exception as exc:
+            print(f"[wakeup] listener failed: {exc}")
+
+    directory = _channel_dir()
+    if directory is None or not hasattr(socket, "AF_UNIX"):
+        return
+    payload = reason.encode("utf-8")[:256]
+    targets = _wakeup_targets(directory)
+    if not targets:
+        return
+    sock = _sender_socket()
+    if sock is None:
+        return
+    for target in targets:
+        try:
+            sock.sendto(payload, target)
+        except OSError as exc:
+            # no engine listening (stale file) or its buffer is full; both are harmless
+            if exc.errno in (errno.ENOENT, errno.ECONNREFUSED):
+                invalidate_wakeup_targets()
+
+
+def _wakeup_targets(directory: Path) -> List[str]:
+    """Socket paths of the engines on this DB, re-globbed when the cached list expires."""
+    global _targets
+    pattern = f".{get_db_path().name}.*.wake"
+    key = str(directory / pattern)
+    now = time.monotonic()
+    with _sender_lock:
+        cached_key, expires, targets = _targets
+        if cached_key == key and now < expires:
+            return targets
+    try:
+        targets = [str(path) for path in directory.glob(pattern)]
+    except OSError:
+        return []
+    with _sender_lock:
+        _targets = (key, now + _TARGETS_TTL_SEC, targets)
+    return targets
+
+
+def invalidate_wakeup_targets() -> None:
+    """Force the next notification to look up the engines' sockets again."""
+    global _targets
+    with _sender_lock:
+        _targets = ("", 0.0, [])
+
+
+def _sender_socket() -> Optional[socket.socket]:
+    """This process's non-blocking datagram socket for sending wake-ups."""
+    global _sender
+    pid = os.getpid()
+    with _sender_lock:
+        if _sender is not None and _sender[0] == pid:
+            return _sender[1]
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+        except OSError:
+            return None
+        # a socket inherited via fork is left to the parent
+        _sender = (pid, sock)
+        return sock
+
+
+class WakeupChannel:
+    """Bound datagram socket an engine listens on for cross-process wake-ups."""
+
+    def __init__(self, name: str = "engine") -> None:
+        self.name = name
+        self.path = get_wakeup_path(name)
+        self.sock: Optional[socket.socket] = None
+
+    def open(self) -> bool:
+        """Bind the socket; return False when cross-process wake-ups are unavailable."""
+        if self.path is None or not hasattr(socket, "AF_UNIX"):
+            return False
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            if self.path.exists():
+                self.path.unlink()
+            sock.bind(str(self.path))
+            sock.setblocking(False)
+        except OSError as exc:
+            print(f"[wakeup] channel unavailable ({exc}), falling back to polling")
+            sock.close()
+            return False
+        self.sock = sock
+        invalidate_wakeup_targets()
+        return True
+
+    def drain(self) -> List[str]:
+        """Read all pending notifications without blocking."""
+        reasons: List[str] = []
+        if self.sock is None:
+            return reasons
+        while True:
+            try:
+                data = self.sock.recv(512)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+            reasons.append(data.decode("utf-8", errors="replace"))
+        return reasons
+
+    def fileno(self) -> int:
+        return self.sock.fileno() if self.sock is not None else -1
+
+    def close(self) -> None:
+        """Close the socket and remove its file."""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                if self.path is not None:
+                    os.unlink(self.path)
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    channel = WakeupChannel("selftest")
+    print(f"open={channel.open()} path={channel.path}")
+    notify_engine("selftest")
+    print(channel.drain())
+    channel.close()
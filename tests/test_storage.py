@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from centrix import config_service, control, heartbeat, order_service, positions
+from centrix.db import (
+    SQLiteStorage,
+    Storage,
+    close_all_connections,
+    get_storage,
+    init_schema,
+    set_storage,
+)
+from centrix.order_journal import get_order_journal
+from centrix.order_model import NewOrder
+from centrix.order_state import EXECUTED, EXECUTING, FAILED, PROPOSED, RISK_BLOCKED
+from centrix.storage import AsyncStorage, MemoryStorage
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def storage(request: pytest.FixtureRequest, tmp_path: Path, monkeypatch) -> Iterator[Storage]:
+    monkeypatch.setenv("CENTRIX_DB_PATH", str(tmp_path / "contract.db"))
+    monkeypatch.setenv("CENTRIX_STORAGE", request.param)
+    set_storage(None)
+    if request.param == "sqlite":
+        init_schema()
+    backend = get_storage()
+    yield backend
+    set_storage(None)
+    config_service.invalidate_config_cache()
+    order_service.reset_client_id_cache()
+    positions.reset_position_tracker()
+    close_all_connections()
+
+
+def test_backend_matches_selection(storage: Storage) -> None:
+    expected = {"sqlite": SQLiteStorage, "memory": MemoryStorage}[os.environ["CENTRIX_STORAGE"]]
+    assert type(storage) is expected
+    assert get_storage() is storage
+
+
+def test_unknown_backend_is_rejected(monkeypatch) -> None:
+    monkeypatch.setenv("CENTRIX_STORAGE", "nope")
+    set_storage(None)
+    with pytest.raises(ValueError):
+        get_storage()
+    set_storage(None)
+
+
+def test_journal_requires_sqlite() -> None:
+    set_storage(MemoryStorage())
+    try:
+        with pytest.raises(ValueError):
+            get_order_journal()
+    finally:
+        set_storage(None)
+
+
+def test_config_roundtrip_and_version(storage: Storage) -> None:
+    assert storage.get_config("contract.key") is None
+    assert storage.set_config("contract.key", "1.5", value_type="float") is None
+    assert storage.get_config("contract.key") == "1.5"
+    version, _ = storage.load_config()
+    assert storage.set_config("contract.key", "2", bump_version=True) == version + 1
+    assert storage.bump_config_version() == version + 2
+    bumped, rows = storage.load_config()
+    assert bumped == version + 2
+    assert ("contract.key", "global", "2", "str") in rows
+
+
+def test_flags(storage: Storage) -> None:
+    assert "contract.flag" not in storage.get_flags()
+    storage.set_flag("contract.flag", "true")
+    assert storage.get_flags()["contract.flag"] == "true"
+    assert not storage.add_flag("contract.flag", "false")
+    assert storage.add_flag("contract.other", "0")
+    assert storage.get_flags()["contract.flag"] == "true"
+
+
+def test_heartbeats_keep_newest(storage: Storage) -> None:
+    assert storage.get_latest_heartbeat("contract") is None
+    storage.write_heartbeats([("contract", "ok", 100), ("contract", "late", 200)])
+    storage.write_heartbeats([("contract", "stale", 150)])
+    assert storage.get_latest_heartbeat("contract") == {
+        "source": "contract",
+        "status": "late",
+        "ts": 200,
+    }
+    assert storage.compact_heartbeats(cutoff=180, aggregate_cutoff=0) == 2
+    assert storage.compact_heartbeats(cutoff=180, aggregate_cutoff=0) == 0
+
+
+def test_orders_ids_and_client_keys(storage: Storage) -> None:
+    ids, inserted = storage.insert_orders(
+        [NewOrder("AAA", "buy", 1.0), NewOrder("BBB", "sell", 2.0), NewOrder("CCC", "buy", 3.0)],
+        ts=100,
+    )
+    assert inserted == 3 and ids == list(range(ids[0], ids[0] + 3))
+    orders = storage.get_orders(ids)
+    assert [orders[i].symbol for i in ids] == ["AAA", "BBB", "CCC"]
+    assert all(orders[i].status == PROPOSED for i in ids)
+
+    keyed, inserted = storage.insert_orders(
+        [NewOrder("DDD", "buy", 1.0, "contract-1"), NewOrder("DDD", "buy", 1.0, "contract-1")],
+        ts=100,
+    )
+    again, _ = storage.insert_orders([NewOrder("DDD", "buy", 5.0, "contract-1")], ts=101)
+    assert inserted == 1 and keyed[0] == keyed[1] == again[0] and keyed[0] not in ids
+    assert storage.find_client_order_ids(["contract-1", "nope"]) == {"contract-1": keyed[0]}
+    by_key = storage.get_order_by_client_id("contract-1")
+    assert by_key is not None and by_key.id == keyed[0] and by_key.quantity == 1.0
+
+    assert [o.id for o in storage.list_orders_by_status(PROPOSED, symbols=["BBB"])] == [ids[1]]
+    batch = storage.load_order_batch(status=PROPOSED, since_id=ids[0])
+    assert list(batch.ids) == [ids[1], ids[2], keyed[0]]
+
+
+def test_transitions_are_atomic_and_logged(storage: Storage) -> None:
+    ids, _ = storage.insert_orders([NewOrder("AAA", "buy", 1.0) for _ in range(3)], ts=100)
+    storage.update_order_statuses([(ids[0], EXECUTING, None), (ids[1], RISK_BLOCKED, "x")], 101)
+    storage.update_order_statuses([(ids[0], EXECUTED, None)], 102)
+    orders = storage.get_orders(ids)
+    assert orders[ids[0]].status == EXECUTED and orders[ids[0]].updated_at == 102
+    assert orders[ids[1]].error_message == "x"
+
+    with pytest.raises(ValueError):
+        storage.update_order_statuses([(ids[2], EXECUTING, None), (ids[0], PROPOSED, None)], 103)
+    assert storage.get_orders([ids[2]])[ids[2]].status == PROPOSED
+
+    storage.update_order_statuses(
+        [(ids[2], FAILED, "y"), (ids[0], PROPOSED, None)], 104, skip_invalid=True
+    )
+    assert storage.get_orders([ids[2]])[ids[2]].status == FAILED
+    events = storage.get_order_events(ids[0])
+    assert [(e["from_status"], e["to_status"]) for e in events] == [
+        (None, PROPOSED),
+        (PROPOSED, EXECUTING),
+        (EXECUTING, EXECUTED),
+    ]
+
+
+def test_claim_and_open_orders(storage: Storage) -> None:
+    ids, _ = storage.insert_orders([NewOrder("AAA", "buy", 1.0) for _ in range(3)], ts=100)
+    assert storage.claim_orders([ids[0], ids[0], ids[1]], ts=101) == [ids[0], ids[1]]
+    assert storage.claim_orders([ids[0]], ts=102) == []
+    open_orders = storage.list_open_orders()
+    assert [(o.id, o.status) for o in open_orders] == [
+        (ids[0], EXECUTING),
+        (ids[1], EXECUTING),
+        (ids[2], PROPOSED),
+    ]
+
+
+def test_trades_fills_and_snapshot(storage: Storage) -> None:
+    ids, _ = storage.insert_orders([NewOrder("AAA", "sell", 2.0)], ts=100)
+    trade_ids = storage.insert_trades([(ids[0], 10.0, 1.0), (ids[0], 11.0, 1.0)], ts=105)
+    assert len(trade_ids) == 2 and trade_ids[1] == trade_ids[0] + 1
+    tail = storage.list_trades(since_id=trade_ids[0])
+    assert [t.id for t in tail] == [trade_ids[1]] and tail[0].fill_price == 11.0
+    assert storage.list_fills(trade_ids[0]) == [(trade_ids[1], "AAA", "sell", 1.0, 11.0, 105)]
+    assert storage.fill_summary(ids) == {ids[0]: (2.0, 10.5)}
+
+    assert storage.load_risk_snapshot() is None
+    storage.save_risk_snapshot(trade_ids[1], 0, 106, "{}")
+    storage.save_risk_snapshot(trade_ids[1], 60, 107, '{"AAA": [-2, 0, 0, 0, 11]}')
+    assert storage.load_risk_snapshot() == (trade_ids[1], 60, '{"AAA": [-2, 0, 0, 0, 11]}')
+
+
+def test_services_route_through_storage(storage: Storage) -> None:
+    config_service.set_config("risk.max_order_size", "50", value_type="float", bump_version=True)
+    assert storage.get_config("risk.max_order_size") == "50"
+    assert config_service.get_config_snapshot().get_float("risk.max_order_size") == 50.0
+
+    control.set_flag("contract.flag", "on")
+    assert storage.get_flags()["contract.flag"] == "on"
+
+    heartbeat.write_heartbeat("engine")
+    assert storage.get_latest_heartbeat("engine") is not None
+
+    order_ids = order_service.create_order_proposals(
+        [NewOrder("AAA", "buy", 3.0, "svc-1"), NewOrder("AAA", "buy", 3.0, "svc-1")]
+    )
+    assert order_ids[0] == order_ids[1]
+    assert storage.get_orders(order_ids)[order_ids[0]].status == PROPOSED
+    assert order_service.claim_orders(order_ids) == [order_ids[0]]
+    order_service.record_fills([(order_ids[0], 10.0, 3.0)])
+    assert positions.get_position_tracker().positions() == {"AAA": 3.0}
+    order_service.update_order_status(order_ids[0], EXECUTED)
+    assert order_service.get_order(order_ids[0]).status == EXECUTED
+
+
+def test_async_facade(storage: Storage) -> None:
+    async def _run(facade: AsyncStorage) -> None:
+        ids, _ = await facade.insert_orders([NewOrder("AAA", "buy", 1.0)], ts=100)
+        orders, events = await asyncio.gather(
+            facade.get_orders(ids), facade.get_order_events(ids[0])
+        )
+        assert orders[ids[0]].status == PROPOSED and len(events) == 1
+        with pytest.raises(AttributeError):
+            facade.backend_only
+
+    facade = AsyncStorage(storage)
+    try:
+        asyncio.run(_run(facade))
+    finally:
+        facade.close()